@@ -0,0 +1,50 @@
+from hashlib import md5
+
+from django.conf import settings
+
+from app.utils import query_list_to_py
+from core.models import Box, MapRevision
+
+MAP_PARAMS = ('as_string', 'bbox', 'zoom')
+BOX_PARAMS = ('fields', 'include')
+
+
+def revision_hash(revision: int, query_params=None, params=MAP_PARAMS) -> str:
+    """Hash of requested state: same revision and same request parameters always give the same response"""
+    h = md5(str(revision).encode())
+    if query_params is not None:
+        for key in params:
+            h.update(('&%s=%s' % (key, query_params.get(key, ''))).encode())
+    return h.hexdigest()
+
+
+# Statuses of clients are left out of map and tile revisions, clients get them from the status stream
+def map_etag(query_params) -> str:
+    return '"map-%s"' % revision_hash(MapRevision.current(), query_params, MAP_PARAMS + ('since',))
+
+
+def tile_etag(z: int, x: int, y: int, generation: str) -> str:
+    return '"tile-%i-%i-%i-%s"' % (z, x, y, generation)
+
+
+def box_etag(pk: int, query_params=None):
+    # Image is replaced by its rendering status, when it isn't embedded
+    volatile = {'image_status'} if settings.SCHEME_IMAGE_INLINE else {'image_status', 'image'}
+    if query_params is not None and any(volatile.intersection(query_list_to_py(query_params.get(key, '')))
+                                        for key in BOX_PARAMS):
+        # Rendering status changes without any change of box
+        return None
+    stamps = Box.objects.filter(pk=pk).values_list('revision', 'scheme_revision', 'client__online', 'client__ip') \
+        .first()
+    if stamps is None:
+        return None
+    # Status updates don't change revision of box, so status itself is a part of the tag
+    state = '%i-%s-%s' % stamps[1:]
+    return '"box-%i-%i-%i-%s"' % (pk, stamps[0], stamps[1], revision_hash(state, query_params, BOX_PARAMS)[:8])
+
+
+def scheme_etag(pk: int, kind: str):
+    scheme_revision = Box.objects.filter(pk=pk).values_list('scheme_revision', flat=True).first()
+    if scheme_revision is None:
+        return None
+    return '"%s-%i-%i"' % (kind, pk, scheme_revision)
@@ -1,6 +1,19 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException
 from rest_framework.views import exception_handler
 
 
+class ServiceUnavailable(APIException):
+    """Server is too busy, client may retry after `wait` seconds"""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Service is temporarily unavailable, try again later.'
+    default_code = 'service_unavailable'
+
+    def __init__(self, detail=None, code=None, wait=None):
+        super().__init__(detail, code)
+        self.wait = wait
+
+
 def custom_exception_handler(exc, context):
     response = exception_handler(exc, context)
 
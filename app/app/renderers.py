@@ -0,0 +1,37 @@
+import re
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# Floats which orjson writes differently from json module: with exponent (1e16 vs 1e+16,
+# 1.5e-7 vs 1.5e-07) or without it (0.00001 vs 1e-05). Matches inside strings only cause fallback
+DIVERGENT_FLOAT_RE = re.compile(rb'[0-9]e|(?<![0-9.])-?0\.0000')
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer, which encodes with orjson when it is installed.
+
+    Output is byte-identical to JSONRenderer: data which orjson can't encode the same way
+    (floats with exponent, non-string keys, integers out of 64 bits, indented output)
+    is rendered by JSONRenderer itself"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or not self.compact or self.ensure_ascii \
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.default,
+                               option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if DIVERGENT_FLOAT_RE.search(ret):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same escaping as JSONRenderer does for javascript compatibility
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+    def default(self, obj):
+        return self.encoder_class().default(obj)
@@ -1,48 +1,136 @@
 from collections import namedtuple
-from hashlib import md5
 
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
-from app.utils import query_bool_to_py
-from core.models import Wire, Box
+from app.etags import revision_hash
+from app.utils import query_bool_to_py, query_list_to_py
+from core.models import Wire, Box, MapRevision, MapTombstone
+from core.revisions import flush_revisions
+from geoserver.filters import Viewport
 from geoserver.serializers import MapSerializer, MapStringSerializer, BoxExtendedSerializer, \
-    ClientBoxExtendedSerializer
+    ClientBoxExtendedSerializer, BoxSerializer, ClientBoxSerializer, WireSerializer
+
+WireBox = namedtuple('WireBox', ('wires', 'boxes'))
+
+
+class NotModifiedResponse(Response):
+    def __init__(self):
+        super().__init__(status=status.HTTP_304_NOT_MODIFIED)
 
 
 class MapResponse(Response):
+    """Whole map or, with `since` revision passed, only changes made after it.
+    Whole map is sent for `since` older than pruned tombstones too"""
+
     def __init__(self, query_params=None):
         super().__init__()
         as_string = False
         if query_params is not None and 'as_string' in query_params.keys():
             as_string = query_bool_to_py(query_params['as_string'])
-        WireBox = namedtuple('WireBox', ('wires', 'boxes'))
-        mapWireBox = WireBox(wires=Wire.objects.all(), boxes=Box.objects.all())
         if as_string:
             serializer = MapStringSerializer
         else:
             serializer = MapSerializer
-        self.data = serializer(instance=mapWireBox).data
-        self.add_hash(as_string)
-
-    def add_hash(self, as_string):
-        h = md5()
-        if as_string:
-            for element in self.data.values():
-                h.update(element.encode())
+        viewport = Viewport.from_query_params(query_params)
+        # Revision is read before features, so features are never older than it
+        revision, pruned = MapRevision.state()
+        since = self.get_since(query_params)
+        if since is None or since < pruned:
+            mapWireBox = WireBox(wires=viewport.wires(Wire.objects.all()), boxes=viewport.boxes(Box.objects.all()))
+            self.data = serializer(instance=mapWireBox).data
+            self.add_hash(query_params, revision)
+        elif since == revision:
+            self.data = {'unchanged': True}
+        elif since > revision:
+            raise ValidationError({'since': ["Unknown revision %i, current is %i" % (since, revision)]})
         else:
-            for element in self.data.values():
-                for sub_element in sorted(element['features'], key=lambda x: x['properties']['id']):
-                    h.update(str(sub_element).encode())
-        self.data['message_hash'] = h.hexdigest()
+            self.data = self.get_changes(serializer, viewport, since)
+            self.data['unchanged'] = False
+        self.data['revision'] = revision
+
+    @staticmethod
+    def get_since(query_params):
+        if query_params is None or not query_params.get('since'):
+            return None
+        try:
+            since = int(query_params['since'])
+        except ValueError:
+            raise ValidationError({'since': ["Revision should be an integer"]})
+        if since < 0:
+            raise ValidationError({'since': ["Revision should be positive"]})
+        return since
+
+    @staticmethod
+    def get_changes(serializer, viewport, since):
+        wires = viewport.wires(Wire.objects.filter(revision__gt=since))
+        boxes = viewport.boxes(Box.objects.filter(revision__gt=since))
+        deleted = list(MapTombstone.objects.filter(revision__gt=since).values_list('object_type', 'object_id'))
+        return {
+            'created': serializer(instance=WireBox(wires=wires.filter(created_revision__gt=since),
+                                                   boxes=boxes.filter(created_revision__gt=since))).data,
+            'updated': serializer(instance=WireBox(wires=wires.filter(created_revision__lte=since),
+                                                   boxes=boxes.filter(created_revision__lte=since))).data,
+            'deleted': {
+                'wires': sorted(pk for object_type, pk in deleted if object_type == 'wire'),
+                'boxes': sorted(pk for object_type, pk in deleted if object_type == 'box'),
+            },
+        }
+
+    def add_hash(self, query_params, revision):
+        self.data['message_hash'] = revision_hash(revision, query_params)
 
 
 class BoxResponse(Response):
-    def __init__(self, box: Box):
+    """Box details, restricted by `fields` and `include` query parameters"""
+
+    def __init__(self, box: Box, query_params=None):
         super().__init__()
+        fields = include = None
+        if query_params is not None:
+            if query_params.get('fields'):
+                fields = query_list_to_py(query_params['fields'])
+            if query_params.get('include'):
+                include = query_list_to_py(query_params['include'])
         if box.type_of_box == 'regular':
             serializer = BoxExtendedSerializer
         elif box.type_of_box == 'client':
             serializer = ClientBoxExtendedSerializer
         else:
             raise ValueError("Unregistered type of box %s" % box.type_of_box)
-        self.data = serializer(instance=box).data
+        self.data = serializer(instance=box, fields=fields, include=include).data
+
+
+class ChangeResponse(Response):
+    """Result of map edit: changed feature or ids of deleted ones and map revision after the edit"""
+
+    def __init__(self, feature=None, deleted=None, status=status.HTTP_200_OK):
+        super().__init__(status=status)
+        self.data = {'revision': MapRevision.current()}
+        if feature is not None:
+            self.data['feature'] = self.serialize(feature)
+        if deleted is not None:
+            self.data['deleted'] = deleted
+
+    @staticmethod
+    def serialize(feature):
+        if isinstance(feature, Wire):
+            return WireSerializer(feature).data
+        if feature.type_of_box == 'client':
+            return ClientBoxSerializer(feature).data
+        return BoxSerializer(feature).data
+
+
+def change_response(query_params, feature=None, deleted=None, status=status.HTTP_200_OK) -> Response:
+    """Whole map for legacy clients, which pass `full_map`, otherwise only the changes"""
+    full_map = settings.MAP_EDIT_RETURNS_FULL_MAP
+    if query_params is not None and 'full_map' in query_params:
+        full_map = query_bool_to_py(query_params['full_map'])
+    if full_map:
+        # Whole map is built before revision of the edit is taken, so the counter isn't locked meanwhile.
+        # Revision of the map is older than the edit and the edit is sent once more on the next sync
+        return MapResponse(query_params)
+    flush_revisions()
+    return ChangeResponse(feature, deleted, status)
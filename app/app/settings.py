@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'geoserver',
     'scheme',
     'integration',
+    'topology',
     'django.contrib.gis',
     'corsheaders',
     'generic_relations',
@@ -84,6 +85,8 @@ DATABASES = {
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        # Map revision is bumped in the same transaction as the change itself
+        'ATOMIC_REQUESTS': True,
     }
 }
 
@@ -133,7 +136,12 @@ GEOS_LIBRARY_PATH = os.environ.get('GEOS_LIBRARY_PATH')
 CORS_ORIGIN_ALLOW_ALL = True
 
 REST_FRAMEWORK = {
-    'EXCEPTION_HANDLER': 'app.exceptions.custom_exception_handler'
+    'EXCEPTION_HANDLER': 'app.exceptions.custom_exception_handler',
+    # Encodes with orjson, if it is installed, with the same output as JSONRenderer
+    'DEFAULT_RENDERER_CLASSES': (
+        'app.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
 RABBITMQ_HOST = os.environ.get('RABBITMQ_HOST')
@@ -146,3 +154,64 @@ RABBITMQ_EVENT_QUEUE_ROUTING_KEY = os.environ.get('RABBITMQ_EVENT_QUEUE_ROUTING_
 RABBITMQ_EVENT_EXCHANGE = os.environ.get('RABBITMQ_EVENT_EXCHANGE')
 RABBITMQ_EVENT_DEAD_LETTER_QUEUE = os.environ.get('RABBITMQ_EVENT_DEAD_LETTER_QUEUE')
 RABBITMQ_EVENT_DEAD_LETTER_QUEUE_ROUTING_KEY = os.environ.get('RABBITMQ_EVENT_DEAD_LETTER_QUEUE_ROUTING_KEY')
+# Processes started by `manage.py run_status_consumer`
+RABBITMQ_CONSUMER_PROCESSES = int(os.environ.get('RABBITMQ_CONSUMER_PROCESSES', 1))
+RABBITMQ_CONSUMER_SHUTDOWN_TIMEOUT = int(os.environ.get('RABBITMQ_CONSUMER_SHUTDOWN_TIMEOUT', 10))
+# Unacknowledged messages delivered to consumer at once
+RABBITMQ_PREFETCH_COUNT = int(os.environ.get('RABBITMQ_PREFETCH_COUNT', 500))
+# Statuses are written by batches of this size or collected during this time, batch size 1 writes them one by one
+RABBITMQ_BATCH_SIZE = int(os.environ.get('RABBITMQ_BATCH_SIZE', 200))
+RABBITMQ_BATCH_TIMEOUT_MS = int(os.environ.get('RABBITMQ_BATCH_TIMEOUT_MS', 200))
+# Last known statuses of clients, repeated statuses are acknowledged without touching database
+RABBITMQ_STATUS_CACHE_SIZE = int(os.environ.get('RABBITMQ_STATUS_CACHE_SIZE', 500000))
+RABBITMQ_STATUS_CACHE_TTL = int(os.environ.get('RABBITMQ_STATUS_CACHE_TTL', 600))
+# Consumer engine: "blocking" (pika) or "asyncio" (aio-pika)
+RABBITMQ_CONSUMER_ENGINE = os.environ.get('RABBITMQ_CONSUMER_ENGINE', 'blocking')
+# asyncio engine: batches written at once, each by one of RABBITMQ_DB_POOL_SIZE database connections
+RABBITMQ_CONCURRENCY = int(os.environ.get('RABBITMQ_CONCURRENCY', 4))
+RABBITMQ_DB_POOL_SIZE = int(os.environ.get('RABBITMQ_DB_POOL_SIZE', 4))
+# asyncio engine: reconnect delays grow exponentially up to this number of seconds
+RABBITMQ_RECONNECT_MAX_DELAY = int(os.environ.get('RABBITMQ_RECONNECT_MAX_DELAY', 30))
+
+# Client boxes are hidden from map responses below this zoom level
+MAP_CLIENT_BOXES_MIN_ZOOM = int(os.environ.get('MAP_CLIENT_BOXES_MIN_ZOOM', 15))
+# Map features are built from database rows instead of GeoFeatureModelSerializer, output is the same
+MAP_DIRECT_GEOJSON = os.environ.get('MAP_DIRECT_GEOJSON', 'true').lower() in ('true', '1', 'yes')
+# Map edits respond with the whole map, as `full_map=true` query parameter does, for legacy clients
+MAP_EDIT_RETURNS_FULL_MAP = os.environ.get('MAP_EDIT_RETURNS_FULL_MAP', 'false').lower() in ('true', '1', 'yes')
+# Days tombstones of deleted features are kept, clients syncing from before that get the whole map
+MAP_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('MAP_TOMBSTONE_RETENTION_DAYS', 30))
+# Client status stream: seconds between keepalive comments and boxes pending for one client before it has to resync
+STATUS_STREAM_HEARTBEAT = int(os.environ.get('STATUS_STREAM_HEARTBEAT', 15))
+STATUS_STREAM_MAX_PENDING = int(os.environ.get('STATUS_STREAM_MAX_PENDING', 10000))
+# Streams open at once in one worker process, every stream holds a gunicorn thread, so keep it below --threads.
+# Streams release their database connections, other requests hold one per thread, see docker-compose files
+STATUS_STREAM_MAX_CONNECTIONS = int(os.environ.get('STATUS_STREAM_MAX_CONNECTIONS', 12))
+# Optical loss budget: fiber attenuation per km of wire, loss of splice per fiber in box,
+# splitter loss over its ideal 10*log10(ratio) and the highest loss receivers tolerate, in dB
+LOSS_BUDGET_FIBER_DB_PER_KM = float(os.environ.get('LOSS_BUDGET_FIBER_DB_PER_KM', 0.35))
+LOSS_BUDGET_SPLICE_DB = float(os.environ.get('LOSS_BUDGET_SPLICE_DB', 0.1))
+LOSS_BUDGET_SPLITTER_EXCESS_DB = float(os.environ.get('LOSS_BUDGET_SPLITTER_EXCESS_DB', 1.0))
+LOSS_BUDGET_MAX_DB = float(os.environ.get('LOSS_BUDGET_MAX_DB', 28.0))
+
+# Cache is shared between gunicorn workers
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'gonm_cache',
+    }
+}
+
+MAP_TILE_CACHE_TIMEOUT = int(os.environ.get('MAP_TILE_CACHE_TIMEOUT', 24 * 60 * 60))
+
+# Rendered box schemes: number of images kept in memory of each worker and directory shared by all of them
+SCHEME_RENDER_CACHE_SIZE = int(os.environ.get('SCHEME_RENDER_CACHE_SIZE', 256))
+SCHEME_RENDER_CACHE_DIR = os.environ.get('SCHEME_RENDER_CACHE_DIR', os.path.join(BASE_DIR, 'scheme_cache'))
+# Size limit of the directory in bytes, the least recently used images are removed beyond it, 0 disables the limit
+SCHEME_RENDER_CACHE_DISK_SIZE = int(os.environ.get('SCHEME_RENDER_CACHE_DISK_SIZE', 512 * 1024 * 1024))
+# Number of processes rendering schemes in background, 0 renders them inside request
+SCHEME_RENDER_WORKERS = int(os.environ.get('SCHEME_RENDER_WORKERS', 2))
+# Embed base64 encoded image into box details, as legacy clients expect
+SCHEME_IMAGE_INLINE = bool(int(os.environ.get('SCHEME_IMAGE_INLINE', 0)))
+# Format of scheme images referenced by image_url: "svg" is laid out in process, "png" is rendered by graphviz
+SCHEME_IMAGE_FORMAT = os.environ.get('SCHEME_IMAGE_FORMAT', 'svg')
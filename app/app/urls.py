@@ -21,6 +21,7 @@ from .views import Ping
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/user/', include('user.urls')),
+    path('api/topology/', include('topology.urls')),
     path('api/', include('geoserver.urls')),
     path('ping/', Ping.as_view()),
 ]
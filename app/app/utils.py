@@ -1,10 +1,18 @@
 import functools
-from string import ascii_uppercase
+import re
+import socket
+from string import ascii_uppercase, hexdigits
 from typing import Iterable
 
+from netaddr import EUI, IPAddress
+
 POSITIVE_VALUES = ('true', '1', 'yes')
 ALPHABET = ascii_uppercase
 MOVED_ALPHABET = ALPHABET[-1] + ALPHABET[:-1]
+MAC_HEX_DIGITS = 12
+MAC_SEPARATORS_RE = re.compile(r'[-:.\s]')
+IP_PREFIX_RE = re.compile(r'^\d{1,3}(\.\d{0,3}){0,3}$')
+MAC_FORMAT = '-'.join(['%02X'] * 6)
 
 
 # using wonder's beautiful simplification: https://stackoverflow.com/questions/31174295/getattr-and-setattr-on-nested-objects/31174427?noredirect=1#comment86638618_31174427
@@ -29,7 +37,85 @@ def query_bool_to_py(bs: str) -> bool:
     return bs.lower() in POSITIVE_VALUES
 
 
+def query_list_to_py(bs: str) -> list:
+    return [el.strip() for el in bs.split(',') if el.strip()]
+
+
 def get_fields_list(klass: Iterable, field: str):
     if not isinstance(field, str):
         raise ValueError("Functions takes exactly one string argument")
     return [str(rgetattr(el, field)) for el in klass]
+
+
+def parse_bbox(bs: str) -> tuple:
+    """Parse "min_lng,min_lat,max_lng,max_lat" string into tuple of floats"""
+    try:
+        bbox = tuple(float(el) for el in bs.split(','))
+    except ValueError:
+        raise ValueError("Bounding box should contain only numbers")
+    if len(bbox) != 4:
+        raise ValueError("Bounding box should contain exactly 4 numbers")
+    min_lng, min_lat, max_lng, max_lat = bbox
+    if not (-180 <= min_lng <= 180 and -180 <= max_lng <= 180):
+        raise ValueError("Longitude should be from -180 to 180")
+    if not (-90 <= min_lat <= 90 and -90 <= max_lat <= 90):
+        raise ValueError("Latitude should be from -90 to 90")
+    if min_lng >= max_lng or min_lat >= max_lat:
+        raise ValueError("Minimal corner of bounding box should be less than maximal")
+    return bbox
+
+
+def mac_prefix_range(bs: str) -> tuple:
+    """Return (first, last) integer MAC addresses starting with hex prefix, separators are ignored"""
+    digits = MAC_SEPARATORS_RE.sub('', bs)
+    if not digits or len(digits) > MAC_HEX_DIGITS or any(c not in hexdigits for c in digits):
+        raise ValueError("MAC address prefix should contain from 1 to %i hex digits" % MAC_HEX_DIGITS)
+    shift = 4 * (MAC_HEX_DIGITS - len(digits))
+    first = int(digits, 16) << shift
+    return first, first + (1 << shift) - 1
+
+
+def octet_prefix_ranges(digits: str) -> list:
+    """Return ranges of octet values which decimal form starts with digits, e.g. "2" gives 2, 20-29 and 200-255"""
+    if not digits:
+        return [(0, 255)]
+    if digits[0] == '0':
+        return [(0, 0)] if digits == '0' else []
+    ranges = []
+    first = last = int(digits)
+    while first <= 255:
+        ranges.append((first, min(last, 255)))
+        first, last = first * 10, last * 10 + 9
+    return ranges
+
+
+def ip_prefix_ranges(bs: str) -> list:
+    """Return (first, last) integer IPv4 addresses of every range starting with dotted-decimal prefix"""
+    if not IP_PREFIX_RE.match(bs):
+        raise ValueError("IP address prefix should be dotted-decimal")
+    *octets, last_digits = bs.split('.')
+    base = 0
+    for octet in octets:
+        if int(octet) > 255:
+            raise ValueError("IP address octet should be from 0 to 255")
+        base = base << 8 | int(octet)
+    shift = 8 * (3 - len(octets))
+    ranges = [((base << 8 | first) << shift, ((base << 8 | last) << shift) + (1 << shift) - 1)
+              for first, last in octet_prefix_ranges(last_digits)]
+    if not ranges:
+        raise ValueError("IP address octet should be from 0 to 255")
+    return ranges
+
+
+def format_mac(value: int) -> str:
+    """Same string as str(EUI(value)) gives, without creating EUI for EUI-48 addresses"""
+    if 0 <= value < 1 << 48:
+        return MAC_FORMAT % tuple(value.to_bytes(6, 'big'))
+    return str(EUI(value))
+
+
+def format_ip(value: int) -> str:
+    """Same string as str(IPAddress(value)) gives, without creating IPAddress for IPv4 addresses"""
+    if 0 <= value < 1 << 32:
+        return socket.inet_ntoa(value.to_bytes(4, 'big'))
+    return str(IPAddress(value))
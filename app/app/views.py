@@ -1,23 +1,48 @@
+from django.utils.http import parse_etags
+from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from authentication import BearerTokenAuthentication
+from core.revisions import deferred_revisions
+
+
+def _strip_weak(etag):
+    return etag[2:] if etag.startswith('W/') else etag
 
 
 class ObjectAPIView(APIView):
     authentication_classes = (BearerTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    etag = None
 
     def initial(self, request, *args, **kwargs):
         super().initial(request, *args, **kwargs)
 
+    def dispatch(self, request, *args, **kwargs):
+        # Map revision of changes is taken after all writes of request
+        with deferred_revisions():
+            return super().dispatch(request, *args, **kwargs)
+
+    def is_not_modified(self, request, etag) -> bool:
+        """Remember ETag of the response and compare it with If-None-Match header.
+        Call it before any serializer runs, so cached responses cost one cheap query"""
+        self.etag = etag
+        if etag is None:
+            return False
+        requested = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        return '*' in requested or _strip_weak(etag) in map(_strip_weak, requested)
+
     def finalize_response(self, request, response, *args, **kwargs):
         # At first we need to check if exception happened,
         # it means that response have already processed
-        if hasattr(response, 'exception') and not response.exception:
+        if hasattr(response, 'exception') and not response.exception \
+                and response.status_code != status.HTTP_304_NOT_MODIFIED:
             response.data = {'success': True,
                              'data': response.data}
+        if self.etag is not None and response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = self.etag
         return super().finalize_response(request, response,
                                          *args, **kwargs)
 
@@ -3,3 +3,13 @@ from rest_framework.authentication import TokenAuthentication
 
 class BearerTokenAuthentication(TokenAuthentication):
     keyword = 'Bearer'
+
+
+class QueryTokenAuthentication(TokenAuthentication):
+    """Token passed as `token` query parameter, for clients which can't set headers, like EventSource"""
+
+    def authenticate(self, request):
+        key = request.query_params.get('token')
+        if not key:
+            return None
+        return self.authenticate_credentials(key)
@@ -0,0 +1,132 @@
+import csv
+import io
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.db import connection, connections, transaction
+from netaddr import IPAddress, EUI
+
+from core.models import Box, Client, MapRevision
+
+STAGING_TABLE = "client_import"
+
+CREATE_STAGING_SQL = """
+CREATE TEMP TABLE IF NOT EXISTS {staging} (mac bigint, ip bigint);
+TRUNCATE {staging}
+"""
+
+UPSERT_SQL = """
+INSERT INTO {client} (mac, ip, online) SELECT mac, ip, false FROM {staging}
+ON CONFLICT (mac) DO UPDATE SET ip = EXCLUDED.ip
+WHERE {client}.ip IS NULL AND EXCLUDED.ip IS NOT NULL
+RETURNING id, xmax = 0
+"""
+
+
+def parse_row(row: list) -> tuple:
+    """Return MAC and IP address of client from `ip;mac` row, MAC is None for rows without client"""
+    ip = int(IPAddress(row[0])) if row[0] else None
+    mac = int(EUI(row[1])) if row[1] else None
+    return mac, ip
+
+
+def read_chunks(fin, chunk_size: int):
+    """Yield lists of at most `chunk_size` rows of csv file, only one chunk is kept in memory"""
+    reader = csv.reader(fin, delimiter=';')
+    while True:
+        chunk = list(islice(reader, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def normalize_chunk(rows: list, first_line: int = 1) -> tuple:
+    """Return IP addresses of chunk clients keyed by MAC and rejected rows as (line, row, error).
+    The first known IP of client wins, as later rows never overwrite it.
+    Runs in worker processes, so it doesn't touch database"""
+    clients = {}
+    rejected = []
+    for line, row in enumerate(rows, first_line):
+        try:
+            mac, ip = parse_row(row)
+        except Exception as e:
+            rejected.append((line, row, str(e) or e.__class__.__name__))
+            continue
+        if mac and clients.get(mac) is None:
+            clients[mac] = ip
+    return clients, rejected
+
+
+def normalize_chunks(fin, chunk_size: int, workers: int = 0):
+    """Yield (clients, rejected, number of rows) for every chunk of csv file in file order.
+    With `workers` chunks are normalized in that many processes, at most two chunks per worker
+    are kept in memory"""
+    line = 1
+    if workers <= 0:
+        for chunk in read_chunks(fin, chunk_size):
+            yield normalize_chunk(chunk, line) + (len(chunk),)
+            line += len(chunk)
+        return
+    # Forked workers must not share database connection of command, unless it is in the middle of transaction
+    if not connection.in_atomic_block:
+        connections.close_all()
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for chunk in read_chunks(fin, chunk_size):
+            pending.append((pool.submit(normalize_chunk, chunk, line), len(chunk)))
+            line += len(chunk)
+            if len(pending) >= 2 * workers:
+                future, n_rows = pending.popleft()
+                yield future.result() + (n_rows,)
+        while pending:
+            future, n_rows = pending.popleft()
+            yield future.result() + (n_rows,)
+
+
+class RejectedRows:
+    """Sidecar csv file with rejected rows followed by their line number and error, created on first write"""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.count = 0
+        self._file = None
+        self._writer = None
+
+    def write(self, rejected: list):
+        if not rejected:
+            return
+        if self._file is None:
+            self._file = open(self.filename, 'w', newline='')
+            self._writer = csv.writer(self._file, delimiter=';')
+        for line, row, error in rejected:
+            self._writer.writerow(list(row) + [line, error])
+        self.count += len(rejected)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def upsert_clients(clients: dict) -> tuple:
+    """Copy clients to staging table and merge them into clients table.
+    Unknown clients are created, known ones only get IP address if they have none.
+    Return numbers of created and updated clients"""
+    if not clients:
+        return 0, 0
+    data = io.StringIO()
+    for mac, ip in clients.items():
+        data.write("%i\t%s\n" % (mac, "\\N" if ip is None else ip))
+    data.seek(0)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(CREATE_STAGING_SQL.format(staging=STAGING_TABLE))
+            cursor.copy_from(data, STAGING_TABLE, columns=('mac', 'ip'))
+            cursor.execute(UPSERT_SQL.format(client=Client._meta.db_table, staging=STAGING_TABLE))
+            rows = cursor.fetchall()
+        updated = [pk for pk, inserted in rows if not inserted]
+        # Boxes are locked before the counter row, as every writer does it
+        boxes = list(Box.objects.select_for_update().filter(client__in=updated).values_list('pk', flat=True))
+        if boxes:
+            Box.objects.filter(pk__in=boxes).update(revision=MapRevision.bump())
+    return len(rows) - len(updated), len(updated)
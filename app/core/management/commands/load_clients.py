@@ -1,9 +1,11 @@
 import csv
+import time
 
 from django.core.management import CommandError
 from django.core.management.base import BaseCommand
-from netaddr import IPAddress, EUI
+from netaddr import EUI
 
+from core.client_import import parse_row, normalize_chunks, upsert_clients, RejectedRows
 from core.models import Client
 
 
@@ -13,6 +15,11 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         super(Command, self).add_arguments(parser)
         parser.add_argument('--filename', dest='filename', default=None)
+        parser.add_argument('--bulk', dest='bulk', action='store_true',
+                            help='upsert clients by chunks through COPY to staging table')
+        parser.add_argument('--chunk-size', dest='chunk_size', type=int, default=10000)
+        parser.add_argument('--workers', dest='workers', type=int, default=0,
+                            help='validate chunks in this number of processes, implies --bulk')
 
     def handle(self, *args, **kwargs):
         if "filename" not in kwargs:
@@ -21,18 +28,15 @@ class Command(BaseCommand):
         if not filename.endswith(".csv"):
             raise CommandError("Only supported type for loading data is .csv")
 
+        if kwargs.get('bulk') or kwargs.get('workers'):
+            self.load_bulk(filename, kwargs.get('chunk_size') or 10000, kwargs.get('workers') or 0)
+            return
+
         try:
             with open(filename, 'r') as fin:
                 reader = csv.reader(fin, delimiter=';')
                 for row in reader:
-                    if row[0]:
-                        ip = int(IPAddress(row[0]))
-                    else:
-                        ip = None
-                    if row[1]:
-                        mac = int(EUI(row[1]))
-                    else:
-                        mac = None
+                    mac, ip = parse_row(row)
                     if mac:
                         client = Client.objects.get_or_create(mac=mac)[0]
                         if ip and not client.ip:
@@ -43,3 +47,31 @@ class Command(BaseCommand):
             raise CommandError(e)
 
         print("Successfully load data to db")
+
+    def load_bulk(self, filename: str, chunk_size: int, workers: int):
+        """Invalid rows don't stop loading, they are written to `<filename>.errors.csv`"""
+        start = time.monotonic()
+        n_rows = n_created = n_updated = 0
+        errors = RejectedRows(filename[:-len(".csv")] + ".errors.csv")
+        try:
+            with open(filename, 'r') as fin:
+                for clients, rejected, chunk_rows in normalize_chunks(fin, chunk_size, workers):
+                    errors.write(rejected)
+                    created, updated = upsert_clients(clients)
+                    n_rows += chunk_rows
+                    n_created += created
+                    n_updated += updated
+                    self.stdout.write("Loaded %i rows (%.0f rows/s)" % (n_rows, self.rate(n_rows, start)))
+        except Exception as e:
+            raise CommandError(e)
+        finally:
+            errors.close()
+        self.stdout.write(self.style.SUCCESS(
+            "Successfully load %i rows: %i clients created, %i updated in %.1f s (%.0f rows/s)"
+            % (n_rows, n_created, n_updated, time.monotonic() - start, self.rate(n_rows, start))))
+        if errors.count:
+            self.stdout.write(self.style.WARNING("%i rows rejected, see %s" % (errors.count, errors.filename)))
+
+    @staticmethod
+    def rate(n_rows: int, start: float) -> float:
+        return n_rows / max(time.monotonic() - start, 1e-6)
@@ -0,0 +1,46 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MapRevision',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MapTombstone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_type', models.CharField(choices=[('box', 'box'), ('wire', 'wire')], max_length=4)),
+                ('object_id', models.IntegerField()),
+                ('revision', models.BigIntegerField(db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='box',
+            name='revision',
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='box',
+            name='created_revision',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='wire',
+            name='revision',
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='wire',
+            name='created_revision',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
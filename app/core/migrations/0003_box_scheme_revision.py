@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('core', '0002_map_revision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='box',
+            name='scheme_revision',
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+    ]
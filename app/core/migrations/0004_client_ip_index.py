@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('core', '0003_box_scheme_revision'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='client',
+            name='ip',
+            field=models.BigIntegerField(db_index=True, null=True),
+        ),
+    ]
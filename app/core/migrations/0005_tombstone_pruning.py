@@ -0,0 +1,22 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('core', '0004_client_ip_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='maprevision',
+            name='pruned',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='maptombstone',
+            name='deleted_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
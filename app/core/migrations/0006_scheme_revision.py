@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+def start_after_map_revision(apps, schema_editor):
+    # Scheme revisions of boxes were taken from the map counter, new ones must be greater
+    value = apps.get_model('core', 'MapRevision').objects.filter(pk=1).values_list('value', flat=True).first()
+    if value:
+        apps.get_model('core', 'SchemeRevision').objects.create(pk=1, value=value)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('core', '0005_tombstone_pruning'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchemeRevision',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(start_after_map_revision, migrations.RunPython.noop),
+    ]
@@ -4,7 +4,7 @@ from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, \
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.gis.db import models as geo_models
-from django.db import models
+from django.db import models, connection
 
 from app.utils import int_to_bijective_hexavigesimal
 
@@ -46,7 +46,7 @@ class User(AbstractBaseUser, PermissionsMixin):
 class Client(models.Model):
     online = models.BooleanField(default=False)
     mac = models.BigIntegerField(null=True, unique=True)
-    ip = models.BigIntegerField(null=True)
+    ip = models.BigIntegerField(null=True, db_index=True)
 
 
 class Box(geo_models.Model):
@@ -69,6 +69,10 @@ class Box(geo_models.Model):
     splitters_number = models.IntegerField(default=0)
     point = geo_models.PointField()
     client = models.OneToOneField(Client, on_delete=models.SET_NULL, null=True, related_name="connected_box")
+    revision = models.BigIntegerField(default=0, db_index=True)
+    created_revision = models.BigIntegerField(default=0)
+    # SchemeRevision of the last change of box contents: fibers, pigtails, splitters and connected wires
+    scheme_revision = models.BigIntegerField(default=0, db_index=True)
 
     def __str__(self):
         return self.name
@@ -92,6 +96,73 @@ class Wire(geo_models.Model):
         related_name="input_wires"
     )
     path = geo_models.LineStringField()
+    revision = models.BigIntegerField(default=0, db_index=True)
+    created_revision = models.BigIntegerField(default=0)
+
+
+class MapRevision(models.Model):
+    """Single row counter of map changes, bumped by every write of boxes, wires and clients"""
+    value = models.BigIntegerField(default=0)
+    # Tombstones up to this revision are pruned, so changes since older revisions can't be listed
+    pruned = models.BigIntegerField(default=0)
+
+    @classmethod
+    def current(cls) -> int:
+        return cls.objects.filter(pk=1).values_list('value', flat=True).first() or 0
+
+    @classmethod
+    def state(cls) -> tuple:
+        """Current revision and the latest pruned one"""
+        return cls.objects.filter(pk=1).values_list('value', 'pruned').first() or (0, 0)
+
+    @classmethod
+    def bump(cls) -> int:
+        """Increase counter and return its new value.
+
+        Counter row stays locked until the end of transaction,
+        so changes are committed in order of their revisions.
+        Bump after all other writes of transaction, see core.revisions"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO {table} (id, value, pruned) VALUES (1, 1, 0) "
+                "ON CONFLICT (id) DO UPDATE SET value = {table}.value + 1 "
+                "RETURNING value".format(table=cls._meta.db_table)
+            )
+            return cursor.fetchone()[0]
+
+
+class SchemeRevision(models.Model):
+    """Single row counter of changes of box contents: fibers, pigtails, splitters and connected wires.
+    Separate from MapRevision, so editing a scheme doesn't change the map and its tiles"""
+    value = models.BigIntegerField(default=0)
+
+    @classmethod
+    def current(cls) -> int:
+        return cls.objects.filter(pk=1).values_list('value', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls) -> int:
+        """Increase counter and return its new value, locked like MapRevision.
+        Bump after MapRevision in the same transaction"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO {table} (id, value) VALUES (1, 1) "
+                "ON CONFLICT (id) DO UPDATE SET value = {table}.value + 1 "
+                "RETURNING value".format(table=cls._meta.db_table)
+            )
+            return cursor.fetchone()[0]
+
+
+class MapTombstone(models.Model):
+    """Record about deleted map object, used to send deletions to syncing clients"""
+    object_type_choices = (
+        ('box', 'box'),
+        ('wire', 'wire')
+    )
+    object_type = models.CharField(max_length=4, choices=object_type_choices)
+    object_id = models.IntegerField()
+    revision = models.BigIntegerField(db_index=True)
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
 
 class Fiber(models.Model):
@@ -0,0 +1,18 @@
+import json
+
+from django.db import connection
+
+CLIENT_STATUS_CHANNEL = 'client_status'
+# Postgres limits payload of notification to 8000 bytes, pair takes at most ~20 bytes
+MAX_NOTIFY_STATUSES = 300
+
+
+def notify_box_statuses(statuses):
+    """Publish (box id, online) pairs of client boxes to listeners of CLIENT_STATUS_CHANNEL.
+    Notifications are delivered when the current transaction is committed"""
+    statuses = list(statuses)
+    with connection.cursor() as cursor:
+        for i in range(0, len(statuses), MAX_NOTIFY_STATUSES):
+            cursor.execute("SELECT pg_notify(%s, %s)",
+                           [CLIENT_STATUS_CHANNEL, json.dumps(statuses[i:i + MAX_NOTIFY_STATUSES],
+                                                              separators=(',', ':'))])
@@ -0,0 +1,133 @@
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+
+from core.models import Box, Wire, MapRevision, SchemeRevision, MapTombstone
+
+# Seconds between attempts of one process to prune tombstones
+PRUNE_INTERVAL = 60 * 60
+
+_local = threading.local()
+_pruned_at = None
+
+
+class PendingRevisions:
+    """Map and scheme changes of transaction, which get one revision of each counter when they are flushed.
+
+    Counter rows stay locked from the bump to the end of transaction,
+    so taking revision after all other writes keeps concurrent writers from waiting for each other"""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        # Saved boxes and wires with flags whether they are created
+        self.saved = []
+        # Ids of boxes changed by queries
+        self.boxes = set()
+        # Ids of boxes with changed contents
+        self.scheme_boxes = set()
+        # (object type, id) of deleted boxes and wires
+        self.tombstones = []
+
+    def __bool__(self):
+        return bool(self.saved or self.boxes or self.scheme_boxes or self.tombstones)
+
+    def flush(self):
+        if self.scheme_boxes:
+            # Rows are locked before the counter rows, boxes of saved objects are locked by their writes
+            list(Box.objects.select_for_update().filter(pk__in=self.scheme_boxes).order_by('pk').values_list('pk'))
+        if self.saved or self.boxes or self.tombstones:
+            self.flush_map()
+        if self.scheme_boxes:
+            Box.objects.filter(pk__in=self.scheme_boxes).update(scheme_revision=SchemeRevision.bump())
+        self.clear()
+
+    def flush_map(self):
+        revision = MapRevision.bump()
+        updated = {Box: set(self.boxes), Wire: set()}
+        created = {Box: set(), Wire: set()}
+        for instance, is_created in self.saved:
+            model = type(instance)
+            instance.revision = revision
+            updated[model].add(instance.pk)
+            if is_created:
+                instance.created_revision = revision
+                created[model].add(instance.pk)
+        for model in (Box, Wire):
+            if updated[model]:
+                model.objects.filter(pk__in=updated[model]).update(revision=revision)
+            if created[model]:
+                model.objects.filter(pk__in=created[model]).update(created_revision=revision)
+        if self.tombstones:
+            MapTombstone.objects.bulk_create([MapTombstone(object_type=object_type, object_id=pk, revision=revision)
+                                              for object_type, pk in self.tombstones])
+            prune_tombstones()
+
+
+def pending_revisions():
+    """Changes of the current `deferred_revisions` block, None when every change bumps revision by itself"""
+    pending = getattr(_local, 'pending', None)
+    # Outside of transaction changes are committed at once, so they can't wait for revision
+    if pending is None or not connection.in_atomic_block:
+        return None
+    return pending
+
+
+@contextmanager
+def deferred_revisions():
+    """Changes of boxes, wires and schemes made in the block get revision at its end,
+    or earlier, when `flush_revisions` is called. Nothing is flushed when transaction is going to roll back"""
+    if getattr(_local, 'pending', None) is not None:
+        yield
+        return
+    _local.pending = PendingRevisions()
+    try:
+        yield
+        flush_revisions()
+    finally:
+        _local.pending = None
+
+
+def flush_revisions():
+    pending = pending_revisions()
+    if pending and not connection.get_rollback():
+        pending.flush()
+
+
+def stamp_scheme_boxes(boxes):
+    """Give boxes new scheme revision, at the end of `deferred_revisions` block or at once"""
+    pending = pending_revisions()
+    if pending is not None:
+        pending.scheme_boxes.update(boxes)
+    else:
+        Box.objects.filter(pk__in=boxes).update(scheme_revision=SchemeRevision.bump())
+
+
+def create_tombstone(object_type: str, pk: int):
+    pending = pending_revisions()
+    if pending is not None:
+        pending.tombstones.append((object_type, pk))
+        return
+    MapTombstone.objects.create(object_type=object_type, object_id=pk, revision=MapRevision.bump())
+    prune_tombstones()
+
+
+def prune_tombstones(force: bool = False):
+    """Delete tombstones older than MAP_TOMBSTONE_RETENTION_DAYS, at most once in PRUNE_INTERVAL.
+    Called after bump, so the counter row is already locked by this transaction"""
+    global _pruned_at
+    if not force and _pruned_at is not None and time.monotonic() - _pruned_at < PRUNE_INTERVAL:
+        return
+    _pruned_at = time.monotonic()
+    cutoff = timezone.now() - timedelta(days=settings.MAP_TOMBSTONE_RETENTION_DAYS)
+    pruned = MapTombstone.objects.filter(deleted_at__lt=cutoff).aggregate(revision=Max('revision'))['revision']
+    if pruned is not None:
+        MapTombstone.objects.filter(revision__lte=pruned).delete()
+        MapRevision.objects.filter(pk=1, pruned__lt=pruned).update(pruned=pruned)
@@ -0,0 +1,73 @@
+from django.db import connection
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from core.models import Box, Wire, Client, MapRevision, Fiber, InputPigTail, OutputPigTail, Splitter
+from core.notify import notify_box_statuses
+from core.revisions import pending_revisions, create_tombstone, stamp_scheme_boxes
+
+# Fields of client written by status updates
+STATUS_FIELDS = {'online', 'ip'}
+
+
+@receiver(pre_save, sender=Box)
+@receiver(pre_save, sender=Wire)
+def stamp_revision(sender, instance, **kwargs):
+    if pending_revisions() is not None:
+        return
+    instance.revision = MapRevision.bump()
+    if instance._state.adding:
+        instance.created_revision = instance.revision
+
+
+@receiver(post_save, sender=Box)
+@receiver(post_save, sender=Wire)
+def defer_revision(sender, instance, created, **kwargs):
+    pending = pending_revisions()
+    if pending is not None:
+        pending.saved.append((instance, created))
+
+
+@receiver(post_save, sender=Client)
+def stamp_client_box_revision(sender, instance, update_fields=None, **kwargs):
+    # Client is shown on its box, so box is treated as updated. Statuses change too often for that,
+    # they reach maps through the status stream and box ETags include them by themselves
+    boxes = Box.objects.filter(client=instance)
+    status_only = update_fields is not None and set(update_fields) <= STATUS_FIELDS
+    if connection.in_atomic_block and not status_only:
+        # Boxes are locked before the counter row, in the same order as deferred revisions do it
+        boxes = boxes.select_for_update()
+    boxes = list(boxes.values_list('pk', flat=True))
+    if boxes:
+        if not status_only:
+            pending = pending_revisions()
+            if pending is not None:
+                pending.boxes.update(boxes)
+            else:
+                Box.objects.filter(pk__in=boxes).update(revision=MapRevision.bump())
+        notify_box_statuses((pk, instance.online) for pk in boxes)
+
+
+@receiver(post_delete, sender=Box)
+@receiver(post_delete, sender=Wire)
+def create_box_or_wire_tombstone(sender, instance, **kwargs):
+    create_tombstone(sender.__name__.lower(), instance.pk)
+
+
+@receiver(post_save, sender=Fiber)
+@receiver(post_save, sender=InputPigTail)
+@receiver(post_save, sender=OutputPigTail)
+@receiver(post_save, sender=Splitter)
+@receiver(post_delete, sender=Fiber)
+@receiver(post_delete, sender=InputPigTail)
+@receiver(post_delete, sender=OutputPigTail)
+@receiver(post_delete, sender=Splitter)
+def stamp_scheme_revision(sender, instance, **kwargs):
+    stamp_scheme_boxes((instance.box_id,))
+
+
+@receiver(post_save, sender=Wire)
+@receiver(post_delete, sender=Wire)
+def stamp_wire_ends_scheme_revision(sender, instance, **kwargs):
+    # Wire is listed in related wires of both of its boxes
+    stamp_scheme_boxes((instance.start_id, instance.end_id))
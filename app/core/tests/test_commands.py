@@ -1,8 +1,17 @@
+import os
+import tempfile
+from io import StringIO
 from unittest.mock import patch
 
+from django.contrib.gis.geos import Point
 from django.core.management import call_command
 from django.db.utils import OperationalError
 from django.test import TestCase
+from netaddr import EUI, IPAddress
+
+from core.models import Box, Client, MapRevision
+
+MAC = int(EUI('00-1A-2B-3C-4D-5E'))
 
 
 class CommandTest(TestCase):
@@ -21,3 +30,100 @@ class CommandTest(TestCase):
             gi.side_effect = [OperationalError] * 5 + [True]
             call_command('wait_for_db')
             self.assertEqual(gi.call_count, 6)
+
+
+class LoadClientsTests(TestCase):
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+
+        self.errors_filename = self.filename[:-len('.csv')] + '.errors.csv'
+
+    def tearDown(self):
+        os.remove(self.filename)
+        if os.path.exists(self.errors_filename):
+            os.remove(self.errors_filename)
+
+    def write_rows(self, rows):
+        with open(self.filename, 'w') as fout:
+            fout.write("\n".join(";".join(row) for row in rows) + "\n")
+
+    def load(self, **kwargs):
+        call_command('load_clients', filename=self.filename, stdout=StringIO(), **kwargs)
+
+    def test_bulk_load_creates_clients(self):
+        """Test that bulk load creates every client once"""
+        self.write_rows([['10.0.0.%i' % i, str(EUI(MAC + i))] for i in range(5)]
+                        + [['', str(EUI(MAC))], ['10.0.0.1', '']])
+
+        self.load(bulk=True, chunk_size=2)
+
+        self.assertEqual(Client.objects.count(), 5)
+        self.assertEqual(Client.objects.get(mac=MAC + 3).ip, int(IPAddress('10.0.0.3')))
+
+    def test_bulk_load_keeps_known_ip(self):
+        """Test that bulk load sets IP address only of clients without it, like row by row load"""
+        Client.objects.create(mac=MAC, ip=int(IPAddress('10.0.0.1')))
+        Client.objects.create(mac=MAC + 1)
+        self.write_rows([['10.0.0.100', str(EUI(MAC))],
+                         ['', str(EUI(MAC + 1))],
+                         ['10.0.0.101', str(EUI(MAC + 1))],
+                         ['10.0.0.102', str(EUI(MAC + 1))]])
+
+        self.load(bulk=True, chunk_size=3)
+
+        self.assertEqual(Client.objects.get(mac=MAC).ip, int(IPAddress('10.0.0.1')))
+        self.assertEqual(Client.objects.get(mac=MAC + 1).ip, int(IPAddress('10.0.0.101')))
+
+    def test_bulk_load_bumps_client_box(self):
+        """Test that box of updated client is marked as changed on the map"""
+        client = Client.objects.create(mac=MAC)
+        box = Box.objects.create(name='Client', type_of_box='client', client=client, point=Point([40.17, 55.13]))
+        self.write_rows([['10.0.0.1', str(EUI(MAC))]])
+
+        self.load(bulk=True)
+
+        box.refresh_from_db()
+        self.assertEqual(box.revision, MapRevision.current())
+        self.assertGreater(box.revision, box.created_revision)
+
+    def test_bulk_load_same_as_row_by_row(self):
+        """Test that bulk and row by row loads give the same clients"""
+        rows = [['10.0.0.%i' % (i % 7), str(EUI(MAC + i % 5))] for i in range(12)]
+        self.write_rows(rows)
+        self.load()
+        expected = set(Client.objects.values_list('mac', 'ip'))
+        Client.objects.all().delete()
+
+        self.load(bulk=True, chunk_size=4)
+
+        self.assertEqual(set(Client.objects.values_list('mac', 'ip')), expected)
+
+    def test_bulk_load_rejects_invalid_rows(self):
+        """Test that invalid rows are written to error file and don't stop loading"""
+        self.write_rows([['10.0.0.1', str(EUI(MAC))],
+                         ['10.0.0.300', str(EUI(MAC + 1))],
+                         ['10.0.0.2', 'not-a-mac'],
+                         ['10.0.0.3', str(EUI(MAC + 3))]])
+
+        self.load(bulk=True, chunk_size=3)
+
+        self.assertEqual(set(Client.objects.values_list('mac', flat=True)), {MAC, MAC + 3})
+        with open(self.errors_filename) as fin:
+            rejected = [line.split(';')[:3] for line in fin.read().splitlines()]
+        self.assertEqual(rejected, [['10.0.0.300', str(EUI(MAC + 1)), '2'], ['10.0.0.2', 'not-a-mac', '3']])
+
+    def test_parallel_load_same_as_serial(self):
+        """Test that load with validation workers gives the same clients as serial one"""
+        rows = [['10.0.0.%i' % (i % 7), str(EUI(MAC + i % 5))] for i in range(30)] + [['bad', 'row']]
+        self.write_rows(rows)
+        self.load(bulk=True, chunk_size=4)
+        expected = set(Client.objects.values_list('mac', 'ip'))
+        Client.objects.all().delete()
+
+        self.load(workers=2, chunk_size=4)
+
+        self.assertEqual(set(Client.objects.values_list('mac', 'ip')), expected)
+        with open(self.errors_filename) as fin:
+            self.assertEqual(len(fin.read().splitlines()), 1)
@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.models import Splitter, MapRevision, SchemeRevision, MapTombstone
+from core.revisions import deferred_revisions, prune_tombstones
+from core.tests.utils import sample_box, sample_wire
+
+
+class DeferredRevisionsTests(TestCase):
+
+    def test_changes_share_revision(self):
+        """Test that changes made in block get one revision at its end"""
+        deleted = sample_box(name='deleted')
+        revision = MapRevision.current()
+        with deferred_revisions():
+            box = sample_box()
+            wire = sample_wire(box, deleted)
+            deleted.delete()
+            self.assertEqual(MapRevision.current(), revision)
+
+        box.refresh_from_db()
+        self.assertEqual(MapRevision.current(), revision + 1)
+        self.assertEqual((box.revision, box.created_revision), (revision + 1, revision + 1))
+        self.assertEqual(wire.revision, revision + 1)
+        self.assertEqual(MapTombstone.objects.get(object_type='box').revision, revision + 1)
+
+    def test_scheme_change_keeps_map_revision(self):
+        """Test that change of box contents bumps only scheme revision"""
+        box = sample_box()
+        revision, scheme_revision = MapRevision.current(), SchemeRevision.current()
+        with deferred_revisions():
+            Splitter.objects.create(box=box, n_terminals=2)
+
+        box.refresh_from_db()
+        self.assertEqual(MapRevision.current(), revision)
+        self.assertEqual(box.scheme_revision, scheme_revision + 1)
+
+    def test_counter_locked_after_writes(self):
+        """Test that counter row is bumped after all other writes of block"""
+        with CaptureQueriesContext(connection) as context:
+            with deferred_revisions():
+                sample_box()
+                sample_box()
+
+        queries = [query['sql'] for query in context.captured_queries]
+        bump = next(i for i, sql in enumerate(queries) if MapRevision._meta.db_table in sql)
+        self.assertEqual(len([sql for sql in queries[:bump] if sql.startswith('INSERT')]), 2)
+
+
+@override_settings(MAP_TOMBSTONE_RETENTION_DAYS=30)
+class PruneTombstonesTests(TestCase):
+
+    def test_old_tombstones_pruned(self):
+        """Test that tombstones older than retention are deleted and their revision is remembered"""
+        sample_box(name='old').delete()
+        old_revision = MapRevision.current()
+        MapTombstone.objects.update(deleted_at=timezone.now() - timedelta(days=31))
+        sample_box(name='new').delete()
+
+        prune_tombstones(force=True)
+
+        self.assertEqual(list(MapTombstone.objects.values_list('revision', flat=True)), [MapRevision.current()])
+        self.assertEqual(MapRevision.state(), (MapRevision.current(), old_revision))
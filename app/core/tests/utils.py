@@ -0,0 +1,19 @@
+from django.contrib.gis.geos import Point, LineString
+
+from core.models import Box, Wire
+
+
+def sample_box(user=None, **params):
+    """Create and return a sample box object"""
+    defaults = {
+        'name': 'Sample box',
+        'point': Point([40.17, 55.13])
+    }
+    defaults.update(params)
+
+    return Box.objects.create(user=user, **defaults)
+
+
+def sample_wire(start, end, **params):
+    """Create and return a straight wire between two boxes"""
+    return Wire.objects.create(start=start, end=end, path=LineString(start.point.coords, end.point.coords), **params)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class GeoserverConfig(AppConfig):
     name = 'geoserver'
+
+    def ready(self):
+        from geoserver import signals  # noqa: F401
@@ -0,0 +1,168 @@
+from django.contrib.gis.geos import Point, LineString
+from django.db import transaction
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+from core.models import Box, Wire, Client, MapRevision, SchemeRevision
+from .serializers import PostBoxSerializer, PostWireSerializer
+from .tiles import invalidate_tiles
+
+BULK_MAX_FEATURES = 10000
+
+
+class BulkBoxSerializer(PostBoxSerializer):
+    """Box of FeatureCollection, wires of the same collection refer to it by `ref`"""
+    ref = serializers.CharField(max_length=64, required=False)
+
+
+class BulkWireSerializer(PostWireSerializer):
+    """Wire of FeatureCollection, each of its ends is either existing box id or ref of new box"""
+    start_id = serializers.IntegerField(required=False)
+    end_id = serializers.IntegerField(required=False)
+    start_ref = serializers.CharField(max_length=64, required=False)
+    end_ref = serializers.CharField(max_length=64, required=False)
+    path = serializers.ListField(
+        child=serializers.ListField(
+            child=serializers.FloatField(),
+            max_length=2,
+            min_length=2),
+        required=False,
+        default=list)
+
+    @staticmethod
+    def validate_pk(value):
+        # Existing boxes are checked for all wires of collection at once
+        pass
+
+    def validate(self, attrs):
+        for end in ('start', 'end'):
+            if (end + '_id' in attrs) == (end + '_ref' in attrs):
+                raise serializers.ValidationError("Exactly one of %s_id and %s_ref is required" % (end, end))
+        return attrs
+
+
+def feature_data(feature) -> dict:
+    """Convert GeoJSON feature to data of PostBoxSerializer or PostWireSerializer.
+    Coordinates of wire LineString are its points between boxes, as `path` of PostWireSerializer"""
+    if not isinstance(feature, dict) or feature.get('type') != 'Feature':
+        raise serializers.ValidationError("Feature object is expected")
+    data = dict(feature.get('properties') or {})
+    geometry = feature.get('geometry') or {}
+    if geometry.get('type') == 'Point':
+        coordinates = geometry.get('coordinates') or []
+        if len(coordinates) != 2:
+            raise serializers.ValidationError("Point should have 2 coordinates")
+        data['lng'], data['lat'] = coordinates
+    elif geometry.get('type') == 'LineString' or not geometry:
+        data['path'] = geometry.get('coordinates') or []
+    else:
+        raise serializers.ValidationError("Only Point and LineString features are supported")
+    return data
+
+
+def parse_feature_collection(data) -> tuple:
+    """Validate all features in one pass, return validated data of boxes and wires.
+    Errors are reported under indexes of their features"""
+    if not isinstance(data, dict) or data.get('type') != 'FeatureCollection' \
+            or not isinstance(data.get('features'), list):
+        raise ValidationError({'type': ["FeatureCollection is expected"]})
+    if len(data['features']) > BULK_MAX_FEATURES:
+        raise ValidationError({'features': ["At most %i features are accepted at once" % BULK_MAX_FEATURES]})
+    boxes, wires, errors = [], [], {}
+    for i, feature in enumerate(data['features']):
+        try:
+            properties = feature_data(feature)
+        except serializers.ValidationError as e:
+            errors[i] = e.detail
+            continue
+        serializer = BulkBoxSerializer if 'lat' in properties else BulkWireSerializer
+        serializer = serializer(data=properties)
+        if not serializer.is_valid():
+            errors[i] = serializer.errors
+        elif 'lat' in properties:
+            boxes.append((i, serializer.validated_data))
+        else:
+            wires.append((i, serializer.validated_data))
+
+    refs = {}
+    for i, box in boxes:
+        if 'ref' in box:
+            if box['ref'] in refs:
+                errors[i] = {'ref': ["Duplicated ref %s" % box['ref']]}
+            refs[box['ref']] = i
+    macs = {}
+    for i, box in boxes:
+        mac = box.get('mac')
+        if mac and mac != -1:
+            if mac in macs:
+                errors[i] = {'mac': ["Client is already connected to box of feature %i" % macs[mac]]}
+            macs[mac] = i
+    for mac, pk in Box.objects.filter(client__mac__in=macs).values_list('client__mac', 'pk'):
+        errors[macs[mac]] = {'mac': ["Client is already connected to box %i" % pk]}
+    for i, wire in wires:
+        for end in ('start', 'end'):
+            ref = wire.get(end + '_ref')
+            if ref is not None and ref not in refs:
+                errors[i] = {end + '_ref': ["Unknown ref %s" % ref]}
+    box_ids = {wire[end + '_id'] for i, wire in wires for end in ('start', 'end') if end + '_id' in wire}
+    known = set(Box.objects.filter(pk__in=box_ids).values_list('pk', flat=True))
+    for i, wire in wires:
+        for end in ('start', 'end'):
+            if end + '_id' in wire and wire[end + '_id'] not in known:
+                errors[i] = {end + '_id': ["Requested box doesn't exists"]}
+    if errors:
+        raise ValidationError({'features': errors})
+    return [box for i, box in boxes], [wire for i, wire in wires]
+
+
+def get_clients(boxes) -> dict:
+    """Clients of new client boxes keyed by MAC, unknown ones are created at once"""
+    ips = {box['mac']: box.get('ip') for box in boxes if box.get('mac') and box['mac'] != -1}
+    clients = {client.mac: client for client in Client.objects.filter(mac__in=ips)}
+    created = Client.objects.bulk_create([Client(mac=mac) for mac in ips if mac not in clients])
+    clients.update((client.mac, client) for client in created)
+    changed = []
+    for mac, ip in ips.items():
+        if ip and ip != -1 and clients[mac].ip != ip:
+            clients[mac].ip = ip
+            changed.append(clients[mac])
+    Client.objects.bulk_update(changed, ['ip'])
+    return clients
+
+
+@transaction.atomic
+def create_features(boxes: list, wires: list, user) -> dict:
+    """Insert validated boxes and wires with a few queries.
+    `bulk_create` skips signals, so all of them get one revision here"""
+    clients = get_clients(boxes)
+    # Existing boxes are locked before the counter row, as every writer does it
+    existing = Box.objects.select_for_update().only('id', 'point').in_bulk(
+        {wire[end + '_id'] for wire in wires for end in ('start', 'end') if end + '_id' in wire})
+    revision = MapRevision.bump()
+    scheme_revision = SchemeRevision.bump()
+    new_boxes = []
+    for box in boxes:
+        fields = {name: box[name] for name in ('name', 'description', 'type_of_box') if name in box}
+        new_boxes.append(Box(user=user, point=Point(box['lng'], box['lat']), client=clients.get(box.get('mac')),
+                             revision=revision, created_revision=revision, scheme_revision=scheme_revision,
+                             **fields))
+    Box.objects.bulk_create(new_boxes)
+
+    refs = {box['ref']: new_box for box, new_box in zip(boxes, new_boxes) if 'ref' in box}
+    new_wires = []
+    for wire in wires:
+        start = refs[wire['start_ref']] if 'start_ref' in wire else existing[wire['start_id']]
+        end = refs[wire['end_ref']] if 'end_ref' in wire else existing[wire['end_id']]
+        path = LineString(start.point.coords, *map(tuple, wire['path']), end.point.coords)
+        new_wires.append(Wire(user=user, start=start, end=end, path=path, description=wire.get('description', ''),
+                              revision=revision, created_revision=revision))
+    Wire.objects.bulk_create(new_wires)
+    # New wires are listed in related wires of existing boxes
+    Box.objects.filter(pk__in=existing).update(scheme_revision=scheme_revision)
+    invalidate_tiles([box.point.extent for box in new_boxes] + [wire.path.extent for wire in new_wires])
+    return {
+        'boxes': [box.pk for box in new_boxes],
+        'wires': [wire.pk for wire in new_wires],
+        'refs': {ref: box.pk for ref, box in refs.items()},
+        'revision': revision,
+    }
@@ -0,0 +1,137 @@
+import functools
+import operator
+
+from django.conf import settings
+from django.contrib.gis.geos import Polygon
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+
+from app.utils import parse_bbox, mac_prefix_range, ip_prefix_ranges
+
+MAX_ZOOM = 24
+CLIENT_SEARCH_LIMIT = 20
+CLIENT_SEARCH_MAX_LIMIT = 100
+
+
+class Viewport:
+    """Visible part of the map, requested by client as bbox and zoom.
+
+    Filters use intersection lookups, which are answered by the GiST
+    indexes created by GeoDjango for `Box.point` and `Wire.path`."""
+
+    def __init__(self, bbox=None, zoom=None):
+        self.bbox = bbox
+        self.zoom = zoom
+
+    @classmethod
+    def from_query_params(cls, query_params):
+        if query_params is None:
+            return cls()
+        bbox = query_params.get('bbox')
+        zoom = query_params.get('zoom')
+        try:
+            bbox = parse_bbox(bbox) if bbox else None
+        except ValueError as e:
+            raise ValidationError({'bbox': [str(e)]})
+        if zoom:
+            try:
+                zoom = int(zoom)
+            except ValueError:
+                raise ValidationError({'zoom': ["Zoom should be an integer"]})
+            if zoom < 0 or zoom > MAX_ZOOM:
+                raise ValidationError({'zoom': ["Zoom should be from 0 to %i" % MAX_ZOOM]})
+        else:
+            zoom = None
+        return cls(bbox, zoom)
+
+    @property
+    def polygon(self):
+        if self.bbox is None:
+            return None
+        polygon = Polygon.from_bbox(self.bbox)
+        polygon.srid = 4326
+        return polygon
+
+    @property
+    def hide_clients(self):
+        return self.zoom is not None and self.zoom < settings.MAP_CLIENT_BOXES_MIN_ZOOM
+
+    def boxes(self, queryset):
+        if self.bbox is not None:
+            queryset = queryset.filter(point__intersects=self.polygon)
+        if self.hide_clients:
+            queryset = queryset.exclude(type_of_box='client')
+        return queryset
+
+    def wires(self, queryset):
+        if self.bbox is not None:
+            queryset = queryset.filter(path__intersects=self.polygon)
+        if self.hide_clients:
+            queryset = queryset.exclude(end__type_of_box='client').exclude(start__type_of_box='client')
+        return queryset
+
+
+class ClientSearch:
+    """Type-ahead search of clients by prefix of MAC or IP address, one page at a time.
+
+    Prefixes are converted to ranges of integer addresses, which are answered
+    by the indexes of `Client.mac` and `Client.ip`"""
+    PARAMS = ('q', 'limit', 'offset')
+
+    def __init__(self, q='', limit=CLIENT_SEARCH_LIMIT, offset=0):
+        self.q = q.strip()
+        self.limit = limit
+        self.offset = offset
+
+    @classmethod
+    def is_requested(cls, query_params) -> bool:
+        return query_params is not None and any(param in query_params for param in cls.PARAMS)
+
+    @classmethod
+    def from_query_params(cls, query_params):
+        if query_params is None:
+            return cls()
+        limit = cls.parse_int(query_params, 'limit', CLIENT_SEARCH_LIMIT)
+        if not 1 <= limit <= CLIENT_SEARCH_MAX_LIMIT:
+            raise ValidationError({'limit': ["Limit should be from 1 to %i" % CLIENT_SEARCH_MAX_LIMIT]})
+        offset = cls.parse_int(query_params, 'offset', 0)
+        if offset < 0:
+            raise ValidationError({'offset': ["Offset should be positive"]})
+        return cls(query_params.get('q', ''), limit, offset)
+
+    @staticmethod
+    def parse_int(query_params, name, default):
+        if not query_params.get(name):
+            return default
+        try:
+            return int(query_params[name])
+        except ValueError:
+            raise ValidationError({name: ["%s should be an integer" % name.capitalize()]})
+
+    @property
+    def by_ip(self) -> bool:
+        """Prefix with dots is IP address prefix, prefix of digits may be of both"""
+        return '.' in self.q and not self.q.startswith('.') and all(
+            part.isdigit() or not part for part in self.q.split('.'))
+
+    def condition(self) -> Q:
+        ranges = []
+        try:
+            ranges.extend(Q(ip__range=r) for r in ip_prefix_ranges(self.q))
+        except ValueError:
+            pass
+        if not self.by_ip:
+            try:
+                ranges.append(Q(mac__range=mac_prefix_range(self.q)))
+            except ValueError:
+                pass
+        if not ranges:
+            raise ValidationError({'q': ["Query should be prefix of MAC or IP address"]})
+        return functools.reduce(operator.or_, ranges)
+
+    def clients(self, queryset):
+        """Page of matching clients and one more, to tell whether the next page exists"""
+        if self.q:
+            queryset = queryset.filter(self.condition())
+        queryset = queryset.order_by('ip' if self.by_ip else 'mac', 'id')
+        return queryset[self.offset:self.offset + self.limit + 1]
@@ -0,0 +1,36 @@
+from rest_framework_gis.fields import GeometryField
+
+# Geometry is converted by the same field GeoFeatureModelSerializer uses, so the output is the same
+GEOMETRY = GeometryField()
+
+
+def feature(geometry, properties: dict) -> dict:
+    return {"type": "Feature", "geometry": GEOMETRY.to_representation(geometry), "properties": properties}
+
+
+def feature_collection(features: list) -> dict:
+    return {"type": "FeatureCollection", "features": features}
+
+
+def box_collection(boxes) -> dict:
+    """Features of box_list_view built straight from database rows, without serializer per field"""
+    features = [
+        feature(point, {"id": pk, "name": name, "description": description, "type_of_box": type_of_box})
+        for pk, name, description, type_of_box, point in boxes.filter(type_of_box="regular").values_list(
+            'id', 'name', 'description', 'type_of_box', 'point')
+    ]
+    features.extend(
+        feature(point, {"id": pk, "name": name, "description": description, "type_of_box": type_of_box,
+                        "online": online if online is not None else False})
+        for pk, name, description, type_of_box, point, online in boxes.filter(type_of_box="client").values_list(
+            'id', 'name', 'description', 'type_of_box', 'point', 'client__online')
+    )
+    return feature_collection(features)
+
+
+def wire_collection(wires) -> dict:
+    """Features of WireSerializer built straight from database rows"""
+    return feature_collection([
+        feature(path, {"id": pk, "start": start, "end": end})
+        for pk, start, end, path in wires.values_list('id', 'start_id', 'end_id', 'path')
+    ])
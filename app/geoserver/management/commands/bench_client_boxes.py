@@ -0,0 +1,60 @@
+import time
+
+from django.contrib.gis.geos import Point
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Box, Client
+from geoserver.geojson import box_collection
+from geoserver.serializers import BoxSerializer, ClientBoxSerializer, box_list_view
+from .bench_map_rendering import Rollback
+
+
+def sample_client_boxes(n_boxes: int):
+    """Client boxes, each with its own client, half of clients are online"""
+    clients = Client.objects.bulk_create([Client(mac=i, ip=i, online=i % 2 == 0) for i in range(n_boxes)])
+    Box.objects.bulk_create([
+        Box(name="Client %i" % i, point=Point(37.0 + (i % 300) * 0.001, 55.0 + (i // 300) * 0.001),
+            type_of_box="client", client=client)
+        for i, client in enumerate(clients)
+    ])
+
+
+def unjoined_box_list_view(boxes):
+    """box_list_view as it was before client was joined to its box"""
+    data = BoxSerializer(boxes.filter(type_of_box="regular"), many=True).data
+    data['features'].extend(ClientBoxSerializer(boxes.filter(type_of_box="client"), many=True).data['features'])
+    return data
+
+
+class Command(BaseCommand):
+    help = 'count queries and time of map boxes on synthetic client boxes, nothing is saved'
+
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument('--boxes', dest='boxes', type=int, default=10000)
+
+    def handle(self, *args, **kwargs):
+        try:
+            with transaction.atomic():
+                sample_client_boxes(kwargs['boxes'])
+                self.run()
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self):
+        boxes = Box.objects.all()
+        paths = (
+            ("unjoined", lambda: unjoined_box_list_view(boxes)),
+            ("box_list_view", lambda: box_list_view(boxes)),
+            ("direct", lambda: box_collection(boxes)),
+        )
+        self.stdout.write("%14s %8s %10s" % ("path", "queries", "time, ms"))
+        for name, build in paths:
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                build()
+                elapsed = time.perf_counter() - start
+            self.stdout.write("%14s %8i %10.1f" % (name, len(context.captured_queries), elapsed * 1000))
@@ -0,0 +1,80 @@
+import time
+
+from django.contrib.gis.geos import Point, LineString
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from app.renderers import FastJSONRenderer, orjson
+from core.models import Box, Wire, Client
+from geoserver.geojson import box_collection, wire_collection
+from geoserver.serializers import WireSerializer, box_list_view
+
+
+class Rollback(Exception):
+    pass
+
+
+def sample_map(n_features: int):
+    """Synthetic map: chains of boxes, every tenth box is client one, boxes of chain are connected by wires"""
+    n_boxes = n_features * 2 // 3
+    clients = Client.objects.bulk_create([Client(mac=i, online=i % 2 == 0) for i in range(n_boxes // 10)])
+    boxes = Box.objects.bulk_create([
+        Box(name="Box %i" % i, point=Point(37.0 + (i % 300) * 0.001, 55.0 + (i // 300) * 0.001),
+            type_of_box="client" if i % 10 == 0 else "regular",
+            client=clients[i // 10] if i % 10 == 0 and i // 10 < len(clients) else None)
+        for i in range(n_boxes)
+    ])
+    Wire.objects.bulk_create([
+        Wire(start=boxes[i], end=boxes[i + 1], path=LineString(boxes[i].point.coords, boxes[i + 1].point.coords))
+        for i in range(n_features - n_boxes)
+    ])
+
+
+class Command(BaseCommand):
+    help = 'compare speed of map serialization and rendering paths on synthetic map, nothing is saved'
+
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument('--features', dest='features', type=int, default=50000)
+        parser.add_argument('--repeat', dest='repeat', type=int, default=3)
+
+    def handle(self, *args, **kwargs):
+        try:
+            with transaction.atomic():
+                sample_map(kwargs['features'])
+                self.run(kwargs['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, repeat):
+        boxes, wires = Box.objects.all(), Wire.objects.all()
+        paths = (
+            ("serializers", lambda: {"wires": WireSerializer(wires, many=True).data, "boxes": box_list_view(boxes)}),
+            ("direct", lambda: {"wires": wire_collection(wires), "boxes": box_collection(boxes)}),
+        )
+        renderers = [("json", JSONRenderer())]
+        if orjson is not None:
+            renderers.append(("orjson", FastJSONRenderer()))
+        else:
+            self.stdout.write(self.style.WARNING("orjson is not installed, FastJSONRenderer falls back to json"))
+        self.stdout.write("%12s %8s %12s %12s %12s" % ("path", "renderer", "build, ms", "render, ms", "bytes"))
+        reference = None
+        for name, build in paths:
+            for renderer_name, renderer in renderers:
+                build_time = render_time = 0
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    data = build()
+                    build_time += time.perf_counter() - start
+                    start = time.perf_counter()
+                    body = renderer.render(data)
+                    render_time += time.perf_counter() - start
+                if reference is None:
+                    reference = body
+                elif body != reference:
+                    self.stdout.write(self.style.ERROR("%s with %s differs from serializers with json"
+                                                       % (name, renderer_name)))
+                self.stdout.write("%12s %8s %12.1f %12.1f %12i" % (name, renderer_name, build_time / repeat * 1000,
+                                                                   render_time / repeat * 1000, len(body)))
@@ -1,20 +1,27 @@
-import itertools
 from json import dumps
 
+from django.conf import settings
 from django.contrib.gis.geos import Point, LineString
+from django.urls import reverse
 from netaddr import EUI, IPAddress
 from rest_framework import serializers
 from rest_framework_gis.serializers import GeoFeatureModelSerializer
 
+from app.utils import format_mac, format_ip
 from core.models import Box, Wire, Client
+from geoserver.geojson import box_collection, wire_collection
 from scheme.serializers import SchemeSerializer, InternalSchemeSerializer
-from scheme.utils import get_img
+from scheme.snapshot import BoxSnapshot
+from scheme.cache import get_cached_img, scheme_key
+from scheme.workers import request_render
 
 
-def box_list_view():
-    boxes = Box.objects.filter(type_of_box="regular")
-    serializer_data = BoxSerializer(boxes, many=True).data
-    clients = Box.objects.filter(type_of_box="client")
+def box_list_view(boxes=None):
+    if boxes is None:
+        boxes = Box.objects.all()
+    serializer_data = BoxSerializer(boxes.filter(type_of_box="regular"), many=True).data
+    # Client status is read from the same joined query, not by query per box
+    clients = boxes.filter(type_of_box="client").select_related('client')
     serializer_data['features'].extend(ClientBoxSerializer(clients, many=True).data['features'])
     return serializer_data
 
@@ -57,6 +64,26 @@ class BoxValidator:
         return attrs
 
 
+class DynamicFieldsMixin:
+    """Restricts serialized fields to `fields` list, if it is passed.
+    Expensive fields from Meta.optional_fields are serialized only when listed in `include` or `fields`"""
+
+    def __init__(self, *args, fields=None, include=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        optional = set(getattr(self.Meta, 'optional_fields', ()))
+        include = set(include or ())
+        if fields is not None:
+            include |= optional.intersection(fields)
+            allowed = include.union(fields)
+        else:
+            allowed = None
+        for name in list(self.fields):
+            if name in ('id', self.Meta.geo_field):
+                continue
+            if (name in optional and name not in include) or (allowed is not None and name not in allowed):
+                self.fields.pop(name)
+
+
 class BoxSerializer(GeoFeatureModelSerializer):
     """Serializer for box objects"""
 
@@ -85,30 +112,63 @@ class ClientBoxSerializer(GeoFeatureModelSerializer):
         return False
 
 
-class BoxExtendedSerializer(GeoFeatureModelSerializer):
+class BoxExtendedSerializer(DynamicFieldsMixin, GeoFeatureModelSerializer):
     """Serializer for box objects"""
     scheme = serializers.SerializerMethodField()
     image = serializers.SerializerMethodField()
+    image_status = serializers.SerializerMethodField()
+    image_url = serializers.SerializerMethodField()
     related_wires = serializers.SerializerMethodField()
 
     class Meta:
         model = Box
         geo_field = 'point'
         id_field = False
-        fields = ('id', 'name', 'description', 'type_of_box', 'scheme', 'image', 'related_wires')
+        fields = ('id', 'name', 'description', 'type_of_box', 'scheme', 'image', 'image_status', 'image_url',
+                  'related_wires')
+        # Image fields need InternalSchemeSerializer and rendering, so they are opt-in
+        optional_fields = ('image', 'image_status', 'image_url')
         read_only_fields = ('id',)
 
+    def __init__(self, *args, fields=None, include=None, **kwargs):
+        if not settings.SCHEME_IMAGE_INLINE:
+            # Image isn't embedded, so its URL and rendering status are sent in its place
+            fields, include = self.replace_image(fields), self.replace_image(include)
+        super().__init__(*args, fields=fields, include=include, **kwargs)
+
+    @staticmethod
+    def replace_image(names):
+        if names is None or 'image' not in names:
+            return names
+        return [name for name in names if name != 'image'] + ['image_url', 'image_status']
+
     def get_scheme(self, obj):
         return SchemeSerializer(obj).data
 
+    def get_internal_scheme(self, obj):
+        # Shared by image fields, so scheme of a box is serialized once
+        cached = getattr(self, '_internal_scheme', None)
+        if cached is None or cached[0] != obj.pk:
+            cached = self._internal_scheme = (obj.pk, InternalSchemeSerializer(obj).data)
+        return cached[1]
+
     def get_image(self, obj):
-        return get_img(InternalSchemeSerializer(obj).data)
+        return get_cached_img(self.get_internal_scheme(obj))
+
+    def get_image_status(self, obj):
+        data = self.get_internal_scheme(obj)
+        return request_render(scheme_key(data, settings.SCHEME_IMAGE_FORMAT), data, settings.SCHEME_IMAGE_FORMAT)
+
+    def get_image_url(self, obj):
+        return "%s?v=%s" % (reverse('geoserver:scheme:scheme-image', args=[obj.pk, settings.SCHEME_IMAGE_FORMAT]),
+                            scheme_key(self.get_internal_scheme(obj), settings.SCHEME_IMAGE_FORMAT))
 
     def get_related_wires(self, obj):
-        return [el['id'] for el in itertools.chain(obj.input_wires.values(), obj.output_wires.values())]
+        snapshot = BoxSnapshot.of(obj)
+        return snapshot.input_wires + snapshot.output_wires
 
 
-class ClientBoxExtendedSerializer(GeoFeatureModelSerializer):
+class ClientBoxExtendedSerializer(DynamicFieldsMixin, GeoFeatureModelSerializer):
     """Serializer for box objects"""
     mac = serializers.SerializerMethodField()
     ip = serializers.SerializerMethodField()
@@ -124,13 +184,13 @@ class ClientBoxExtendedSerializer(GeoFeatureModelSerializer):
     def get_mac(self, obj):
         if obj.client is not None and obj.client.mac is not None:
             # TODO: try-catch with logging
-            return str(EUI(obj.client.mac))
+            return format_mac(obj.client.mac)
         return ''
 
     def get_ip(self, obj):
         if obj.client is not None and obj.client.ip is not None:
             # TODO: try-catch with logging
-            return str(IPAddress(obj.client.ip))
+            return format_ip(obj.client.ip)
         return ''
 
     def get_online(self, obj):
@@ -255,17 +315,26 @@ class PostWireSerializer(serializers.Serializer):
         return value
 
 
+def map_collections(instance) -> tuple:
+    """Wire and box feature collections of WireBox"""
+    if settings.MAP_DIRECT_GEOJSON:
+        return wire_collection(instance.wires), box_collection(instance.boxes)
+    return WireSerializer(instance.wires, many=True).data, box_list_view(instance.boxes)
+
+
 class MapSerializer(serializers.Serializer):
     def to_representation(self, instance):
+        wires, boxes = map_collections(instance)
         return {
-            "wires": WireSerializer(instance.wires, many=True).data,
-            "boxes": box_list_view()
+            "wires": wires,
+            "boxes": boxes
         }
 
 
 class MapStringSerializer(serializers.Serializer):
     def to_representation(self, instance):
+        wires, boxes = map_collections(instance)
         return {
-            "wires": dumps(WireSerializer(instance.wires, many=True).data),
-            "boxes": dumps(box_list_view())
+            "wires": dumps(wires),
+            "boxes": dumps(boxes)
         }
@@ -0,0 +1,38 @@
+from django.db.models import Q
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from core.models import Box, Wire
+from .tiles import invalidate_tiles
+
+
+@receiver(pre_save, sender=Box)
+@receiver(pre_save, sender=Wire)
+def invalidate_old_tiles(sender, instance, **kwargs):
+    # Geometry may be changed in place, so the saved one is read from database
+    if instance._state.adding:
+        return
+    if sender is Box:
+        old = Box.objects.filter(pk=instance.pk).values_list('point', 'type_of_box').first()
+        if old is None:
+            return
+        extents = [old[0].extent]
+        if old[1] != instance.type_of_box:
+            # Wires of client boxes are hidden on small zoom levels
+            wires = Wire.objects.filter(Q(start=instance) | Q(end=instance))
+            extents.extend(path.extent for path in wires.values_list('path', flat=True))
+    else:
+        extents = [path.extent for path in Wire.objects.filter(pk=instance.pk).values_list('path', flat=True)]
+    invalidate_tiles(extents)
+
+
+@receiver(post_save, sender=Box)
+@receiver(post_delete, sender=Box)
+def invalidate_box_tiles(sender, instance, **kwargs):
+    invalidate_tiles([instance.point.extent])
+
+
+@receiver(post_save, sender=Wire)
+@receiver(post_delete, sender=Wire)
+def invalidate_wire_tiles(sender, instance, **kwargs):
+    invalidate_tiles([instance.path.extent])
@@ -0,0 +1,160 @@
+import json
+import logging
+import select
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connection
+
+from core.notify import CLIENT_STATUS_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+# Browser reconnects after this many milliseconds if stream is broken
+STREAM_RETRY_MS = 3000
+
+
+class Subscription:
+    """Pending status changes of one stream.
+    Changes of the same box are coalesced, so slow client gets only the latest status of every box.
+    When more than `max_pending` boxes are pending, they are dropped and client is asked to resync"""
+
+    def __init__(self, max_pending: int = None):
+        self.max_pending = max_pending or settings.STATUS_STREAM_MAX_PENDING
+        self._pending = OrderedDict()
+        self._overflow = False
+        self._condition = threading.Condition()
+
+    def put(self, statuses):
+        with self._condition:
+            if self._overflow:
+                return
+            for box_id, online in statuses:
+                self._pending.pop(box_id, None)
+                self._pending[box_id] = online
+            if len(self._pending) > self.max_pending:
+                self.resync()
+            self._condition.notify()
+
+    def resync(self):
+        """Drop pending changes, client should reload the whole map instead"""
+        with self._condition:
+            self._pending.clear()
+            self._overflow = True
+            self._condition.notify()
+
+    def get(self, timeout: float = None) -> tuple:
+        """Wait for changes, return list of (box id, online) and whether client should resync"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._pending or self._overflow, timeout)
+            statuses = list(self._pending.items())
+            overflow = self._overflow
+            self._pending.clear()
+            self._overflow = False
+        return statuses, overflow
+
+
+class StatusHub:
+    """Fan-out of CLIENT_STATUS_CHANNEL notifications to subscriptions of this process.
+    One thread listens to the channel with its own database connection, it is started by the first subscription.
+    At most STATUS_STREAM_MAX_CONNECTIONS subscriptions are served at once"""
+
+    poll_timeout = 5
+    max_delay = 30
+
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+    def is_full(self) -> bool:
+        return len(self._subscriptions) >= settings.STATUS_STREAM_MAX_CONNECTIONS
+
+    def subscribe(self, max_pending: int = None):
+        """New subscription, None when the hub is full"""
+        subscription = Subscription(max_pending)
+        with self._lock:
+            if self.is_full():
+                return None
+            self._subscriptions.add(subscription)
+        self.start()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, statuses):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.put(statuses)
+
+    def resync(self):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.resync()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.listen, name='status-hub', daemon=True)
+                self._thread.start()
+
+    def listen(self):
+        attempt = 0
+        while True:
+            try:
+                connection.ensure_connection()
+                with connection.cursor() as cursor:
+                    cursor.execute('LISTEN %s' % CLIENT_STATUS_CHANNEL)
+                raw = connection.connection
+                attempt = 0
+                while True:
+                    if select.select([raw], [], [], self.poll_timeout) == ([], [], []):
+                        continue
+                    raw.poll()
+                    while raw.notifies:
+                        self.publish(json.loads(raw.notifies.pop(0).payload))
+            except Exception as e:
+                logger.error("Status notifications are lost: %s", e)
+                # Changes might be missed while there was no listener
+                self.resync()
+                connection.close()
+                attempt += 1
+                time.sleep(min(self.max_delay, 2 ** attempt))
+
+
+hub = StatusHub()
+
+
+def status_events(heartbeat: float = None, max_pending: int = None):
+    """Server-Sent Events of status changes: `status` with list of {box_id, online} and `resync`.
+    Comment is sent when nothing happens during `heartbeat` seconds, so proxies keep connection open.
+
+    Hub is subscribed to when the stream starts: generator, which is closed before that,
+    doesn't run its `finally` and would never unsubscribe"""
+    heartbeat = heartbeat or settings.STATUS_STREAM_HEARTBEAT
+    subscription = hub.subscribe(max_pending)
+    yield 'retry: %i\n\n' % STREAM_RETRY_MS
+    if subscription is None:
+        # Hub was filled up after the request was accepted, browser reconnects later
+        return
+    try:
+        while True:
+            statuses, overflow = subscription.get(heartbeat)
+            if overflow:
+                yield 'event: resync\ndata: {}\n\n'
+            elif statuses:
+                data = [{'box_id': box_id, 'online': online} for box_id, online in statuses]
+                yield 'event: status\ndata: %s\n\n' % json.dumps(data, separators=(',', ':'))
+            else:
+                yield ': keepalive\n\n'
+    finally:
+        hub.unsubscribe(subscription)
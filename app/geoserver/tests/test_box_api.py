@@ -1,13 +1,15 @@
 import json
+from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
 from django.contrib.gis.geos import Point
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Box
+from core.models import Box, MapRevision
+from core.tests.utils import sample_box, sample_wire
 from geoserver.serializers import BoxSerializer
 
 BOX_URL = reverse('geoserver:box-list')
@@ -18,17 +20,6 @@ def detail_url(box_id):
     return reverse('geoserver:box-detail', args=[box_id])
 
 
-def sample_box(user, **params):
-    """Create and return a sample box object"""
-    defaults = {
-        'name': 'Sample box',
-        'point': Point([100, 500])
-    }
-    defaults.update(params)
-
-    return Box.objects.create(user=user, **defaults)
-
-
 class PublicBoxApiTests(object):
     """Test unauthenticated box API access"""
 
@@ -92,3 +83,75 @@ class PrivateBoxApiTests(TestCase):
 
         serializer = BoxSerializer(box)
         self.assertEqual(res.data, serializer.data)
+
+    def test_box_detail_fields(self):
+        """Test that box detail is restricted to requested fields"""
+        box = sample_box(user=self.user, type_of_box='client')
+
+        res = self.client.get(detail_url(box.id), {'fields': 'name'})
+
+        self.assertEqual(set(res.data['data']['properties']), {'id', 'name'})
+
+    def test_box_detail_image_opt_in(self):
+        """Test that scheme image is serialized only when included"""
+        box = sample_box(user=self.user)
+
+        with patch('geoserver.serializers.InternalSchemeSerializer') as internal_scheme:
+            res = self.client.get(detail_url(box.id))
+            internal_scheme.assert_not_called()
+        self.assertNotIn('image', res.data['data']['properties'])
+        self.assertIn('scheme', res.data['data']['properties'])
+
+        res = self.client.get(detail_url(box.id), {'include': 'image_url'})
+        self.assertIn('image_url', res.data['data']['properties'])
+
+    @override_settings(SCHEME_IMAGE_INLINE=False, SCHEME_RENDER_WORKERS=0)
+    def test_box_detail_image_not_inline(self):
+        """Test that image URL and status are sent in place of image, when images aren't embedded"""
+        box = sample_box(user=self.user)
+
+        res = self.client.get(detail_url(box.id), {'include': 'image'})
+
+        properties = res.data['data']['properties']
+        self.assertNotIn('image', properties)
+        self.assertIn('image_url', properties)
+        self.assertEqual(properties['image_status'], 'ready')
+
+    def test_create_box_returns_feature(self):
+        """Test that creation responds with new box and map revision only"""
+        res = self.client.post(BOX_URL, {'lat': 55.13, 'lng': 40.17, 'name': 'New'}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        data = res.data['data']
+        self.assertEqual(set(data), {'feature', 'revision'})
+        self.assertEqual(data['feature']['properties']['name'], 'New')
+        self.assertEqual(data['revision'], MapRevision.current())
+
+    def test_create_box_full_map(self):
+        """Test that legacy clients get the whole map with full_map flag"""
+        sample_box(user=self.user)
+
+        res = self.client.post(BOX_URL + '?full_map=true', {'lat': 55.13, 'lng': 40.17}, format='json')
+
+        self.assertEqual(len(res.data['data']['boxes']['features']), 2)
+        self.assertIn('wires', res.data['data'])
+
+    def test_update_box_returns_feature(self):
+        """Test that update responds with changed box"""
+        box = sample_box(user=self.user)
+
+        res = self.client.put(detail_url(box.id), {'name': 'Renamed'}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['data']['feature']['properties']['name'], 'Renamed')
+
+    def test_delete_box_returns_deleted_ids(self):
+        """Test that deletion responds with ids of box and its wires, deleted by cascade"""
+        box = sample_box(user=self.user, point=Point([40.17, 55.13]))
+        other = sample_box(user=self.user, point=Point([40.18, 55.14]))
+        wire = sample_wire(box, other)
+
+        res = self.client.delete(detail_url(box.id))
+
+        self.assertEqual(res.data['data']['deleted'], {'boxes': [box.id], 'wires': [wire.id]})
+        self.assertEqual(res.data['data']['revision'], MapRevision.current())
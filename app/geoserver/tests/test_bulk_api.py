@@ -0,0 +1,103 @@
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import Point
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from netaddr import EUI
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Box, Wire, Client, MapRevision, SchemeRevision
+
+BULK_URL = reverse('geoserver:map-bulk')
+
+
+def box_feature(lng, lat, **properties):
+    return {"type": "Feature", "geometry": {"type": "Point", "coordinates": [lng, lat]}, "properties": properties}
+
+
+def wire_feature(coordinates=None, **properties):
+    geometry = {"type": "LineString", "coordinates": coordinates} if coordinates else None
+    return {"type": "Feature", "geometry": geometry, "properties": properties}
+
+
+def collection(*features):
+    return {"type": "FeatureCollection", "features": list(features)}
+
+
+class PrivateBulkApiTests(TestCase):
+    """Test authenticated bulk creation of map features"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testPassword123'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create(self):
+        """Test that boxes and wires between them are created and only their ids are returned"""
+        existing = Box.objects.create(name='Existing', point=Point([40.0, 55.0]))
+        payload = collection(
+            box_feature(40.1, 55.1, ref='a', name='A'),
+            box_feature(40.2, 55.2, ref='b', type_of_box='client', mac='00-1A-2B-3C-4D-5E', ip='10.0.0.1'),
+            wire_feature([[40.15, 55.15]], start_ref='a', end_ref='b'),
+            wire_feature(start_id=existing.id, end_ref='a', description='Trunk'),
+        )
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        data = res.data['data']
+        self.assertEqual(len(data['boxes']), 2)
+        self.assertEqual(len(data['wires']), 2)
+        self.assertEqual(data['refs'], {'a': data['boxes'][0], 'b': data['boxes'][1]})
+        self.assertEqual(data['revision'], MapRevision.current())
+        wire = Wire.objects.get(pk=data['wires'][0])
+        self.assertEqual(wire.start_id, data['refs']['a'])
+        self.assertEqual(len(wire.path), 3)
+        self.assertEqual(Wire.objects.get(pk=data['wires'][1]).description, 'Trunk')
+        client_box = Box.objects.get(pk=data['refs']['b'])
+        self.assertEqual(client_box.client.mac, int(EUI('00-1A-2B-3C-4D-5E')))
+        self.assertEqual(client_box.created_revision, data['revision'])
+        existing.refresh_from_db()
+        self.assertEqual(existing.scheme_revision, SchemeRevision.current())
+
+    def test_bulk_create_query_count(self):
+        """Test that number of queries doesn't depend on number of features"""
+        def post(n):
+            features = [box_feature(40 + i / 1000, 55, ref=str(i)) for i in range(n)]
+            features += [wire_feature(start_ref=str(i), end_ref=str(i + 1)) for i in range(n - 1)]
+            with CaptureQueriesContext(connection) as context:
+                res = self.client.post(BULK_URL, collection(*features), format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(context.captured_queries)
+
+        self.assertEqual(post(3), post(30))
+
+    def test_bulk_create_invalid(self):
+        """Test that nothing is created when any feature is invalid and errors are keyed by feature"""
+        connected = Client.objects.create(mac=int(EUI('00-1A-2B-3C-4D-5E')))
+        Box.objects.create(name='Client', type_of_box='client', client=connected, point=Point([40.0, 55.0]))
+        payload = collection(
+            box_feature(40.1, 55.1, ref='a'),
+            box_feature(40.1, 95.1),
+            wire_feature(start_ref='a', end_ref='missing'),
+            wire_feature(start_id=100500, end_ref='a'),
+            box_feature(40.2, 55.2, type_of_box='client', mac='00-1A-2B-3C-4D-5E'),
+            {"type": "Feature", "geometry": {"type": "Polygon", "coordinates": []}},
+        )
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Box.objects.count(), 1)
+        self.assertEqual(Wire.objects.count(), 0)
+
+    def test_bulk_create_requires_collection(self):
+        """Test that payload other than FeatureCollection is rejected"""
+        res = self.client.post(BULK_URL, box_feature(40.1, 55.1), format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
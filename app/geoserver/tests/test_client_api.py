@@ -0,0 +1,105 @@
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import Point
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from netaddr import EUI, IPAddress
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from app.utils import format_mac, format_ip
+from core.models import Box, Client
+
+CLIENTS_URL = reverse('geoserver:client-info')
+
+
+def data_queries(context):
+    """Captured queries without savepoints of ATOMIC_REQUESTS"""
+    return [q['sql'] for q in context.captured_queries if 'SAVEPOINT' not in q['sql']]
+
+
+def sample_client(mac, ip=None):
+    return Client.objects.create(mac=int(EUI(mac)), ip=int(IPAddress(ip)) if ip else None)
+
+
+class PrivateClientApiTests(TestCase):
+    """Test authenticated client API access"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testPassword123'
+        )
+        self.client.force_authenticate(self.user)
+        sample_client('00-1A-2B-3C-4D-5E', '10.0.0.2')
+        sample_client('00-1A-2B-3C-4D-5F', '10.0.0.10')
+        sample_client('00-1B-00-00-00-01', '192.168.1.1')
+        sample_client('AA-00-00-00-00-01')
+        connected = sample_client('00-1A-2B-3C-4D-60', '10.0.0.3')
+        Box.objects.create(name='Client', type_of_box='client', client=connected, point=Point([40.17, 55.13]))
+
+    def search(self, **params):
+        res = self.client.get(CLIENTS_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data['data']
+
+    def test_legacy_client_list(self):
+        """Test that without search parameters all unconnected clients are returned in one query"""
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.get(CLIENTS_URL)
+
+        self.assertEqual(len(data_queries(context)), 1)
+        self.assertEqual(res.data['data']['mac'], ['00-1A-2B-3C-4D-5E', '00-1A-2B-3C-4D-5F',
+                                                   '00-1B-00-00-00-01', 'AA-00-00-00-00-01'])
+        self.assertEqual(res.data['data']['ip'], ['10.0.0.2', '10.0.0.10', '192.168.1.1'])
+
+    def test_search_by_mac_prefix(self):
+        """Test that clients are found by MAC prefix with any separators"""
+        for q in ('00-1A', '00:1a', '001a'):
+            data = self.search(q=q)
+            self.assertEqual([el['mac'] for el in data['results']], ['00-1A-2B-3C-4D-5E', '00-1A-2B-3C-4D-5F'])
+            self.assertFalse(data['has_more'])
+
+    def test_search_by_ip_prefix(self):
+        """Test that clients are found by dotted-decimal IP prefix, including partial octet"""
+        data = self.search(q='10.0.0.1')
+        self.assertEqual([el['ip'] for el in data['results']], ['10.0.0.10'])
+
+        data = self.search(q='192.16')
+        self.assertEqual([el['ip'] for el in data['results']], ['192.168.1.1'])
+
+    def test_search_pagination(self):
+        """Test that search returns page of clients sorted by address"""
+        data = self.search(limit=2)
+        self.assertEqual([el['mac'] for el in data['results']], ['00-1A-2B-3C-4D-5E', '00-1A-2B-3C-4D-5F'])
+        self.assertTrue(data['has_more'])
+
+        data = self.search(limit=2, offset=2)
+        self.assertEqual([el['mac'] for el in data['results']], ['00-1B-00-00-00-01', 'AA-00-00-00-00-01'])
+        self.assertIsNone(data['results'][1]['ip'])
+        self.assertFalse(data['has_more'])
+
+    def test_search_single_query(self):
+        """Test that page of clients is loaded with one query"""
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(CLIENTS_URL, {'q': '00'})
+
+        self.assertEqual(len(data_queries(context)), 1)
+
+    def test_search_invalid_query(self):
+        """Test that query which can't be address prefix is rejected"""
+        for params in ({'q': 'xyz'}, {'q': '300.1'}, {'limit': 0}, {'offset': 'a'}):
+            res = self.client.get(CLIENTS_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AddressFormatTests(SimpleTestCase):
+
+    def test_same_as_netaddr(self):
+        """Test that addresses are formatted the same way netaddr does"""
+        for mac in (0, 1, int(EUI('00-1A-2B-3C-4D-5E')), (1 << 48) - 1, 1 << 48):
+            self.assertEqual(format_mac(mac), str(EUI(mac)))
+        for ip in (0, int(IPAddress('10.0.0.2')), (1 << 32) - 1, 1 << 32):
+            self.assertEqual(format_ip(ip), str(IPAddress(ip)))
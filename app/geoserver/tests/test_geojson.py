@@ -0,0 +1,90 @@
+import datetime
+import decimal
+from collections import OrderedDict
+from json import dumps
+from unittest import skipIf
+from unittest.mock import patch
+
+from django.contrib.gis.geos import Point, LineString
+from django.test import TestCase, SimpleTestCase
+from rest_framework.renderers import JSONRenderer
+
+from app.renderers import FastJSONRenderer, orjson
+from core.models import Box, Wire, Client
+from geoserver.geojson import box_collection, wire_collection
+from geoserver.serializers import WireSerializer, box_list_view
+
+
+class DirectGeoJSONTests(TestCase):
+    """Test that features built from database rows are the same as serialized ones"""
+
+    def setUp(self):
+        client = Client.objects.create(mac=1, online=True)
+        self.boxes = [
+            Box.objects.create(name='Муфта "1"', description='Desc', point=Point([40.175027841704186, 55.13])),
+            Box.objects.create(name='Client', type_of_box='client', client=client, point=Point([0.00001, -1e-7])),
+            Box.objects.create(name='Lost client', type_of_box='client', point=Point([-179.999999, 89.5])),
+        ]
+        Wire.objects.create(start=self.boxes[0], end=self.boxes[1],
+                            path=LineString((40.175027841704186, 55.13), (20.5, 27.1), (0.00001, -1e-7)))
+
+    def test_box_collection(self):
+        """Test that boxes are rendered to the same bytes as box_list_view gives"""
+        boxes = Box.objects.all()
+
+        self.assertEqual(JSONRenderer().render(box_collection(boxes)), JSONRenderer().render(box_list_view(boxes)))
+        self.assertEqual(dumps(box_collection(boxes)), dumps(box_list_view(boxes)))
+
+    def test_wire_collection(self):
+        """Test that wires are rendered to the same bytes as WireSerializer gives"""
+        wires = Wire.objects.all()
+
+        self.assertEqual(JSONRenderer().render(wire_collection(wires)),
+                         JSONRenderer().render(WireSerializer(wires, many=True).data))
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    """Test that FastJSONRenderer output is the same as JSONRenderer one"""
+    samples = [
+        {'success': True, 'data': OrderedDict([('coordinates', [40.175027841704186, 55.13, -0.0, 180])])},
+        {'floats': [1e-05, 1e16, 1.5e-7, 0.0001, 123456789012345678.0]},
+        {'text': 'Муфта   "quoted" \\ \n\t\x01 1e5 0.00001'},
+        {'when': datetime.datetime(2020, 5, 1, 12, 30, 15, 123456), 'price': decimal.Decimal('1.10')},
+        {1: 'int key', 'big': 2 ** 70},
+        [None, False, [], {}],
+    ]
+
+    def assertSameOutput(self, data):
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    @skipIf(orjson is None, "orjson is not installed")
+    def test_same_output(self):
+        for data in self.samples:
+            self.assertSameOutput(data)
+
+    @patch('app.renderers.orjson', None)
+    def test_same_output_without_orjson(self):
+        for data in self.samples:
+            self.assertSameOutput(data)
+
+    def test_indent_requested(self):
+        """Test that indented output is rendered by JSONRenderer"""
+        data = {'a': [1, 2]}
+
+        self.assertEqual(FastJSONRenderer().render(data, 'application/json; indent=4'),
+                         JSONRenderer().render(data, 'application/json; indent=4'))
+
+
+class BoxListViewQueriesTests(TestCase):
+
+    def test_client_boxes_joined(self):
+        """Test that number of queries doesn't depend on number of client boxes"""
+        for i in range(10):
+            client = Client.objects.create(mac=i, online=i % 2 == 0)
+            Box.objects.create(name='Client', type_of_box='client', client=client, point=Point([40.17, 55.13]))
+        Box.objects.create(name='Box', point=Point([40.17, 55.13]))
+
+        with self.assertNumQueries(2):
+            data = box_list_view(Box.objects.all())
+
+        self.assertEqual(sorted(f['properties']['online'] for f in data['features'][1:]), [False] * 5 + [True] * 5)
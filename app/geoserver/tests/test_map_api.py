@@ -0,0 +1,262 @@
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import Point
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Client, MapRevision
+from core.tests.utils import sample_box, sample_wire
+from geoserver.tiles import tile_range
+
+MAP_URL = reverse('geoserver:map')
+
+
+def box_ids(res):
+    return {el['properties']['id'] for el in res.data['data']['boxes']['features']}
+
+
+def wire_ids(res):
+    return {el['properties']['id'] for el in res.data['data']['wires']['features']}
+
+
+class PrivateMapApiTests(TestCase):
+    """Test authenticated map API access"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testPassword123'
+        )
+        self.client.force_authenticate(self.user)
+        self.inner = sample_box(self.user, name='inner')
+        self.outer = sample_box(self.user, name='outer', point=Point([41.5, 56.0]))
+        self.client_box = sample_box(self.user, name='client', type_of_box='client', point=Point([40.18, 55.14]))
+        self.wire = sample_wire(self.inner, self.outer)
+
+    def test_map_without_viewport(self):
+        """Test that map without bbox returns whole network"""
+        res = self.client.get(MAP_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(box_ids(res), {self.inner.id, self.outer.id, self.client_box.id})
+        self.assertEqual(wire_ids(res), {self.wire.id})
+
+    def test_map_bbox_filters_features(self):
+        """Test that only features intersecting bbox are returned"""
+        res = self.client.get(MAP_URL, {'bbox': '40.0,55.0,40.5,55.5'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(box_ids(res), {self.inner.id, self.client_box.id})
+        self.assertEqual(wire_ids(res), {self.wire.id})
+
+    @override_settings(MAP_CLIENT_BOXES_MIN_ZOOM=15)
+    def test_map_low_zoom_hides_clients(self):
+        """Test that client boxes are hidden on small zoom levels"""
+        res = self.client.get(MAP_URL, {'bbox': '40.0,55.0,40.5,55.5', 'zoom': 10})
+
+        self.assertEqual(box_ids(res), {self.inner.id})
+
+    def test_map_invalid_bbox(self):
+        """Test that malformed bbox is rejected"""
+        for bbox in ('1,2,3', '40.5,55.0,40.0,55.5', 'a,b,c,d', '0,-100,1,1'):
+            res = self.client.get(MAP_URL, {'bbox': bbox})
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+def tile_url(z, x, y):
+    return reverse('geoserver:tile', args=[z, x, y])
+
+
+class PrivateTileApiTests(TestCase):
+    """Test authenticated vector tile API access"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testPassword123'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_get_tile(self):
+        """Test that tile is served as raw protobuf"""
+        sample_box(self.user)
+        res = self.client.get(tile_url(0, 0, 0))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/vnd.mapbox-vector-tile')
+        self.assertIn(b'boxes', res.content)
+
+    def test_tile_invalidated_on_change(self):
+        """Test that cached tile is rebuilt after box creation"""
+        empty = self.client.get(tile_url(0, 0, 0)).content
+        sample_box(self.user, name='new box')
+        res = self.client.get(tile_url(0, 0, 0))
+
+        self.assertNotEqual(res.content, empty)
+        self.assertIn(b'new box', res.content)
+
+    def test_tile_buffer(self):
+        """Test that features just outside tile are included within its buffer"""
+        sample_box(self.user, name='near box', point=Point([-1, 10]))
+        sample_box(self.user, name='far box', point=Point([-10, 10]))
+        res = self.client.get(tile_url(1, 1, 0))
+
+        self.assertIn(b'near box', res.content)
+        self.assertNotIn(b'far box', res.content)
+
+    def test_tile_kept_on_distant_change(self):
+        """Test that change of features outside tile doesn't invalidate it"""
+        sample_box(self.user)
+        etag = self.client.get(tile_url(10, 626, 323))['ETag']
+        sample_box(self.user, name='far box', point=Point([-70, -30]))
+
+        res = self.client.get(tile_url(10, 626, 323), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        sample_box(self.user, name='near box', point=Point([40.18, 55.14]))
+        res = self.client.get(tile_url(10, 626, 323), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn(b'near box', res.content)
+
+    def test_tile_range(self):
+        """Test that feature is invalidated in tiles, which show it within their buffers"""
+        self.assertEqual(tile_range(1, (-1, 10, -1, 10)), (0, 0, 1, 0))
+        self.assertEqual(tile_range(1, (-10, 10, -10, 10)), (0, 0, 0, 0))
+
+    def test_tile_out_of_range(self):
+        """Test that nonexistent tile is not found"""
+        res = self.client.get(tile_url(1, 2, 0))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class PrivateMapSyncApiTests(TestCase):
+    """Test incremental map synchronization"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testPassword123'
+        )
+        self.client.force_authenticate(self.user)
+        self.box = sample_box(self.user)
+
+    def test_map_contains_revision(self):
+        """Test that full map reports current revision"""
+        res = self.client.get(MAP_URL)
+
+        self.assertEqual(res.data['data']['revision'], MapRevision.current())
+        self.assertIn('message_hash', res.data['data'])
+
+    def test_map_unchanged(self):
+        """Test that nothing is sent when revision is up to date"""
+        revision = MapRevision.current()
+        res = self.client.get(MAP_URL, {'since': revision})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['data'], {'unchanged': True, 'revision': revision})
+
+    def test_map_changes_since_revision(self):
+        """Test that only changes after revision are sent"""
+        revision = MapRevision.current()
+        new_box = sample_box(self.user, name='new box')
+        self.box.name = 'renamed'
+        self.box.save()
+        deleted_box = sample_box(self.user, name='deleted box')
+        deleted_box_id = deleted_box.id
+        deleted_box.delete()
+
+        res = self.client.get(MAP_URL, {'since': revision})
+        data = res.data['data']
+
+        self.assertFalse(data['unchanged'])
+        self.assertEqual(data['revision'], MapRevision.current())
+        self.assertEqual([el['properties']['id'] for el in data['created']['boxes']['features']], [new_box.id])
+        self.assertEqual([el['properties']['id'] for el in data['updated']['boxes']['features']], [self.box.id])
+        self.assertEqual(data['deleted']['boxes'], [deleted_box_id])
+
+    def test_map_since_pruned_revision(self):
+        """Test that whole map is sent when tombstones after revision are pruned"""
+        revision = MapRevision.current()
+        sample_box(self.user, name='deleted box').delete()
+        MapRevision.objects.filter(pk=1).update(pruned=MapRevision.current())
+
+        res = self.client.get(MAP_URL, {'since': revision})
+
+        self.assertEqual(box_ids(res), {self.box.id})
+        self.assertEqual(res.data['data']['revision'], MapRevision.current())
+
+    def test_map_unknown_revision(self):
+        """Test that revision from the future is rejected"""
+        res = self.client.get(MAP_URL, {'since': MapRevision.current() + 1})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PrivateConditionalApiTests(TestCase):
+    """Test ETag handling of map and box reads"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testPassword123'
+        )
+        self.client.force_authenticate(self.user)
+        self.box = sample_box(self.user, type_of_box='client')
+
+    def test_map_not_modified(self):
+        """Test that map is not resent while revision is the same"""
+        etag = self.client.get(MAP_URL)['ETag']
+        res = self.client.get(MAP_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
+
+    def test_map_modified(self):
+        """Test that map is resent after change"""
+        etag = self.client.get(MAP_URL)['ETag']
+        sample_box(self.user, name='new box')
+        res = self.client.get(MAP_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_map_etag_depends_on_viewport(self):
+        """Test that maps of different viewports have different ETags"""
+        etag = self.client.get(MAP_URL)['ETag']
+        res = self.client.get(MAP_URL, {'bbox': '40.0,55.0,40.5,55.5'}, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_box_not_modified(self):
+        """Test that box detail is not resent until box is changed"""
+        url = reverse('geoserver:box-detail', args=[self.box.id])
+        etag = self.client.get(url)['ETag']
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH='W/' + etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.box.name = 'renamed'
+        self.box.save()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_box_modified_by_status(self):
+        """Test that box detail is resent after status of its client is changed"""
+        self.box.client = Client.objects.create(mac=1, online=False)
+        self.box.save()
+        url = reverse('geoserver:box-detail', args=[self.box.id])
+        etag = self.client.get(url)['ETag']
+        revision = MapRevision.current()
+
+        self.box.client.online = True
+        self.box.client.save(update_fields=['online'])
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(MapRevision.current(), revision)
@@ -0,0 +1,128 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import Point
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Box, Client
+from geoserver.stream import Subscription, StatusHub, status_events
+
+STREAM_URL = reverse('geoserver:client-status-stream')
+
+
+class SubscriptionTests(SimpleTestCase):
+
+    def test_changes_coalesced(self):
+        """Test that only the latest status of box is delivered, in order of last change"""
+        subscription = Subscription(max_pending=10)
+        subscription.put([(1, True), (2, True)])
+        subscription.put([(1, False)])
+
+        self.assertEqual(subscription.get(0), ([(2, True), (1, False)], False))
+        self.assertEqual(subscription.get(0), ([], False))
+
+    def test_overflow_requests_resync(self):
+        """Test that too many pending boxes are dropped and client is asked to resync"""
+        subscription = Subscription(max_pending=2)
+        subscription.put([(1, True), (2, True), (3, True)])
+        subscription.put([(4, True)])
+
+        self.assertEqual(subscription.get(0), ([], True))
+        subscription.put([(5, False)])
+        self.assertEqual(subscription.get(0), ([(5, False)], False))
+
+
+@patch.object(StatusHub, 'start')
+class StatusHubTests(SimpleTestCase):
+
+    def test_fan_out(self, start):
+        """Test that every subscription gets published changes until it unsubscribes"""
+        hub = StatusHub()
+        first, second = hub.subscribe(10), hub.subscribe(10)
+        hub.publish([[1, True]])
+        hub.unsubscribe(second)
+        hub.publish([[2, False]])
+
+        self.assertEqual(first.get(0), ([(1, True), (2, False)], False))
+        self.assertEqual(second.get(0), ([(1, True)], False))
+
+    def test_events(self, start):
+        """Test that changes are sent as Server-Sent Events with keepalive comments in between"""
+        hub = StatusHub()
+        with patch('geoserver.stream.hub', hub):
+            events = status_events(heartbeat=0.01, max_pending=10)
+            self.assertEqual(next(events), 'retry: 3000\n\n')
+            self.assertEqual(next(events), ': keepalive\n\n')
+            hub.publish([[1, True]])
+            self.assertEqual(next(events), 'event: status\ndata: [{"box_id":1,"online":true}]\n\n')
+            hub.resync()
+            self.assertEqual(next(events), 'event: resync\ndata: {}\n\n')
+            events.close()
+
+        self.assertEqual(len(hub), 0)
+
+    @override_settings(STATUS_STREAM_MAX_CONNECTIONS=1)
+    def test_subscriptions_limited(self, start):
+        """Test that stream over the limit ends after retry interval without subscribing"""
+        hub = StatusHub()
+        self.assertIsNotNone(hub.subscribe(10))
+        self.assertIsNone(hub.subscribe(10))
+        with patch('geoserver.stream.hub', hub):
+            self.assertEqual(list(status_events()), ['retry: 3000\n\n'])
+
+        self.assertEqual(len(hub), 1)
+
+    def test_unstarted_stream_not_subscribed(self, start):
+        """Test that stream closed before its first event leaves no subscription behind"""
+        hub = StatusHub()
+        with patch('geoserver.stream.hub', hub):
+            status_events().close()
+
+        self.assertEqual(len(hub), 0)
+
+
+@patch.object(StatusHub, 'start')
+class ClientStatusStreamApiTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('test@test.com', 'testPassword123')
+        self.client = APIClient()
+
+    def test_login_required(self, start):
+        """Test that stream requires authentication"""
+        res = self.client.get(STREAM_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_stream_with_query_token(self, start):
+        """Test that EventSource can open stream with token in query string"""
+        token = Token.objects.create(user=self.user)
+        res = self.client.get(STREAM_URL, {'token': token.key})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'text/event-stream')
+        self.assertEqual(next(res.streaming_content), b'retry: 3000\n\n')
+        res.close()
+
+    @override_settings(STATUS_STREAM_MAX_CONNECTIONS=0)
+    def test_stream_limit(self, start):
+        """Test that stream is refused when worker already serves too many streams"""
+        self.client.force_authenticate(self.user)
+        res = self.client.get(STREAM_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res['Retry-After'], '3')
+
+    @patch('core.signals.notify_box_statuses')
+    def test_client_save_notified(self, notify, start):
+        """Test that status of client saved by model is published too"""
+        client = Client.objects.create(mac=1, online=False)
+        box = Box.objects.create(name='Client', type_of_box='client', client=client, point=Point([40.17, 55.13]))
+        client.online = True
+        client.save()
+
+        self.assertEqual(list(notify.call_args[0][0]), [(box.pk, True)])
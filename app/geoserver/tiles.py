@@ -0,0 +1,162 @@
+import math
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from core.models import Box, Wire, Client
+
+MVT_CONTENT_TYPE = 'application/vnd.mapbox-vector-tile'
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+# Half of the Web Mercator (EPSG:3857) world width in meters
+MERCATOR_BOUND = 20037508.342789244
+MERCATOR_MAX_LAT = 85.0511287798
+# Tiles up to this zoom have their own generations, deeper tiles share generation of their ancestor on it
+TILE_INDEX_ZOOM = 12
+# Changes, which cover more tiles, invalidate all tiles at once
+TILE_INVALIDATE_MAX = 256
+GLOBAL_GENERATION_KEY = 'tiles:generation'
+
+# Layer attributes repeat fields of BoxSerializer, ClientBoxSerializer and WireSerializer
+TILE_SQL = """
+WITH bounds AS (
+    SELECT ST_MakeEnvelope(%(xmin)s, %(ymin)s, %(xmax)s, %(ymax)s, 3857) AS geom,
+           -- Features within the buffer around tile are clipped into it too
+           ST_Transform(ST_Expand(ST_MakeEnvelope(%(xmin)s, %(ymin)s, %(xmax)s, %(ymax)s, 3857),
+                                  %(margin)s), 4326) AS area
+),
+boxes AS (
+    SELECT box.id, box.name, box.description, box.type_of_box,
+           COALESCE(client.online, false) AS online,
+           ST_AsMVTGeom(ST_Transform(box.point, 3857), bounds.geom,
+                        %(extent)s, %(buffer)s, true) AS geom
+    FROM {box} AS box
+    LEFT JOIN {client} AS client ON client.id = box.client_id
+    CROSS JOIN bounds
+    WHERE box.point && bounds.area
+      AND (%(with_clients)s OR box.type_of_box <> 'client')
+),
+wires AS (
+    SELECT wire.id, wire.start_id AS start, wire.end_id AS "end",
+           ST_AsMVTGeom(ST_Transform(wire.path, 3857), bounds.geom,
+                        %(extent)s, %(buffer)s, true) AS geom
+    FROM {wire} AS wire
+    JOIN {box} AS start_box ON start_box.id = wire.start_id
+    JOIN {box} AS end_box ON end_box.id = wire.end_id
+    CROSS JOIN bounds
+    WHERE wire.path && bounds.area
+      AND (%(with_clients)s OR (start_box.type_of_box <> 'client' AND end_box.type_of_box <> 'client'))
+)
+SELECT COALESCE((SELECT ST_AsMVT(boxes, 'boxes', %(extent)s, 'geom') FROM boxes), '')
+    || COALESCE((SELECT ST_AsMVT(wires, 'wires', %(extent)s, 'geom') FROM wires), '')
+""".format(box=Box._meta.db_table, wire=Wire._meta.db_table, client=Client._meta.db_table)
+
+
+def is_valid_tile(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= 24 and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def tile_envelope(z: int, x: int, y: int) -> tuple:
+    """Return Web Mercator bounds (xmin, ymin, xmax, ymax) of XYZ tile"""
+    size = 2 * MERCATOR_BOUND / 2 ** z
+    xmin = -MERCATOR_BOUND + x * size
+    ymax = MERCATOR_BOUND - y * size
+    return xmin, ymax - size, xmin + size, ymax
+
+
+def render_tile(z: int, x: int, y: int) -> bytes:
+    xmin, ymin, xmax, ymax = tile_envelope(z, x, y)
+    with connection.cursor() as cursor:
+        cursor.execute(TILE_SQL, {
+            'xmin': xmin,
+            'ymin': ymin,
+            'xmax': xmax,
+            'ymax': ymax,
+            'extent': TILE_EXTENT,
+            'buffer': TILE_BUFFER,
+            'margin': (xmax - xmin) * TILE_BUFFER / TILE_EXTENT,
+            'with_clients': z >= settings.MAP_CLIENT_BOXES_MIN_ZOOM,
+        })
+        return bytes(cursor.fetchone()[0])
+
+
+def get_tile(z: int, x: int, y: int, generation: str) -> bytes:
+    """Return tile from cache, rendering it with PostGIS on miss.
+
+    Cache key contains generation of tile, so changes of boxes and wires
+    make previously cached tiles around them unreachable"""
+    key = 'tiles:%s:%i:%i:%i' % (generation, z, x, y)
+    tile = cache.get(key)
+    if tile is None:
+        tile = render_tile(z, x, y)
+        cache.set(key, tile, settings.MAP_TILE_CACHE_TIMEOUT)
+    return tile
+
+
+def generation_key(z: int, x: int, y: int) -> str:
+    if z > TILE_INDEX_ZOOM:
+        x, y, z = x >> (z - TILE_INDEX_ZOOM), y >> (z - TILE_INDEX_ZOOM), TILE_INDEX_ZOOM
+    return 'tiles:generation:%i:%i:%i' % (z, x, y)
+
+
+def tile_generation(z: int, x: int, y: int) -> str:
+    """Token, which is replaced whenever features within tile or its buffer are changed.
+    Generation lost by cache is replaced too, as nothing is known about changes it has seen"""
+    keys = (GLOBAL_GENERATION_KEY, generation_key(z, x, y))
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            generation = uuid4().hex[:12]
+            if not cache.add(key, generation, None):
+                generation = cache.get(key, generation)
+            generations[key] = generation
+    return '%s.%s' % tuple(generations[key] for key in keys)
+
+
+def tile_range(z: int, extent: tuple) -> tuple:
+    """Return (xmin, ymin, xmax, ymax) of tiles, which show extent (lng, lat, lng, lat) within their buffers"""
+    lng_min, lat_min, lng_max, lat_max = extent
+    size = 2 * MERCATOR_BOUND / 2 ** z
+    margin = size * TILE_BUFFER / TILE_EXTENT
+
+    def mercator_y(lat):
+        lat = math.radians(max(-MERCATOR_MAX_LAT, min(MERCATOR_MAX_LAT, lat)))
+        return math.log(math.tan(math.pi / 4 + lat / 2)) * MERCATOR_BOUND / math.pi
+
+    def index(offset):
+        return max(0, min(2 ** z - 1, int(offset // size)))
+
+    return (index(lng_min * MERCATOR_BOUND / 180 - margin + MERCATOR_BOUND),
+            index(MERCATOR_BOUND - mercator_y(lat_max) - margin),
+            index(lng_max * MERCATOR_BOUND / 180 + margin + MERCATOR_BOUND),
+            index(MERCATOR_BOUND - mercator_y(lat_min) + margin))
+
+
+def generation_keys(extents) -> set:
+    """Keys of generations of tiles showing any of extents, the global one when they are too many"""
+    keys = set()
+    for extent in extents:
+        for z in range(TILE_INDEX_ZOOM + 1):
+            xmin, ymin, xmax, ymax = tile_range(z, extent)
+            if len(keys) + (xmax - xmin + 1) * (ymax - ymin + 1) > TILE_INVALIDATE_MAX:
+                return {GLOBAL_GENERATION_KEY}
+            keys.update(generation_key(z, x, y) for x in range(xmin, xmax + 1) for y in range(ymin, ymax + 1))
+    return keys
+
+
+def invalidate_tiles(extents):
+    """Replace generations of tiles showing extents (lng, lat, lng, lat) of changed features.
+    They are replaced again after commit, as tiles rendered by other requests before it
+    could be cached under the new generations"""
+    keys = generation_keys(extents)
+    if not keys:
+        return
+
+    def replace():
+        cache.set_many({key: uuid4().hex[:12] for key in keys}, None)
+
+    replace()
+    if connection.in_atomic_block:
+        transaction.on_commit(replace)
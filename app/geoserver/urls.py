@@ -1,3 +1,4 @@
+from django.db import transaction
 from django.urls import path, include
 
 from geoserver import views
@@ -6,10 +7,15 @@ app_name = 'geoserver'
 
 urlpatterns = [
     path('map/', views.Map.as_view(), name='map'),
+    path('map/bulk/', views.MapBulk.as_view(), name='map-bulk'),
+    path('tiles/<int:z>/<int:x>/<int:y>.mvt', views.Tile.as_view(), name='tile'),
     path('boxes/', views.BoxList.as_view(), name='box-list'),
     path('wires/', views.WireList.as_view(), name='wire-list'),
     path('boxes/<int:pk>', views.BoxDetail.as_view(), name='box-detail'),
     path('wires/<int:pk>', views.WireDetail.as_view(), name='wire-detail'),
     path('clients/', views.ClientList.as_view(), name='client-info'),
+    # Stream must not hold transaction of ATOMIC_REQUESTS open while it lasts
+    path('clients/stream/', transaction.non_atomic_requests(views.ClientStatusStream.as_view()),
+         name='client-status-stream'),
     path('boxes/<int:pk>/', include('scheme.urls')),
 ]
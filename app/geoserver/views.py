@@ -1,11 +1,22 @@
-from netaddr import IPAddress, EUI
-from rest_framework.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Q
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework import status
+from rest_framework.exceptions import ValidationError, NotFound
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 
-from app.response import MapResponse, BoxResponse
+from app.etags import map_etag, box_etag, tile_etag
+from app.exceptions import ServiceUnavailable
+from app.response import MapResponse, BoxResponse, NotModifiedResponse, change_response
+from app.utils import format_mac, format_ip
 from app.views import ObjectAPIView
+from authentication import BearerTokenAuthentication, QueryTokenAuthentication
 from core.models import Box, Wire, Client
+from .bulk import parse_feature_collection, create_features
+from .filters import Viewport, ClientSearch
+from .tiles import MVT_CONTENT_TYPE, get_tile, is_valid_tile, tile_generation
+from .stream import STREAM_RETRY_MS, hub, status_events
 from .serializers import (WireSerializer,
                           PostBoxSerializer,
                           PostWireSerializer,
@@ -17,55 +28,83 @@ class Map(ObjectAPIView):
     """APIView to get and post box objects"""
 
     def get(self, request):
+        if self.is_not_modified(request, map_etag(request.query_params)):
+            return NotModifiedResponse()
         return MapResponse(request.query_params)
 
 
+class MapBulk(ObjectAPIView):
+    """APIView to create boxes and wires of FeatureCollection in one transaction"""
+
+    def post(self, request):
+        boxes, wires = parse_feature_collection(request.data)
+        return Response(create_features(boxes, wires, request.user), status=status.HTTP_201_CREATED)
+
+
+class Tile(ObjectAPIView):
+    """APIView to get map features as Mapbox Vector Tile"""
+
+    def get(self, request, z, x, y):
+        if not is_valid_tile(z, x, y):
+            raise NotFound("Tile %i/%i/%i doesn't exist" % (z, x, y))
+        generation = tile_generation(z, x, y)
+        if self.is_not_modified(request, tile_etag(z, x, y, generation)):
+            return NotModifiedResponse()
+        return HttpResponse(get_tile(z, x, y, generation), content_type=MVT_CONTENT_TYPE)
+
+
 class BoxList(ObjectAPIView):
     """APIView to get and post box objects"""
 
     def get(self, request):
-        return Response(box_list_view())
+        viewport = Viewport.from_query_params(request.query_params)
+        return Response(box_list_view(viewport.boxes(Box.objects.all())))
 
     def post(self, request):
         serializer = PostBoxSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(user=request.user)
-            return MapResponse(request.query_params)
+            box = serializer.save(user=request.user)
+            return change_response(request.query_params, feature=box, status=status.HTTP_201_CREATED)
         raise ValidationError(detail=serializer.errors)
 
 
 class BoxDetail(ObjectAPIView):
 
     def get(self, request, pk):
-        box = get_object_or_404(Box.objects.all(), pk=pk)
-        return BoxResponse(box)
+        if self.is_not_modified(request, box_etag(pk, request.query_params)):
+            return NotModifiedResponse()
+        box = get_object_or_404(Box.objects.select_related('client'), pk=pk)
+        return BoxResponse(box, request.query_params)
 
     def put(self, request, pk):
         box = get_object_or_404(Box.objects.all(), pk=pk)
         serializer = PutBoxSerializer(box, request.data)
         if serializer.is_valid(raise_exception=True):
-            serializer.save()
-        return MapResponse(request.query_params)
+            box = serializer.save()
+        return change_response(request.query_params, feature=box)
 
     def delete(self, request, pk):
         box = get_object_or_404(Box.objects.all(), pk=pk)
+        # Wires of the box are deleted by cascade
+        wires = sorted(Wire.objects.filter(Q(start=box) | Q(end=box)).values_list('pk', flat=True))
         box.delete()
-        return MapResponse(request.query_params)
+        return change_response(request.query_params, deleted={'boxes': [pk], 'wires': wires})
 
 
 class WireList(ObjectAPIView):
     """APIView to get and post wire objects"""
 
     def get(self, request):
-        wires = Wire.objects.all()
+        viewport = Viewport.from_query_params(request.query_params)
+        wires = viewport.wires(Wire.objects.all())
         serializer = WireSerializer(wires, many=True)
         return Response(serializer.data)
 
     def post(self, request):
         serializer = PostWireSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(user=request.user)
-            return MapResponse(request.query_params)
+            wire = serializer.save(user=request.user)
+            return change_response(request.query_params, feature=wire, status=status.HTTP_201_CREATED)
         raise ValidationError(serializer.errors)
 
 
@@ -88,16 +127,50 @@ class WireDetail(ObjectAPIView):
     def delete(self, request, pk):
         wire = get_object_or_404(Wire.objects.all(), pk=pk)
         wire.delete()
-        return MapResponse(request.query_params)
+        return change_response(request.query_params, deleted={'boxes': [], 'wires': [pk]})
 
 
 class ClientList(ObjectAPIView):
+    """Clients not connected to any box: all of them or, with `q`, `limit` or `offset` passed,
+    page of ones matching MAC or IP address prefix"""
 
     def get(self, request):
+        clients = Client.objects.filter(connected_box__isnull=True)
+        if not ClientSearch.is_requested(request.query_params):
+            rows = list(clients.order_by('mac').values_list('mac', 'ip'))
+            return Response({
+                "ip": [format_ip(ip) for ip in sorted(ip for mac, ip in rows if ip is not None)],
+                "mac": [format_mac(mac) for mac, ip in rows if mac is not None],
+            })
+        search = ClientSearch.from_query_params(request.query_params)
+        rows = list(search.clients(clients).values_list('id', 'mac', 'ip'))
         return Response({
-            "ip": sorted(map(lambda x: str(IPAddress(x)),
-                             Client.objects.filter(connected_box__isnull=True).values_list('ip', flat=True))),
-            "mac": sorted(map(lambda x: str(EUI(x)),
-                              Client.objects.filter(connected_box__isnull=True).values_list('mac', flat=True))),
-        }
-        )
+            "results": [{
+                "id": pk,
+                "mac": format_mac(mac) if mac is not None else None,
+                "ip": format_ip(ip) if ip is not None else None,
+            } for pk, mac, ip in rows[:search.limit]],
+            "offset": search.offset,
+            "limit": search.limit,
+            "has_more": len(rows) > search.limit,
+        })
+
+
+class ClientStatusStream(ObjectAPIView):
+    """Server-Sent Events with online status changes of client boxes.
+    EventSource can't set headers, so token may be passed as `token` query parameter.
+    Every stream holds a worker thread, so streams beyond the limit of worker are refused with 503"""
+    authentication_classes = (BearerTokenAuthentication, QueryTokenAuthentication)
+
+    def get(self, request):
+        if hub.is_full():
+            raise ServiceUnavailable('Too many status streams are open, try again later.',
+                                     wait=STREAM_RETRY_MS // 1000)
+        # Stream may stay open for hours, it doesn't need database connection of request
+        if not connection.in_atomic_block:
+            connection.close()
+        response = StreamingHttpResponse(status_events(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Tells nginx to pass events without buffering
+        response['X-Accel-Buffering'] = 'no'
+        return response
@@ -0,0 +1,348 @@
+import asyncio
+import inspect
+import logging
+import random
+import signal
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+
+from integration.batch import parse_message, apply_statuses
+from integration.cache import StatusCache
+
+try:
+    import aio_pika
+except ImportError:  # pragma: no cover
+    aio_pika = None
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = None) -> float:
+    """Exponential backoff with full jitter: random delay up to base * 2 ** attempt, but not more than cap"""
+    cap = settings.RABBITMQ_RECONNECT_MAX_DELAY if cap is None else cap
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def write_statuses(statuses: dict) -> list:
+    """Runs in a thread of database pool, every thread keeps its own connection open between batches"""
+    try:
+        return apply_statuses(statuses)
+    except Exception:
+        if connection.connection is not None and not connection.is_usable():
+            connection.close()
+        raise
+
+
+class Broker:
+    """Message source of AsyncStatusConsumer"""
+
+    async def connect(self, prefetch_count: int):
+        raise NotImplementedError
+
+    def consume(self):
+        """Async iterator over deliveries, ends when `stop` is called"""
+        raise NotImplementedError
+
+    async def ack(self, delivery):
+        raise NotImplementedError
+
+    async def dead_letter(self, body: bytes, error: str):
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+    async def close(self):
+        raise NotImplementedError
+
+
+class AioPikaBroker(Broker):
+    """RabbitMQ queue and dead letter queue from settings"""
+
+    def __init__(self):
+        if aio_pika is None:
+            raise ImproperlyConfigured("aio-pika is required by asyncio consumer engine")
+        self.connection = None
+        self.exchange = None
+        self.queue = None
+        self.iterator = None
+
+    async def connect(self, prefetch_count: int):
+        self.connection = await aio_pika.connect(host=settings.RABBITMQ_HOST, port=int(settings.RABBITMQ_PORT),
+                                                 virtualhost=settings.RABBITMQ_VIRTUAL_HOST,
+                                                 login=settings.RABBITMQ_USER,
+                                                 password=settings.RABBITMQ_PASSWORD)
+        channel = await self.connection.channel()
+        await channel.set_qos(prefetch_count=prefetch_count)
+        self.exchange = await channel.get_exchange(settings.RABBITMQ_EVENT_EXCHANGE)
+        self.queue = await channel.declare_queue(settings.RABBITMQ_EVENT_QUEUE, durable=True)
+        await self.queue.bind(self.exchange, routing_key=settings.RABBITMQ_EVENT_QUEUE_ROUTING_KEY)
+        dead_letter_queue = await channel.declare_queue(settings.RABBITMQ_EVENT_DEAD_LETTER_QUEUE, durable=True)
+        await dead_letter_queue.bind(self.exchange,
+                                     routing_key=settings.RABBITMQ_EVENT_DEAD_LETTER_QUEUE_ROUTING_KEY)
+
+    async def consume(self):
+        self.iterator = self.queue.iterator()
+        async with self.iterator:
+            async for message in self.iterator:
+                yield message
+
+    async def ack(self, delivery):
+        result = delivery.ack()
+        if inspect.isawaitable(result):
+            await result
+
+    async def dead_letter(self, body: bytes, error: str):
+        await self.exchange.publish(aio_pika.Message(body, headers={'traceback': error}),
+                                    routing_key=settings.RABBITMQ_EVENT_DEAD_LETTER_QUEUE)
+
+    def stop(self):
+        if self.iterator is not None:
+            asyncio.ensure_future(self.iterator.close())
+
+    async def close(self):
+        if self.connection is not None and not self.connection.is_closed:
+            await self.connection.close()
+
+
+class InMemoryDelivery:
+    def __init__(self, body: bytes, connection: int):
+        self.body = body
+        self.connection = connection
+
+
+class InMemoryBroker(Broker):
+    """Local stand-in of RabbitMQ: `publish` messages, then check `acked` and `dead_letters`.
+    First `fail_connects` connection attempts fail, the next `fail_consumes` connections are lost
+    after the first delivery. Acknowledgements of deliveries of closed connections are `stale_acks`"""
+    STOP = object()
+
+    def __init__(self, fail_connects: int = 0, fail_consumes: int = 0):
+        self.fail_connects = fail_connects
+        self.fail_consumes = fail_consumes
+        self.connects = 0
+        self.messages = []
+        self.acked = []
+        self.stale_acks = []
+        self.dead_letters = []
+        self._queue = None
+
+    def publish(self, body: bytes):
+        self.messages.append(body)
+        if self._queue is not None:
+            self._queue.put_nowait(InMemoryDelivery(body, self.connects))
+
+    async def connect(self, prefetch_count: int):
+        self.connects += 1
+        if self.connects <= self.fail_connects:
+            raise ConnectionError("Broker is unavailable")
+        self._queue = asyncio.Queue()
+        for body in self.messages:
+            self._queue.put_nowait(InMemoryDelivery(body, self.connects))
+
+    async def consume(self):
+        lost = self.connects - self.fail_connects <= self.fail_consumes
+        while True:
+            delivery = await self._queue.get()
+            if delivery is self.STOP:
+                return
+            yield delivery
+            if lost:
+                raise ConnectionError("Connection is lost")
+
+    async def ack(self, delivery):
+        if self._queue is None or delivery.connection != self.connects:
+            self.stale_acks.append(delivery.body)
+            raise ConnectionError("Channel is closed")
+        self.messages.remove(delivery.body)
+        self.acked.append(delivery.body)
+
+    async def dead_letter(self, body: bytes, error: str):
+        self.dead_letters.append((body, error))
+
+    def stop(self):
+        if self._queue is not None:
+            self._queue.put_nowait(self.STOP)
+
+    async def close(self):
+        self._queue = None
+
+
+class Lane:
+    """Statuses of clients with the same MAC hash, its batches are written one after another,
+    so statuses of one client are never reordered"""
+
+    def __init__(self):
+        self.batch = []
+        self.timer = None
+        self.lock = asyncio.Lock()
+
+
+class AsyncStatusConsumer:
+    """Reads messages while previous batches are written to database.
+
+    At most `concurrency` batches are written at once by `db_pool_size` threads, reading
+    waits for a free slot. Broker is reconnected with exponential backoff, at most `max_retries`
+    times in a row"""
+
+    def __init__(self, broker: Broker, writer=write_statuses, concurrency: int = None, db_pool_size: int = None,
+                 batch_size: int = None, batch_timeout_ms: int = None, prefetch_count: int = None,
+                 max_retries: int = 10, status_cache_size: int = None):
+        self.broker = broker
+        self.writer = writer
+        self.concurrency = settings.RABBITMQ_CONCURRENCY if concurrency is None else concurrency
+        self.db_pool_size = settings.RABBITMQ_DB_POOL_SIZE if db_pool_size is None else db_pool_size
+        self.batch_size = settings.RABBITMQ_BATCH_SIZE if batch_size is None else batch_size
+        self.batch_timeout = (settings.RABBITMQ_BATCH_TIMEOUT_MS if batch_timeout_ms is None
+                              else batch_timeout_ms) / 1000
+        self.prefetch_count = settings.RABBITMQ_PREFETCH_COUNT if prefetch_count is None else prefetch_count
+        self.max_retries = max_retries
+        self.statuses = StatusCache(settings.RABBITMQ_STATUS_CACHE_SIZE if status_cache_size is None
+                                    else status_cache_size, settings.RABBITMQ_STATUS_CACHE_TTL)
+        self.stopping = False
+        self.processed = 0
+        self.started = time.monotonic()
+        self.lanes = []
+        self.tasks = set()
+        self.semaphore = None
+        self.executor = None
+
+    async def run(self):
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.executor = ThreadPoolExecutor(self.db_pool_size, thread_name_prefix='status-db')
+        attempt = 0
+        try:
+            while not self.stopping:
+                self.lanes = [Lane() for _ in range(self.concurrency)]
+                try:
+                    await self.broker.connect(self.prefetch_count)
+                    attempt = 0
+                    async for delivery in self.broker.consume():
+                        await self.handle(delivery)
+                    await self.drain()
+                except Exception as e:
+                    # Unacknowledged messages are redelivered after reconnect. Batches being written are
+                    # finished first, so they are acknowledged before their channel is closed and
+                    # never race with batches of new lanes
+                    self.discard()
+                    await self.wait()
+                    attempt += 1
+                    if attempt > self.max_retries:
+                        raise
+                    delay = backoff_delay(attempt)
+                    logging.warning("Reconnecting consumer in %.1f s, %i time on error %s", delay, attempt, e)
+                    await asyncio.sleep(delay)
+                finally:
+                    await self.broker.close()
+        finally:
+            self.executor.shutdown()
+
+    def stop(self):
+        """Stop reading messages, batches already read are written and acknowledged"""
+        self.stopping = True
+        self.broker.stop()
+
+    async def handle(self, delivery):
+        try:
+            mac, status = parse_message(delivery.body)
+        except Exception:
+            await self.broker.dead_letter(delivery.body, traceback.format_exc())
+            await self.broker.ack(delivery)
+            return
+        lane = self.lanes[mac % len(self.lanes)]
+        lane.batch.append((delivery, mac, status))
+        if len(lane.batch) >= self.batch_size:
+            await self.schedule(lane)
+        elif lane.timer is None:
+            lane.timer = asyncio.get_event_loop().call_later(self.batch_timeout, self.on_batch_timeout, lane)
+
+    def on_batch_timeout(self, lane: Lane):
+        lane.timer = None
+        self.track(asyncio.ensure_future(self.schedule(lane)))
+
+    def track(self, task):
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def schedule(self, lane: Lane):
+        """Start writing of lane batch, waits while `concurrency` batches are already being written"""
+        if lane.timer is not None:
+            lane.timer.cancel()
+            lane.timer = None
+        if not lane.batch:
+            return
+        batch, lane.batch = lane.batch, []
+        await self.semaphore.acquire()
+        self.track(asyncio.ensure_future(self.flush(lane, batch)))
+
+    async def flush(self, lane: Lane, batch: list):
+        loop = asyncio.get_event_loop()
+        try:
+            async with lane.lock:
+                start = time.monotonic()
+                statuses = {}
+                for delivery, mac, status in batch:
+                    # Only the latest status of client matters
+                    statuses[mac] = status
+                # Cache is checked under the lane lock, as earlier statuses of lane may be not written yet
+                statuses = {mac: status for mac, status in statuses.items()
+                            if not self.statuses.is_known(mac, status)}
+                try:
+                    await loop.run_in_executor(self.executor, self.writer, statuses)
+                    for mac, status in statuses.items():
+                        self.statuses.remember(mac, status)
+                except Exception:
+                    logging.exception("Batch of %i messages failed, writing them one by one", len(batch))
+                    for delivery, mac, status in batch:
+                        if self.statuses.is_known(mac, status):
+                            continue
+                        try:
+                            await loop.run_in_executor(self.executor, self.writer, {mac: status})
+                            self.statuses.remember(mac, status)
+                        except Exception:
+                            await self.broker.dead_letter(delivery.body, traceback.format_exc())
+                for delivery, mac, status in batch:
+                    await self.broker.ack(delivery)
+                self.log_throughput(len(batch), time.monotonic() - start)
+        except Exception:
+            logging.exception("Batch of %i messages is left unacknowledged", len(batch))
+        finally:
+            self.semaphore.release()
+
+    async def drain(self):
+        for lane in self.lanes:
+            await self.schedule(lane)
+        await self.wait()
+
+    async def wait(self):
+        """Wait for batches already being written, including ones waiting for a free slot"""
+        while self.tasks:
+            await asyncio.wait(list(self.tasks))
+
+    def discard(self):
+        for lane in self.lanes:
+            if lane.timer is not None:
+                lane.timer.cancel()
+            lane.batch = []
+
+    def log_throughput(self, n_messages, elapsed):
+        self.processed += n_messages
+        logging.info("Processed batch of %i messages in %.1f ms (%.0f msg/s), %.0f msg/s since start",
+                     n_messages, elapsed * 1000, n_messages / max(elapsed, 1e-6),
+                     self.processed / max(time.monotonic() - self.started, 1e-6))
+
+
+def run_async_consumer(status_cache_size=None):
+    """Consume status queue with asyncio engine until SIGTERM/SIGINT"""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    consumer = AsyncStatusConsumer(AioPikaBroker(), status_cache_size=status_cache_size)
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, consumer.stop)
+    try:
+        loop.run_until_complete(consumer.run())
+    finally:
+        loop.close()
@@ -0,0 +1,54 @@
+import json
+
+from django.db import connection, transaction
+from netaddr import EUI
+from rest_framework import serializers
+
+from core.models import Box, Client
+from core.notify import notify_box_statuses
+from integration.serializers import MessageSerializer
+
+UPSERT_SQL = """
+INSERT INTO {client} (mac, online, ip) VALUES {values}
+ON CONFLICT (mac) DO UPDATE SET online = EXCLUDED.online, ip = EXCLUDED.ip
+WHERE ({client}.online, {client}.ip) IS DISTINCT FROM (EXCLUDED.online, EXCLUDED.ip)
+RETURNING id
+"""
+
+
+def validate_mac(value):
+    try:
+        return EUI(value)
+    except Exception as e:
+        raise serializers.ValidationError(e)
+
+
+def parse_message(body) -> tuple:
+    """Return MAC address of client and its validated status from message body"""
+    data = json.loads(body)
+    mac = int(validate_mac(data.get("MacAdress")))
+    serializer = MessageSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    return mac, serializer.validated_data
+
+
+def apply_statuses(statuses: dict) -> list:
+    """Write statuses of many clients, keyed by MAC, with one upsert.
+    Only new and really changed clients are written, their ids are returned"""
+    if not statuses:
+        return []
+    values = []
+    for mac, status in statuses.items():
+        ip = status.get('ip')
+        values.extend((mac, status['online'], int(ip) if ip is not None else None))
+    sql = UPSERT_SQL.format(client=Client._meta.db_table,
+                            values=", ".join(["(%s, %s, %s)"] * len(statuses)))
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, values)
+            changed = [row[0] for row in cursor.fetchall()]
+        # Statuses don't change map revision, they reach maps through the status stream
+        box_statuses = list(Box.objects.filter(client__in=changed).values_list('pk', 'client__online'))
+        if box_statuses:
+            notify_box_statuses(box_statuses)
+    return changed
@@ -0,0 +1,40 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+class StatusCache:
+    """Last written statuses of clients keyed by MAC.
+
+    Bounded LRU, entries expire after `ttl` seconds, so changes made
+    by someone else are overwritten by status feed sooner or later"""
+
+    def __init__(self, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self._statuses = OrderedDict()
+        self._lock = Lock()
+
+    @staticmethod
+    def state(status: dict) -> tuple:
+        ip = status.get('ip')
+        return status.get('online'), int(ip) if ip is not None else None
+
+    def is_known(self, mac: int, status: dict) -> bool:
+        with self._lock:
+            entry = self._statuses.get(mac)
+            if entry is None:
+                return False
+            state, written = entry
+            if time.monotonic() - written > self.ttl:
+                del self._statuses[mac]
+                return False
+            self._statuses.move_to_end(mac)
+            return state == self.state(status)
+
+    def remember(self, mac: int, status: dict):
+        with self._lock:
+            self._statuses[mac] = (self.state(status), time.monotonic())
+            self._statuses.move_to_end(mac)
+            while len(self._statuses) > self.size:
+                self._statuses.popitem(last=False)
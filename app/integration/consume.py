@@ -1,66 +1,89 @@
-import json
 import logging
+import signal
 import time
-from threading import Thread
+import traceback
 
 import pika
 from django.conf import settings
-from netaddr import EUI
-from rest_framework import serializers
+from django.db import transaction
 
 from core.models import Client
+from integration.batch import parse_message, apply_statuses
+from integration.cache import StatusCache
 from integration.serializers import MessageSerializer
 
 
 # TODO: make better error resolving instead of this 5hit
 
-def run_consumer():
-    try:
-        t = Thread(target=start_consumer, args=(settings.RABBITMQ_EVENT_QUEUE,))
-        t.start()
-    except Exception as e:
-        print("\nExiting consumer script with error %s" % e.__repr__())
-        exit(1)
-
-
-def start_consumer(queue):
+def start_consumer(queue, install_signal_handlers=False, status_cache_size=None):
+    """Consume queue until SIGTERM/SIGINT (if handlers are installed) or 10 failures in a row"""
     restart_counter = 0
     error = ''
-    while restart_counter < 10:
+    consumer = None
+    stopping = False
+
+    def on_signal(signum, frame):
+        nonlocal stopping
+        logging.info("Stopping consumer on signal %i", signum)
+        stopping = True
+        if consumer is not None:
+            # Consumer stops inside of its IO loop, after flushing the current batch
+            consumer.connection.add_callback_threadsafe(consumer.stop)
+
+    if install_signal_handlers:
+        signal.signal(signal.SIGTERM, on_signal)
+        signal.signal(signal.SIGINT, on_signal)
+
+    while restart_counter < 10 and not stopping:
         try:
             consumer = RabbitConsumer(rabbit_server_addr=settings.RABBITMQ_HOST,
-                                      rabbit_server_port=settings.RABBITMQ_PORT)
+                                      rabbit_server_port=settings.RABBITMQ_PORT,
+                                      status_cache_size=status_cache_size)
+            if stopping:
+                break
             _start_consumer(consumer, queue)
         except Exception as e:
             error = e
             restart_counter += 1
             logging.warning("Restarting worker thread %i time on error %s", restart_counter, error)
             time.sleep(3)
+    if stopping:
+        if consumer is not None:
+            consumer.connection.close()
+        return
     logging.exception("Exit worker thread with error %s", error)
     exit(1)
 
 
 def _start_consumer(consumer, queue):
-    consumer.channel_in.basic_consume(queue, consumer.callback)
+    if consumer.batch_size > 1:
+        consumer.channel_in.basic_consume(queue, consumer.batch_callback)
+    else:
+        consumer.channel_in.basic_consume(queue, consumer.callback)
     consumer.channel_in.start_consuming()
 
 
-def validate_mac(value):
-    try:
-        return EUI(value)
-    except Exception as e:
-        raise serializers.ValidationError(e)
-
-
 class RabbitConsumer:
-    def __init__(self, rabbit_server_addr, rabbit_server_port):
+    def __init__(self, rabbit_server_addr, rabbit_server_port,
+                 batch_size=None, batch_timeout_ms=None, prefetch_count=None, status_cache_size=None):
+        self.batch_size = settings.RABBITMQ_BATCH_SIZE if batch_size is None else batch_size
+        self.batch_timeout = (settings.RABBITMQ_BATCH_TIMEOUT_MS if batch_timeout_ms is None
+                              else batch_timeout_ms) / 1000
+        self.batch = []
+        self.batch_timer = None
+        self.processed = 0
+        self.started = time.monotonic()
+        self.statuses = StatusCache(settings.RABBITMQ_STATUS_CACHE_SIZE if status_cache_size is None
+                                    else status_cache_size, settings.RABBITMQ_STATUS_CACHE_TTL)
         credentials = pika.PlainCredentials(settings.RABBITMQ_USER, settings.RABBITMQ_PASSWORD)
         connection_params = pika.ConnectionParameters(host=rabbit_server_addr, port=rabbit_server_port,
                                                       virtual_host=settings.RABBITMQ_VIRTUAL_HOST,
                                                       credentials=credentials)
         try:
-            connection = pika.BlockingConnection(connection_params)
-            self.channel_in = connection.channel()
+            self.connection = pika.BlockingConnection(connection_params)
+            self.channel_in = self.connection.channel()
+            self.channel_in.basic_qos(prefetch_count=settings.RABBITMQ_PREFETCH_COUNT
+                                      if prefetch_count is None else prefetch_count)
 
             self.channel_in.queue_declare(queue=settings.RABBITMQ_EVENT_QUEUE, durable=True)
             self.channel_in.queue_bind(exchange=settings.RABBITMQ_EVENT_EXCHANGE,
@@ -70,25 +93,87 @@ class RabbitConsumer:
             self.channel_in.queue_bind(exchange=settings.RABBITMQ_EVENT_EXCHANGE,
                                        queue=settings.RABBITMQ_EVENT_DEAD_LETTER_QUEUE,
                                        routing_key=settings.RABBITMQ_EVENT_DEAD_LETTER_QUEUE_ROUTING_KEY)
-        except Exception as e:
-            print(e)
-            raise e
+        except Exception:
+            logging.exception("Can't connect consumer to RabbitMQ at %s:%s", rabbit_server_addr, rabbit_server_port)
+            raise
 
     # Document received message
     def callback(self, ch, method, properties, body):
-        try:
-            data = json.loads(body)
-            instance = Client.objects.get_or_create(mac=validate_mac(data.get("MacAdress")))[0]
-            serializer = MessageSerializer(instance=instance, data=data)
-            if serializer.is_valid(raise_exception=True):
-                serializer.save()
-        except:
-            import traceback
-            self.channel_in.basic_publish(exchange=settings.RABBITMQ_EVENT_EXCHANGE,
-                                          routing_key=settings.RABBITMQ_EVENT_DEAD_LETTER_QUEUE,
-                                          body=body,
-                                          properties=pika.BasicProperties(
-                                              headers={'traceback': traceback.format_exc()}  # Add a key/value header
-                                          ),
-                                          )
+        self.process(body)
         ch.basic_ack(delivery_tag=method.delivery_tag)
+
+    def process(self, body):
+        try:
+            mac, status = parse_message(body)
+            if self.statuses.is_known(mac, status):
+                return
+            with transaction.atomic():
+                instance = Client.objects.get_or_create(mac=mac)[0]
+                # Message is already validated by parse_message
+                MessageSerializer().update(instance, status)
+            self.statuses.remember(mac, status)
+        except Exception:
+            self.dead_letter(body)
+
+    def dead_letter(self, body):
+        """Move message to dead letter queue, must be called while handling exception"""
+        self.channel_in.basic_publish(exchange=settings.RABBITMQ_EVENT_EXCHANGE,
+                                      routing_key=settings.RABBITMQ_EVENT_DEAD_LETTER_QUEUE,
+                                      body=body,
+                                      properties=pika.BasicProperties(
+                                          headers={'traceback': traceback.format_exc()}  # Add a key/value header
+                                      ),
+                                      )
+
+    def batch_callback(self, ch, method, properties, body):
+        """Collect messages until batch is full or its timeout is expired"""
+        self.batch.append((method.delivery_tag, body))
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+        elif self.batch_timer is None:
+            self.batch_timer = self.connection.call_later(self.batch_timeout, self.on_batch_timeout)
+
+    def stop(self):
+        self.flush()
+        self.channel_in.stop_consuming()
+
+    def on_batch_timeout(self):
+        self.batch_timer = None
+        self.flush()
+
+    def flush(self):
+        if self.batch_timer is not None:
+            self.connection.remove_timeout(self.batch_timer)
+            self.batch_timer = None
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, []
+        start = time.monotonic()
+        statuses = {}
+        # Messages, which are dead-lettered already, aren't retried
+        parsed = []
+        for delivery_tag, body in batch:
+            try:
+                mac, status = parse_message(body)
+                # Only the latest status of client matters
+                statuses[mac] = status
+                parsed.append(body)
+            except Exception:
+                self.dead_letter(body)
+        statuses = {mac: status for mac, status in statuses.items() if not self.statuses.is_known(mac, status)}
+        try:
+            apply_statuses(statuses)
+            for mac, status in statuses.items():
+                self.statuses.remember(mac, status)
+        except Exception:
+            logging.exception("Batch of %i messages failed, processing them one by one", len(parsed))
+            for body in parsed:
+                self.process(body)
+        self.channel_in.basic_ack(delivery_tag=batch[-1][0], multiple=True)
+        self.log_throughput(len(batch), time.monotonic() - start)
+
+    def log_throughput(self, n_messages, elapsed):
+        self.processed += n_messages
+        logging.info("Processed batch of %i messages in %.1f ms (%.0f msg/s), %.0f msg/s since start",
+                     n_messages, elapsed * 1000, n_messages / max(elapsed, 1e-6),
+                     self.processed / max(time.monotonic() - self.started, 1e-6))
@@ -0,0 +1,77 @@
+import logging
+import multiprocessing
+import os
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from integration.aio import run_async_consumer
+from integration.consume import start_consumer
+
+
+class Command(BaseCommand):
+    """Django command to consume client statuses from RabbitMQ in separate processes.
+
+    Processes share one queue, so statuses of one client may be written out of order
+    when more than one process is started. Any process can get any message then, so
+    they don't skip statuses they have already written: another process could change them"""
+    help = 'consume client statuses from RabbitMQ'
+
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument('--processes', dest='processes', type=int,
+                            default=settings.RABBITMQ_CONSUMER_PROCESSES)
+        parser.add_argument('--engine', dest='engine', choices=('blocking', 'asyncio'),
+                            default=settings.RABBITMQ_CONSUMER_ENGINE)
+
+    def handle(self, *args, **kwargs):
+        n_processes = kwargs['processes']
+        status_cache_size = None if n_processes <= 1 else 0
+        if kwargs['engine'] == 'asyncio':
+            target, args = run_async_consumer, (status_cache_size,)
+        else:
+            target, args = start_consumer, (settings.RABBITMQ_EVENT_QUEUE, True, status_cache_size)
+        if n_processes <= 1:
+            self.stdout.write('Starting status consumer')
+            target(*args)
+            return
+
+        # Every process has to open its own database connection
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        workers = [self.spawn(context, target, args, i) for i in range(n_processes)]
+        stopping = False
+
+        def on_signal(signum, frame):
+            nonlocal stopping
+            stopping = True
+            for worker in workers:
+                if worker.is_alive():
+                    os.kill(worker.pid, signal.SIGTERM)
+
+        signal.signal(signal.SIGTERM, on_signal)
+        signal.signal(signal.SIGINT, on_signal)
+
+        while not stopping:
+            for i, worker in enumerate(workers):
+                if not worker.is_alive() and not stopping:
+                    logging.warning("Status consumer %s exited with code %s, restarting it",
+                                    worker.name, worker.exitcode)
+                    workers[i] = self.spawn(context, target, args, i)
+            time.sleep(1)
+
+        deadline = time.monotonic() + settings.RABBITMQ_CONSUMER_SHUTDOWN_TIMEOUT
+        for worker in workers:
+            worker.join(max(deadline - time.monotonic(), 0))
+            if worker.is_alive():
+                worker.kill()
+        self.stdout.write(self.style.SUCCESS('Status consumers stopped'))
+
+    def spawn(self, context, target, args, i):
+        worker = context.Process(target=target, args=args, name='status-consumer-%i' % i)
+        worker.start()
+        self.stdout.write('Started status consumer %s (pid %i)' % (worker.name, worker.pid))
+        return worker
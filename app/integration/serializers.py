@@ -1,3 +1,5 @@
+import logging
+
 from netaddr import IPAddress, EUI
 from rest_framework import serializers
 
@@ -27,15 +29,20 @@ class MessageSerializer(serializers.BaseSerializer):
         }
 
     def update(self, instance, validated_data):
-        instance.ip = validated_data.get('ip', instance.ip)
+        changed_fields = []
+        ip = validated_data.get('ip')
+        if ip is not None and int(ip) != instance.ip:
+            instance.ip = int(ip)
+            changed_fields.append('ip')
         old_status = instance.online
         new_status = validated_data.get('online', old_status)
         if new_status != old_status:
-            print(f"Changed status for client({instance.id}) "
-                  f"with mac {EUI(instance.mac)} "
-                  f"from {old_status} to {new_status}")
-        instance.online = new_status
-        instance.save()
+            logging.info("Changed status for client(%s) with mac %s from %s to %s",
+                         instance.id, EUI(instance.mac), old_status, new_status)
+            instance.online = new_status
+            changed_fields.append('online')
+        if changed_fields:
+            instance.save(update_fields=changed_fields)
         return instance
 
     def validate_online(self, value):
@@ -0,0 +1,171 @@
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from netaddr import EUI
+
+from integration.aio import AsyncStatusConsumer, InMemoryBroker, backoff_delay
+from integration.tests.test_batch import sample_message
+
+MAC = int(EUI('00-1A-2B-3C-4D-5E'))
+
+
+def mac_str(i):
+    return str(EUI(MAC + i))
+
+
+class FakeWriter:
+    """Records written statuses, fails on `broken` MACs"""
+
+    def __init__(self, delay=0, broken=()):
+        self.delay = delay
+        self.broken = set(broken)
+        self.written = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, statuses):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            if self.broken & set(statuses):
+                raise ValueError("Can't write status")
+            with self.lock:
+                self.written.extend(statuses.items())
+            return []
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def consume(broker, **kwargs):
+    """Run consumer until all published messages are acknowledged"""
+    kwargs.setdefault('batch_timeout_ms', 10)
+    consumer = AsyncStatusConsumer(broker, **kwargs)
+
+    async def stop_when_done():
+        while broker.messages:
+            await asyncio.sleep(0.01)
+        consumer.stop()
+
+    async def main():
+        await asyncio.wait_for(asyncio.gather(consumer.run(), stop_when_done()), 10)
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(main())
+    finally:
+        loop.close()
+    return consumer
+
+
+class AsyncStatusConsumerTests(SimpleTestCase):
+
+    def test_messages_written_and_acked(self):
+        """Test that every published status is written and acknowledged"""
+        broker = InMemoryBroker()
+        for i in range(25):
+            broker.publish(sample_message(mac=mac_str(i)))
+        writer = FakeWriter()
+
+        consume(broker, writer=writer, batch_size=10)
+
+        self.assertEqual(len(broker.acked), 25)
+        self.assertEqual({mac for mac, status in writer.written}, {MAC + i for i in range(25)})
+
+    def test_latest_status_of_client_written(self):
+        """Test that statuses of one client are written in order they were received"""
+        broker = InMemoryBroker()
+        for i in range(20):
+            broker.publish(sample_message(status='true' if i % 2 else 'false'))
+        writer = FakeWriter()
+
+        consume(broker, writer=writer, batch_size=3, concurrency=4)
+
+        self.assertTrue(writer.written[-1][1]['online'])
+
+    def test_invalid_message_dead_lettered(self):
+        """Test that message which can't be parsed goes to dead letter queue"""
+        broker = InMemoryBroker()
+        broker.publish(sample_message(status='maybe'))
+        broker.publish(sample_message())
+
+        consume(broker, writer=FakeWriter())
+
+        self.assertEqual(len(broker.acked), 2)
+        self.assertEqual(len(broker.dead_letters), 1)
+
+    def test_failed_status_dead_lettered(self):
+        """Test that failed batch is written message by message and only failed one is dead lettered"""
+        broker = InMemoryBroker()
+        for i in range(5):
+            broker.publish(sample_message(mac=mac_str(i)))
+        writer = FakeWriter(broken=[MAC + 2])
+
+        consume(broker, writer=writer, concurrency=1)
+
+        self.assertEqual(len(broker.acked), 5)
+        self.assertEqual([body for body, error in broker.dead_letters], [sample_message(mac=mac_str(2))])
+        self.assertEqual(len(writer.written), 4)
+
+    def test_repeated_status_written_without_cache(self):
+        """Test that repeated status is written again when status cache is disabled for several processes"""
+        broker = InMemoryBroker()
+        for i in range(2):
+            broker.publish(sample_message())
+        writer = FakeWriter()
+
+        consume(broker, writer=writer, batch_size=1, concurrency=1, status_cache_size=0)
+
+        self.assertEqual(len(writer.written), 2)
+
+    def test_concurrency_bounded(self):
+        """Test that no more than `concurrency` batches are written at once"""
+        broker = InMemoryBroker()
+        for i in range(40):
+            broker.publish(sample_message(mac=mac_str(i)))
+        writer = FakeWriter(delay=0.02)
+
+        consume(broker, writer=writer, batch_size=2, concurrency=3, db_pool_size=8)
+
+        self.assertEqual(len(broker.acked), 40)
+        self.assertLessEqual(writer.max_active, 3)
+        self.assertGreater(writer.max_active, 1)
+
+    @patch('integration.aio.backoff_delay', return_value=0)
+    def test_reconnect(self, backoff):
+        """Test that consumer reconnects after broker failures"""
+        broker = InMemoryBroker(fail_connects=2)
+        broker.publish(sample_message())
+
+        consume(broker, writer=FakeWriter())
+
+        self.assertEqual(broker.connects, 3)
+        self.assertEqual(backoff.call_count, 2)
+        self.assertEqual(len(broker.acked), 1)
+
+    @patch('integration.aio.backoff_delay', return_value=0)
+    def test_connection_lost_while_writing(self, backoff):
+        """Test that batch being written when connection is lost is finished before reconnect"""
+        broker = InMemoryBroker(fail_consumes=1)
+        broker.publish(sample_message(status='false'))
+        broker.publish(sample_message(status='true'))
+        writer = FakeWriter(delay=0.1)
+
+        consume(broker, writer=writer, batch_size=1)
+
+        self.assertEqual(broker.connects, 2)
+        self.assertEqual(broker.stale_acks, [])
+        self.assertEqual([status['online'] for mac, status in writer.written], [False, True])
+
+    def test_backoff_delay(self):
+        """Test that reconnect delay grows exponentially up to cap"""
+        for attempt in range(1, 10):
+            delay = backoff_delay(attempt, base=0.5, cap=30)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(30, 0.5 * 2 ** attempt))
@@ -0,0 +1,92 @@
+import json
+from unittest.mock import patch
+
+from django.contrib.gis.geos import Point
+from django.test import TestCase
+from netaddr import EUI, IPAddress
+from rest_framework import serializers
+
+from core.models import Box, Client, MapRevision
+from integration.batch import parse_message, apply_statuses
+from integration.consume import RabbitConsumer
+
+MAC = int(EUI('00-1A-2B-3C-4D-5E'))
+
+
+def sample_message(mac='00-1A-2B-3C-4D-5E', status='true', ip='10.0.0.1'):
+    return json.dumps({"MacAdress": mac, "Status": status, "IP": ip}).encode()
+
+
+class ParseMessageTests(TestCase):
+
+    def test_parse_message(self):
+        """Test that message is converted to MAC and status"""
+        mac, status = parse_message(sample_message())
+
+        self.assertEqual(mac, MAC)
+        self.assertTrue(status['online'])
+        self.assertEqual(status['ip'], IPAddress('10.0.0.1'))
+
+    def test_parse_invalid_message(self):
+        """Test that message with wrong status is rejected"""
+        with self.assertRaises(serializers.ValidationError):
+            parse_message(sample_message(status='maybe'))
+
+
+class ApplyStatusesTests(TestCase):
+
+    def test_new_clients_created(self):
+        """Test that unknown clients are created by batch"""
+        apply_statuses({MAC: {'online': True, 'ip': IPAddress('10.0.0.1')},
+                        MAC + 1: {'online': False, 'ip': IPAddress('10.0.0.2')}})
+
+        self.assertEqual(Client.objects.count(), 2)
+        self.assertTrue(Client.objects.get(mac=MAC).online)
+
+    def test_only_changed_clients_written(self):
+        """Test that repeated statuses aren't written again"""
+        client = Client.objects.create(mac=MAC, online=True, ip=int(IPAddress('10.0.0.1')))
+
+        changed = apply_statuses({MAC: {'online': True, 'ip': IPAddress('10.0.0.1')}})
+        self.assertEqual(changed, [])
+
+        changed = apply_statuses({MAC: {'online': False, 'ip': IPAddress('10.0.0.1')}})
+        self.assertEqual(changed, [client.id])
+        client.refresh_from_db()
+        self.assertFalse(client.online)
+
+    def test_map_revision_kept(self):
+        """Test that status of client doesn't change map revision, so cached tiles and map stay valid"""
+        client = Client.objects.create(mac=MAC, online=False)
+        Box.objects.create(name='Client', type_of_box='client', client=client, point=Point([40.17, 55.13]))
+        revision = MapRevision.current()
+
+        apply_statuses({MAC: {'online': True, 'ip': IPAddress('10.0.0.1')}})
+
+        self.assertEqual(MapRevision.current(), revision)
+
+    @patch('integration.batch.notify_box_statuses')
+    def test_box_status_notified(self, notify):
+        """Test that new status of client box is published to status stream"""
+        client = Client.objects.create(mac=MAC, online=False)
+        box = Box.objects.create(name='Client', type_of_box='client', client=client, point=Point([40.17, 55.13]))
+
+        apply_statuses({MAC: {'online': True, 'ip': IPAddress('10.0.0.1')}})
+
+        notify.assert_called_once_with([(box.pk, True)])
+
+
+@patch('integration.consume.pika')
+class RabbitConsumerTests(TestCase):
+
+    @patch('integration.consume.apply_statuses', side_effect=Exception('batch failed'))
+    def test_invalid_message_dead_lettered_once(self, apply, pika):
+        """Test that only valid messages are retried one by one after failed batch"""
+        consumer = RabbitConsumer('localhost', 5672, batch_size=10)
+        consumer.batch = [(1, sample_message()), (2, sample_message(status='maybe'))]
+        with patch.object(consumer, 'dead_letter') as dead_letter, patch.object(consumer, 'process') as process:
+            consumer.flush()
+
+        dead_letter.assert_called_once_with(sample_message(status='maybe'))
+        process.assert_called_once_with(sample_message())
+        consumer.channel_in.basic_ack.assert_called_once_with(delivery_tag=2, multiple=True)
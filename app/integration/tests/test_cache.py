@@ -0,0 +1,71 @@
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from netaddr import IPAddress
+
+from core.models import Client
+from integration.cache import StatusCache
+from integration.serializers import MessageSerializer
+
+ONLINE = {'online': True, 'ip': IPAddress('10.0.0.1')}
+OFFLINE = {'online': False, 'ip': IPAddress('10.0.0.1')}
+
+
+class StatusCacheTests(SimpleTestCase):
+
+    def test_repeated_status_known(self):
+        """Test that only remembered status is known"""
+        cache = StatusCache(10, 60)
+        cache.remember(1, ONLINE)
+
+        self.assertTrue(cache.is_known(1, ONLINE))
+        self.assertFalse(cache.is_known(1, OFFLINE))
+        self.assertFalse(cache.is_known(2, ONLINE))
+
+    def test_size_bounded(self):
+        """Test that least recently used client is evicted"""
+        cache = StatusCache(2, 60)
+        cache.remember(1, ONLINE)
+        cache.remember(2, ONLINE)
+        cache.is_known(1, ONLINE)
+        cache.remember(3, ONLINE)
+
+        self.assertTrue(cache.is_known(1, ONLINE))
+        self.assertFalse(cache.is_known(2, ONLINE))
+
+    def test_disabled(self):
+        """Test that cache of zero size knows nothing"""
+        cache = StatusCache(0, 60)
+        cache.remember(1, ONLINE)
+
+        self.assertFalse(cache.is_known(1, ONLINE))
+
+    @patch('integration.cache.time.monotonic')
+    def test_status_expires(self, monotonic):
+        """Test that status is forgotten after ttl"""
+        cache = StatusCache(10, 60)
+        monotonic.return_value = 100
+        cache.remember(1, ONLINE)
+        monotonic.return_value = 161
+
+        self.assertFalse(cache.is_known(1, ONLINE))
+
+
+class MessageSerializerTests(SimpleTestCase):
+
+    @patch.object(Client, 'save')
+    def test_unchanged_status_not_saved(self, save):
+        """Test that client isn't written when status is the same"""
+        client = Client(id=1, mac=1, online=True, ip=int(IPAddress('10.0.0.1')))
+        MessageSerializer().update(client, ONLINE)
+
+        save.assert_not_called()
+
+    @patch.object(Client, 'save')
+    def test_changed_fields_saved(self, save):
+        """Test that only changed fields are written"""
+        client = Client(id=1, mac=1, online=True, ip=int(IPAddress('10.0.0.1')))
+        MessageSerializer().update(client, OFFLINE)
+
+        save.assert_called_once_with(update_fields=['online'])
+        self.assertFalse(client.online)
@@ -0,0 +1,150 @@
+import base64
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+
+from scheme.renderers import get_renderer
+
+# Change it together with rendering code to drop previously rendered images
+RENDER_VERSION = 2
+
+
+def canonical_scheme(data) -> dict:
+    """Part of InternalSchemeSerializer output that affects the image, in stable order"""
+
+    def node(value):
+        if not value:
+            return None
+        return [value['node_type'], str(value['node_id'])]
+
+    return {
+        "inputs": sorted(str(el['node_id']) for el in data['inputs']),
+        "outputs": sorted(str(el['node_id']) for el in data['outputs']),
+        "splitters": sorted(str(el['node_id']) for el in data['splitters']),
+        "fibers": sorted([el['id'], el['color'], node(el['from_node']), node(el['to_node'])]
+                         for el in data['fibers']),
+    }
+
+
+def scheme_key(data, extension: str) -> str:
+    """Content address of scheme image: equal schemes of any boxes share it"""
+    dump = json.dumps([RENDER_VERSION, extension, canonical_scheme(data)], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(dump.encode()).hexdigest()
+
+
+class RenderCache:
+    """LRU of rendered images in memory, backed by a directory of image files.
+
+    Directory is shared by processes and kept within `disk_size` bytes: every `prune_every` writes
+    files are removed starting from the least recently used. Reading a file marks it as used"""
+
+    prune_every = 100
+
+    def __init__(self, size: int, directory: str = None, disk_size: int = 0):
+        self.size = size
+        self.directory = directory
+        self.disk_size = disk_size
+        self._images = OrderedDict()
+        self._writes = 0
+        self._lock = Lock()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str):
+        with self._lock:
+            if key in self._images:
+                self._images.move_to_end(key)
+                return self._images[key]
+        image = self._read(key)
+        if image is not None:
+            self._remember(key, image)
+        return image
+
+    def set(self, key: str, image: bytes):
+        self._write(key, image)
+        self._remember(key, image)
+
+    def get_or_render(self, key: str, render, *args):
+        image = self.get(key)
+        if image is None:
+            image = render(*args)
+            self.set(key, image)
+        return image
+
+    def _remember(self, key, image):
+        with self._lock:
+            self._images[key] = image
+            self._images.move_to_end(key)
+            while len(self._images) > self.size:
+                self._images.popitem(last=False)
+
+    def _read(self, key):
+        if not self.directory:
+            return None
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as fin:
+                image = fin.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return image
+
+    def _write(self, key, image):
+        if not self.directory:
+            return
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Images are written under temporary name, so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(prefix='.', dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as fout:
+            fout.write(image)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._writes += 1
+            prune = self.disk_size > 0 and self._writes >= self.prune_every
+            if prune:
+                self._writes = 0
+        if prune:
+            self.prune()
+
+    def prune(self):
+        """Remove the least recently used files until directory fits into `disk_size`"""
+        files = []
+        for root, dirs, names in os.walk(self.directory):
+            for name in names:
+                # Temporary files of unfinished writes
+                if name.startswith('.'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for mtime, size, path in files)
+        for mtime, size, path in sorted(files):
+            if total <= self.disk_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+render_cache = RenderCache(settings.SCHEME_RENDER_CACHE_SIZE, settings.SCHEME_RENDER_CACHE_DIR,
+                           settings.SCHEME_RENDER_CACHE_DISK_SIZE)
+
+
+def get_cached_img(data):
+    """Base64 encoded PNG image of scheme, rendered only if it isn't cached yet"""
+    renderer = get_renderer('png')
+    return base64.b64encode(render_cache.get_or_render(scheme_key(data, renderer.extension),
+                                                       renderer.render, data)).decode()
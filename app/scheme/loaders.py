@@ -0,0 +1,4 @@
+def with_nodes(fibers):
+    """Fibers queryset, loading generic ends of all fibers in a constant number of queries:
+    one per content type of `start_object` and of `end_object`"""
+    return fibers.prefetch_related('start_object', 'end_object')
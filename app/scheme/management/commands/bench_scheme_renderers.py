@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from scheme.renderers import RENDERERS
+
+
+def sample_scheme(n_fibers: int) -> dict:
+    """Synthetic InternalSchemeSerializer output: inputs feed 1x8 splitters, splitters feed outputs"""
+    n_splitters = max(1, n_fibers // 9)
+    n_inputs = max(1, n_splitters // 4)
+    n_outputs = max(1, (n_fibers - n_splitters) // 8)
+    splitters = ["S%i" % i for i in range(n_splitters)]
+    fibers = []
+    for i in range(n_fibers):
+        if i < n_splitters:
+            from_node = {"node_id": str(i % n_inputs), "node_type": "inputs"}
+            to_node = {"node_id": splitters[i], "node_type": "splitters"}
+        else:
+            from_node = {"node_id": splitters[i % n_splitters], "node_type": "splitters"}
+            to_node = {"node_id": str(n_inputs + i % n_outputs), "node_type": "outputs"}
+        fibers.append({"id": i, "color": ("red", "blue", "green", "grey70")[i % 4],
+                       "from_node": from_node, "to_node": to_node})
+    return {
+        "inputs": [{"node_id": str(i)} for i in range(n_inputs)],
+        "outputs": [{"node_id": str(n_inputs + i)} for i in range(n_outputs)],
+        "splitters": [{"node_id": label} for label in splitters],
+        "fibers": fibers,
+    }
+
+
+class Command(BaseCommand):
+    help = 'compare speed of scheme renderers on boxes of different size'
+
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument('--fibers', dest='fibers', type=int, nargs='+', default=[10, 100, 1000])
+        parser.add_argument('--repeat', dest='repeat', type=int, default=5)
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write("%8s %10s %12s %12s" % ("fibers", "renderer", "ms/render", "bytes"))
+        for n_fibers in kwargs['fibers']:
+            data = sample_scheme(n_fibers)
+            for extension, renderer in RENDERERS.items():
+                try:
+                    start = time.perf_counter()
+                    for _ in range(kwargs['repeat']):
+                        image = renderer.render(data)
+                    elapsed = (time.perf_counter() - start) / kwargs['repeat']
+                except Exception as e:
+                    self.stdout.write(self.style.WARNING("%8i %10s unavailable: %r" % (n_fibers, extension, e)))
+                    continue
+                self.stdout.write("%8i %10s %12.2f %12i" % (n_fibers, extension, elapsed * 1000, len(image)))
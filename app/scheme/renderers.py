@@ -0,0 +1,39 @@
+from django.conf import settings
+
+from scheme.svg import render_svg
+from scheme.utils import render_png
+
+
+class SchemeRenderer:
+    """Converts InternalSchemeSerializer output to image of format `extension`"""
+    extension = None
+    content_type = None
+
+    def render(self, data) -> bytes:
+        raise NotImplementedError
+
+
+class GraphvizRenderer(SchemeRenderer):
+    """General purpose `dot` layout, runs graphviz binary in subprocess"""
+    extension = 'png'
+    content_type = 'image/png'
+
+    def render(self, data) -> bytes:
+        return render_png(data)
+
+
+class SvgRenderer(SchemeRenderer):
+    """Fixed three column layout, computed in process"""
+    extension = 'svg'
+    content_type = 'image/svg+xml'
+
+    def render(self, data) -> bytes:
+        return render_svg(data)
+
+
+RENDERERS = {renderer.extension: renderer for renderer in (GraphvizRenderer(), SvgRenderer())}
+
+
+def get_renderer(extension: str = None) -> SchemeRenderer:
+    """Return renderer of requested image format, by default of SCHEME_IMAGE_FORMAT"""
+    return RENDERERS[extension or settings.SCHEME_IMAGE_FORMAT]
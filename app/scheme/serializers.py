@@ -8,16 +8,24 @@ from rest_framework import status
 
 from app.utils import get_fields_list
 from core.models import Box, Fiber, Wire, InputPigTail, OutputPigTail, Splitter
+from scheme.snapshot import BoxSnapshot
+
+
+def get_snapshot(instance) -> BoxSnapshot:
+    if isinstance(instance, BoxSnapshot):
+        return instance
+    if not isinstance(instance, Box):
+        raise TypeError("Wrong type of instance passed for schema serializing")
+    return BoxSnapshot.of(instance)
 
 
 class SchemeSerializer(serializers.BaseSerializer):
     def to_representation(self, instance):
-        if not isinstance(instance, Box):
-            raise TypeError("Wrong type of instance passed for schema serializing")
-        inputs = get_fields_list(instance.inbox_input.all(), 'input.id')
-        outputs = get_fields_list(instance.inbox_output.all(), 'output.id')
-        splitters = get_fields_list(instance.inbox_splitter.all(), 'label')
-        fibers = get_fields_list(instance.inbox_fiber.all(), 'id')
+        snapshot = get_snapshot(instance)
+        inputs = get_fields_list(snapshot.inputs, 'input_id')
+        outputs = get_fields_list(snapshot.outputs, 'output_id')
+        splitters = get_fields_list(snapshot.splitters, 'label')
+        fibers = get_fields_list(snapshot.fibers, 'id')
         return {
             "inputs": inputs,
             "outputs": outputs,
@@ -28,12 +36,11 @@ class SchemeSerializer(serializers.BaseSerializer):
 
 class InternalSchemeSerializer(serializers.BaseSerializer):
     def to_representation(self, instance):
-        if not isinstance(instance, Box):
-            raise TypeError("Wrong type of instance passed for schema serializing")
-        inputs = list(map(dict, InputPigTailSerializer(instance.inbox_input.all(), many=True).data))
-        outputs = list(map(dict, OutputPigTailSerializer(instance.inbox_output.all(), many=True).data))
-        splitters = list(map(dict, SplitterSerializer(instance.inbox_splitter.all(), many=True).data))
-        fibers = list(map(dict, FiberSerializer(instance.inbox_fiber.all(), many=True).data))
+        snapshot = get_snapshot(instance)
+        inputs = list(map(dict, InputPigTailSerializer(snapshot.inputs, many=True).data))
+        outputs = list(map(dict, OutputPigTailSerializer(snapshot.outputs, many=True).data))
+        splitters = list(map(dict, SplitterSerializer(snapshot.splitters, many=True).data))
+        fibers = list(map(dict, FiberSerializer(snapshot.fibers, many=True).data))
         return {
             "inputs": inputs,
             "outputs": outputs,
@@ -110,7 +117,8 @@ class InputPigTailSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
     def get_node_id(self, obj):
-        return str(obj.input.id)
+        # Foreign key value is enough, wire itself isn't loaded
+        return str(obj.input_id)
 
 
 class InputPigTailSchemeSerializer(InputPigTailSerializer):
@@ -182,7 +190,7 @@ class OutputPigTailSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
     def get_node_id(self, obj):
-        return str(obj.output.id)
+        return str(obj.output_id)
 
 
 class OutputPigTailSchemeSerializer(OutputPigTailSerializer):
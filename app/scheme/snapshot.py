@@ -0,0 +1,45 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Q
+
+from core.models import Box, Fiber, Wire, InputPigTail, OutputPigTail, Splitter
+
+
+class BoxSnapshot:
+    """Contents of box, loaded in a fixed number of queries and shared by all scheme serializers"""
+
+    def __init__(self, box: Box):
+        self.box = box
+        self.inputs = list(InputPigTail.objects.filter(box=box).order_by('id'))
+        self.outputs = list(OutputPigTail.objects.filter(box=box).order_by('id'))
+        self.splitters = list(Splitter.objects.filter(box=box).order_by('id'))
+        self.fibers = list(Fiber.objects.filter(box=box).order_by('id'))
+        wires = list(Wire.objects.filter(Q(start=box) | Q(end=box)).order_by('id').values_list('id', 'start', 'end'))
+        self.input_wires = [pk for pk, start, end in wires if end == box.pk]
+        self.output_wires = [pk for pk, start, end in wires if start == box.pk]
+        self._resolve_fiber_ends()
+
+    @classmethod
+    def of(cls, box: Box):
+        """Snapshot of box, loaded once per box instance"""
+        snapshot = getattr(box, '_scheme_snapshot', None)
+        if snapshot is None:
+            snapshot = box._scheme_snapshot = cls(box)
+        return snapshot
+
+    def _resolve_fiber_ends(self):
+        # Fibers connect nodes of their own box, which are already loaded,
+        # so generic relations are filled from them instead of querying each end
+        nodes = {}
+        for model, objects in ((InputPigTail, self.inputs), (OutputPigTail, self.outputs), (Splitter, self.splitters)):
+            content_type_id = ContentType.objects.get_for_model(model).id
+            for obj in objects:
+                nodes[(content_type_id, obj.pk)] = obj
+        start_object = Fiber._meta.get_field('start_object')
+        end_object = Fiber._meta.get_field('end_object')
+        for fiber in self.fibers:
+            start = nodes.get((fiber.start_content_type_id, fiber.start_object_id))
+            if start is not None:
+                start_object.set_cached_value(fiber, start)
+            end = nodes.get((fiber.end_content_type_id, fiber.end_object_id))
+            if end is not None:
+                end_object.set_cached_value(fiber, end)
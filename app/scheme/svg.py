@@ -0,0 +1,132 @@
+import re
+from typing import List, Dict, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+COLUMNS = ("inputs", "splitters", "outputs")
+NODE_WIDTH = 54
+NODE_HEIGHT = 36
+ROW_GAP = 18
+COLUMN_GAP = 180
+MARGIN = 24
+LABEL_SIZE = 12
+GREY_RE = re.compile(r'^gr[ae]y(\d{1,3})$')
+
+
+def svg_color(color: str) -> str:
+    """Convert graphviz color name to CSS one, e.g. grey70 to rgb(179,179,179)"""
+    match = GREY_RE.match(color.strip().lower())
+    if match:
+        value = round(min(int(match.group(1)), 100) * 255 / 100)
+        return "rgb(%i,%i,%i)" % (value, value, value)
+    return color.strip()
+
+
+class Layout:
+    """Layered layout of box scheme: inputs, splitters and outputs are placed in three columns,
+    nodes of every column are centered vertically"""
+
+    def __init__(self, data):
+        self.columns: Dict[str, List[str]] = {
+            column: [str(el['node_id']) for el in data[column]] for column in COLUMNS
+        }
+        self.height = max(self.column_height(len(nodes)) for nodes in self.columns.values()) + 2 * MARGIN
+        self.width = 2 * MARGIN + len(COLUMNS) * NODE_WIDTH + (len(COLUMNS) - 1) * COLUMN_GAP
+        self.positions: Dict[Tuple[str, str], Tuple[float, float]] = {}
+        for i, column in enumerate(COLUMNS):
+            nodes = self.columns[column]
+            top = (self.height - self.column_height(len(nodes))) / 2
+            for j, node in enumerate(nodes):
+                self.positions[(column, node)] = (self.column_x(i), top + j * (NODE_HEIGHT + ROW_GAP))
+
+    @staticmethod
+    def column_height(n: int) -> float:
+        return max(n, 1) * NODE_HEIGHT + max(n - 1, 0) * ROW_GAP
+
+    @staticmethod
+    def column_x(i: int) -> float:
+        return MARGIN + i * (NODE_WIDTH + COLUMN_GAP)
+
+    def column_middle(self, column: str) -> Tuple[float, float]:
+        return self.column_x(COLUMNS.index(column)), self.height / 2 - NODE_HEIGHT / 2
+
+    def anchor(self, node, side: str, neighbour_column: str) -> Tuple[float, float]:
+        """Point where fiber leaves (side="out") or enters (side="in") the node.
+        Fiber with missing end is attached to the middle of neighbour column, as graphviz renderer does"""
+        if node and (node['node_type'], str(node['node_id'])) in self.positions:
+            x, y = self.positions[(node['node_type'], str(node['node_id']))]
+        else:
+            x, y = self.column_middle(neighbour_column)
+        if side == "out":
+            return x + NODE_WIDTH, y + NODE_HEIGHT / 2
+        return x, y + NODE_HEIGHT / 2
+
+
+def _neighbour(node, default: str, step: int) -> str:
+    if not node:
+        return default
+    index = COLUMNS.index(node['node_type']) + step
+    return COLUMNS[min(max(index, 0), len(COLUMNS) - 1)]
+
+
+def _arrow(x: float, y: float, label: str) -> str:
+    points = ((x, y + 6), (x + NODE_WIDTH - 14, y + 6), (x + NODE_WIDTH - 14, y),
+              (x + NODE_WIDTH, y + NODE_HEIGHT / 2), (x + NODE_WIDTH - 14, y + NODE_HEIGHT),
+              (x + NODE_WIDTH - 14, y + NODE_HEIGHT - 6), (x, y + NODE_HEIGHT - 6))
+    return ('<polygon points="%s" fill="none" stroke="black"/>' % " ".join("%g,%g" % p for p in points)
+            + _text(x + (NODE_WIDTH - 14) / 2, y + NODE_HEIGHT / 2, label))
+
+
+def _square(x: float, y: float, label: str) -> str:
+    return ('<rect x="%g" y="%g" width="%g" height="%g" fill="none" stroke="black"/>'
+            % (x, y, NODE_WIDTH, NODE_HEIGHT) + _text(x + NODE_WIDTH / 2, y + NODE_HEIGHT / 2, label))
+
+
+def _text(x: float, y: float, label: str) -> str:
+    return ('<text x="%g" y="%g" text-anchor="middle" dominant-baseline="central">%s</text>'
+            % (x, y, escape(label)))
+
+
+def _fiber(start: Tuple[float, float], end: Tuple[float, float], color: str, label: str, offset: int) -> str:
+    (x1, y1), (x2, y2) = start, end
+    # Fibers between nodes of one column are drawn as loops to the right of it
+    bend = max(abs(x2 - x1) / 2, COLUMN_GAP / 3)
+    if x2 <= x1:
+        x2 += NODE_WIDTH
+    colors = [svg_color(c) for c in color.split(':') if c.strip()] or ["black"]
+    paths = []
+    for i, c in enumerate(colors):
+        shift = (i - (len(colors) - 1) / 2) * 2 + offset
+        paths.append('<path d="M%g,%g C%g,%g %g,%g %g,%g" fill="none" stroke=%s stroke-width="1.5"/>'
+                     % (x1, y1 + shift, x1 + bend, y1 + shift, x2 - bend if x2 > x1 else x2 + bend, y2 + shift,
+                        x2, y2 + shift, quoteattr(c)))
+    label_x, label_y = (x1 + x2) / 2, (y1 + y2) / 2 - 4 + offset
+    return "".join(paths) + ('<text x="%g" y="%g" text-anchor="middle" font-size="%i">%s</text>'
+                             % (label_x, label_y, LABEL_SIZE - 2, escape(label)))
+
+
+def render_svg(data) -> bytes:
+    """Render InternalSchemeSerializer output as SVG, without any external process"""
+    layout = Layout(data)
+    parts = ['<svg xmlns="http://www.w3.org/2000/svg" width="%g" height="%g" viewBox="0 0 %g %g" '
+             'font-family="Times,serif" font-size="%i">'
+             % (layout.width, layout.height, layout.width, layout.height, LABEL_SIZE)]
+    splitters_x = layout.column_x(COLUMNS.index("splitters"))
+    parts.append('<rect x="%g" y="%g" width="%g" height="%g" fill="none" stroke="black"/>'
+                 % (splitters_x - MARGIN / 2, MARGIN / 2, NODE_WIDTH + MARGIN, layout.height - MARGIN))
+    parts.append(_text(splitters_x + NODE_WIDTH / 2, MARGIN / 2 + LABEL_SIZE, "Splitters"))
+    for (column, node), (x, y) in layout.positions.items():
+        parts.append(_square(x, y, node) if column == "splitters" else _arrow(x, y, node))
+    # Parallel fibers between the same pair of nodes are spread apart
+    seen: Dict[tuple, int] = {}
+    for fiber in data['fibers']:
+        from_node, to_node = fiber['from_node'] or None, fiber['to_node'] or None
+        if from_node is None and to_node is None:
+            continue
+        start = layout.anchor(from_node, "out", _neighbour(to_node, "inputs", -1))
+        end = layout.anchor(to_node, "in", _neighbour(from_node, "outputs", 1))
+        pair = (start, end)
+        offset = seen.get(pair, 0)
+        seen[pair] = offset + 1
+        parts.append(_fiber(start, end, fiber['color'], str(fiber['id']), (offset + 1) // 2 * 6 * (-1) ** offset))
+    parts.append('</svg>')
+    return "".join(parts).encode()
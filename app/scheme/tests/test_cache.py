@@ -0,0 +1,119 @@
+import os
+import tempfile
+from unittest.mock import Mock, patch
+
+from django.test import SimpleTestCase, override_settings
+
+from scheme.cache import RenderCache, scheme_key
+from scheme.workers import request_render, READY, PENDING
+
+
+def sample_scheme(box_id=1, color='red'):
+    """Return InternalSchemeSerializer-like data of a box with one fiber"""
+    return {
+        'inputs': [{'box': box_id, 'id': 20, 'input': 8, 'n_terminals': 8, 'node_id': '8'}],
+        'outputs': [{'box': box_id, 'id': 2, 'n_terminals': 8, 'node_id': '9', 'output': 9}],
+        'splitters': [],
+        'fibers': [{'box': box_id, 'color': color, 'id': 8,
+                    'from_node': {'node_id': '8', 'node_type': 'inputs'},
+                    'to_node': {'node_id': '9', 'node_type': 'outputs'}}],
+    }
+
+
+class SchemeKeyTests(SimpleTestCase):
+
+    def test_equal_schemes_share_key(self):
+        """Test that schemes of different boxes with the same contents have the same key"""
+        self.assertEqual(scheme_key(sample_scheme(box_id=1), 'png'), scheme_key(sample_scheme(box_id=2), 'png'))
+
+    def test_formats_have_different_keys(self):
+        """Test that images of different formats are cached separately"""
+        self.assertNotEqual(scheme_key(sample_scheme(), 'png'), scheme_key(sample_scheme(), 'svg'))
+
+    def test_different_schemes_have_different_keys(self):
+        """Test that fiber color is a part of the key"""
+        self.assertNotEqual(scheme_key(sample_scheme(color='red'), 'png'),
+                            scheme_key(sample_scheme(color='blue'), 'png'))
+
+
+class RenderCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.render = Mock(side_effect=lambda name: name.encode())
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_render_once(self):
+        """Test that image is rendered only on the first request"""
+        cache = RenderCache(2, self.directory.name)
+        for _ in range(3):
+            self.assertEqual(cache.get_or_render('aa11', self.render, 'img'), b'img')
+
+        self.assertEqual(self.render.call_count, 1)
+
+    def test_lru_eviction(self):
+        """Test that least recently used image is evicted from memory"""
+        cache = RenderCache(2, None)
+        cache.set('aa11', b'a')
+        cache.set('bb22', b'b')
+        cache.get('aa11')
+        cache.set('cc33', b'c')
+
+        self.assertEqual(cache.get('aa11'), b'a')
+        self.assertIsNone(cache.get('bb22'))
+
+    def test_disk_tier(self):
+        """Test that evicted image is read back from directory"""
+        cache = RenderCache(1, self.directory.name)
+        cache.set('aa11', b'a')
+        cache.set('bb22', b'b')
+
+        self.assertEqual(cache.get_or_render('aa11', self.render, 'new'), b'a')
+        self.assertEqual(RenderCache(1, self.directory.name).get('bb22'), b'b')
+        self.render.assert_not_called()
+
+    def test_disk_size_limit(self):
+        """Test that the least recently used files are removed from directory beyond its size"""
+        cache = RenderCache(0, self.directory.name, disk_size=8)
+        cache.prune_every = 1
+        for mtime, key in enumerate(('aa11', 'bb22', 'cc33')):
+            cache.set(key, b'1234')
+            os.utime(cache.path(key), (mtime, mtime))
+
+        self.assertIsNone(cache.get('aa11'))
+        self.assertEqual(cache.get('bb22'), b'1234')
+        self.assertEqual(cache.get('cc33'), b'1234')
+
+
+class RequestRenderTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = RenderCache(2, None)
+        for name, value in (('render_cache', self.cache), ('_pending', {})):
+            patcher = patch('scheme.workers.%s' % name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @override_settings(SCHEME_RENDER_WORKERS=0)
+    def test_render_in_place(self):
+        """Test that without workers image is ready immediately"""
+        self.assertEqual(request_render('aa11', sample_scheme(), 'svg'), READY)
+        self.assertTrue(self.cache.get('aa11').startswith(b'<svg'))
+
+    @override_settings(SCHEME_RENDER_WORKERS=1)
+    @patch('scheme.workers._get_executor')
+    def test_render_scheduled_once(self, get_executor):
+        """Test that image rendering is scheduled once while it is pending"""
+        self.cache.directory = 'scheme_cache'
+
+        self.assertEqual(request_render('bb22', sample_scheme(), 'svg'), PENDING)
+        self.assertEqual(request_render('bb22', sample_scheme(), 'svg'), PENDING)
+        self.assertEqual(get_executor.return_value.submit.call_count, 1)
+
+    def test_cached_image_ready(self):
+        """Test that cached image is ready without rendering"""
+        self.cache.set('cc33', b'png')
+
+        self.assertEqual(request_render('cc33', sample_scheme(), 'svg'), READY)
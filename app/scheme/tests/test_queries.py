@@ -0,0 +1,114 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import Point
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Box, Fiber, InputPigTail, OutputPigTail, Splitter
+from core.tests.utils import sample_wire
+from geoserver.serializers import BoxExtendedSerializer
+from scheme.serializers import InternalSchemeSerializer, SchemeSerializer
+from scheme.snapshot import BoxSnapshot
+
+
+def sample_scheme_box(n_fibers):
+    """Create a box with input, output, splitter and fibers going through the splitter"""
+    box = Box.objects.create(name='Box', point=Point([40.17, 55.13]))
+    upstream = Box.objects.create(name='Upstream', point=Point([40.16, 55.13]))
+    downstream = Box.objects.create(name='Downstream', point=Point([40.18, 55.13]))
+    input_pigtail = InputPigTail.objects.create(input=sample_wire(upstream, box), box=box, n_terminals=n_fibers)
+    output_pigtail = OutputPigTail.objects.create(output=sample_wire(box, downstream), box=box, n_terminals=n_fibers)
+    splitter = Splitter.objects.create(box=box, n_terminals=n_fibers)
+    for i in range(n_fibers):
+        if i % 2:
+            Fiber.objects.create(box=box, color='red', start_object=input_pigtail, end_object=splitter)
+        else:
+            Fiber.objects.create(box=box, color='blue', start_object=splitter, end_object=output_pigtail)
+    return box
+
+
+def count_queries(func, *args):
+    with CaptureQueriesContext(connection) as context:
+        func(*args)
+    return len(context.captured_queries)
+
+
+class SchemeQueriesTests(TestCase):
+    """Test that number of queries doesn't depend on number of fibers"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testPassword123'
+        )
+        self.client.force_authenticate(self.user)
+        self.small_box = sample_scheme_box(2)
+        self.big_box = sample_scheme_box(20)
+
+    def test_internal_scheme_queries(self):
+        """Test that internal scheme is serialized in constant number of queries"""
+        def serialize(box):
+            return InternalSchemeSerializer(Box.objects.get(pk=box.pk)).data
+
+        self.assertEqual(count_queries(serialize, self.small_box), count_queries(serialize, self.big_box))
+
+    def test_scheme_queries(self):
+        """Test that scheme lists don't load wires"""
+        def serialize(box):
+            return SchemeSerializer(Box.objects.get(pk=box.pk)).data
+
+        self.assertEqual(count_queries(serialize, self.small_box), count_queries(serialize, self.big_box))
+
+    def test_fiber_list_queries(self):
+        """Test that fiber list is served in constant number of queries"""
+        def get(box):
+            return self.client.get('/api/boxes/%i/fibers/' % box.pk)
+
+        self.assertEqual(len(get(self.big_box).data['data']), 20)
+        self.assertEqual(count_queries(get, self.small_box), count_queries(get, self.big_box))
+
+    @override_settings(SCHEME_RENDER_WORKERS=0)
+    def test_scheme_image_not_modified(self):
+        """Test that unchanged scheme image is answered by ETag without serializing scheme"""
+        url = '/api/boxes/%i/scheme.svg' % self.small_box.pk
+        etag = self.client.get(url)['ETag']
+
+        with patch('scheme.views.InternalSchemeSerializer') as serializer:
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        serializer.assert_not_called()
+
+
+class BoxSnapshotTests(TestCase):
+
+    def setUp(self):
+        self.box = sample_scheme_box(4)
+
+    def test_snapshot_queries(self):
+        """Test that box contents are loaded with one query per kind of objects"""
+        with self.assertNumQueries(5):
+            snapshot = BoxSnapshot(self.box)
+            for fiber in snapshot.fibers:
+                self.assertIsNotNone(fiber.start_object)
+                self.assertIsNotNone(fiber.end_object)
+
+    def test_snapshot_wires(self):
+        """Test that related wires are split by direction"""
+        snapshot = BoxSnapshot(self.box)
+
+        self.assertEqual(snapshot.input_wires, list(self.box.input_wires.values_list('id', flat=True)))
+        self.assertEqual(snapshot.output_wires, list(self.box.output_wires.values_list('id', flat=True)))
+
+    def test_box_details_share_snapshot(self):
+        """Test that all scheme fields of box details are served by one snapshot"""
+        box = Box.objects.get(pk=self.box.pk)
+        with self.assertNumQueries(5):
+            data = BoxExtendedSerializer(box, include=['image_url']).data
+
+        self.assertEqual(len(data['properties']['scheme']['fibers']), 4)
@@ -0,0 +1,36 @@
+from xml.dom import minidom
+
+from django.test import SimpleTestCase
+
+from scheme.svg import render_svg, svg_color
+from scheme.tests.test_cache import sample_scheme
+
+
+class SvgRendererTests(SimpleTestCase):
+
+    def test_render_scheme(self):
+        """Test that scheme is rendered as valid SVG with all nodes and fibers"""
+        data = sample_scheme()
+        data['splitters'] = [{'node_id': 'A', 'n_terminals': 4}]
+        data['fibers'].append({'id': 9, 'color': 'blue:green',
+                               'from_node': {'node_id': 'A', 'node_type': 'splitters'}, 'to_node': {}})
+
+        document = minidom.parseString(render_svg(data))
+        texts = [el.firstChild.data for el in document.getElementsByTagName('text')]
+        strokes = [el.getAttribute('stroke') for el in document.getElementsByTagName('path')]
+
+        for label in ('8', '9', 'A', 'Splitters'):
+            self.assertIn(label, texts)
+        self.assertEqual(strokes, ['red', 'blue', 'green'])
+
+    def test_render_empty_scheme(self):
+        """Test that box without any nodes is rendered"""
+        data = {'inputs': [], 'outputs': [], 'splitters': [], 'fibers': []}
+
+        document = minidom.parseString(render_svg(data))
+        self.assertEqual(document.documentElement.tagName, 'svg')
+
+    def test_graphviz_grey_colors(self):
+        """Test that graphviz grey shades are converted to CSS colors"""
+        self.assertEqual(svg_color('grey70'), 'rgb(179,179,179)')
+        self.assertEqual(svg_color('red'), 'red')
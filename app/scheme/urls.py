@@ -12,4 +12,5 @@ urlpatterns = [
     path('outputs/<int:output_pk>', views.OutputPigTail.as_view()),
     path('splitters/', views.SplitterList.as_view()),
     path('splitters/<str:splitter_lbl>', views.Splitter.as_view()),
+    path('scheme.<str:extension>', views.SchemeImage.as_view(), name='scheme-image'),
 ]
@@ -59,7 +59,7 @@ class Graph(graphviz.Digraph):
                               serialized_data['inputs'], )
 
 
-def get_img(data, debug=False):
+def get_graph(data) -> graphviz.Digraph:
     inp_to_split = False
     split_to_out = False
 
@@ -166,6 +166,15 @@ def get_img(data, debug=False):
             # else:
             g.edge(a, b, color=c, label=d)
 
+    return g
+
+
+def render_png(data) -> bytes:
+    return get_graph(data).pipe()
+
+
+def get_img(data, debug=False):
+    g = get_graph(data)
     if debug:
         g.view()
 
@@ -1,19 +1,29 @@
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.exceptions import NotFound
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 
-from app.response import BoxResponse
+from app.etags import scheme_etag
+from app.response import BoxResponse, NotModifiedResponse
 from app.views import ObjectAPIView
 from core.models import Box
-from scheme.serializers import FiberSerializer, SplitterSerializer, InputPigTailSerializer, InputPigTailPostSerializer, \
-    OutputPigTailSerializer, InputPigTailPutSerializer, OutputPigTailPostSerializer, OutputPigTailPutSerializer, \
-    SplitterPostSerializer, SplitterPutSerializer, FiberPostSerializer, FiberPutSerializer
+from scheme.cache import render_cache, scheme_key
+from scheme.loaders import with_nodes
+from scheme.renderers import RENDERERS
+from scheme.serializers import InternalSchemeSerializer, FiberSerializer, SplitterSerializer, InputPigTailSerializer, \
+    InputPigTailPostSerializer, OutputPigTailSerializer, InputPigTailPutSerializer, OutputPigTailPostSerializer, \
+    OutputPigTailPutSerializer, SplitterPostSerializer, SplitterPutSerializer, FiberPostSerializer, FiberPutSerializer
+from scheme.workers import request_render, READY
 
 
 class FiberList(ObjectAPIView):
 
     def get(self, request, pk):
+        if self.is_not_modified(request, scheme_etag(pk, 'fibers')):
+            return NotModifiedResponse()
         box = get_object_or_404(Box.objects.all(), pk=pk)
-        fibers = box.inbox_fiber
+        fibers = with_nodes(box.inbox_fiber.all())
         serializer = FiberSerializer(fibers, many=True)
         return Response(serializer.data)
 
@@ -26,7 +36,7 @@ class FiberList(ObjectAPIView):
         serializer = FiberPostSerializer(data=request.data)
         if serializer.is_valid(raise_exception=True):
             serializer.save()
-        return BoxResponse(box)
+        return BoxResponse(box, request.query_params)
 
 
 class Fiber(ObjectAPIView):
@@ -41,18 +51,20 @@ class Fiber(ObjectAPIView):
         update_serializer = FiberPutSerializer(instance=fiber, data=request.data)
         if update_serializer.is_valid(raise_exception=True):
             update_serializer.save()
-        return BoxResponse(box)
+        return BoxResponse(box, request.query_params)
 
     def delete(self, request, pk, fiber_pk):
         box = get_object_or_404(Box.objects.all(), pk=pk)
         fiber = get_object_or_404(box.inbox_fiber.all(), id=fiber_pk)
         fiber.delete()
-        return BoxResponse(box)
+        return BoxResponse(box, request.query_params)
 
 
 class SplitterList(ObjectAPIView):
 
     def get(self, request, pk):
+        if self.is_not_modified(request, scheme_etag(pk, 'splitters')):
+            return NotModifiedResponse()
         box = get_object_or_404(Box.objects.all(), pk=pk)
         splitters = box.inbox_splitter
         serializer = SplitterSerializer(splitters, many=True)
@@ -64,7 +76,7 @@ class SplitterList(ObjectAPIView):
         serializer = SplitterPostSerializer(data=request.data)
         if serializer.is_valid(raise_exception=True):
             serializer.save()
-        return BoxResponse(box)
+        return BoxResponse(box, request.query_params)
 
 
 class Splitter(ObjectAPIView):
@@ -75,18 +87,20 @@ class Splitter(ObjectAPIView):
         update_serializer = SplitterPutSerializer(instance=splitter, data=request.data)
         if update_serializer.is_valid(raise_exception=True):
             update_serializer.save()
-        return BoxResponse(box)
+        return BoxResponse(box, request.query_params)
 
     def delete(self, request, pk, splitter_lbl):
         box = get_object_or_404(Box.objects.all(), pk=pk)
         splitter = get_object_or_404(box.inbox_splitter.all(), label=splitter_lbl)
         splitter.delete()
-        return BoxResponse(box)
+        return BoxResponse(box, request.query_params)
 
 
 class InputPigTailList(ObjectAPIView):
 
     def get(self, request, pk):
+        if self.is_not_modified(request, scheme_etag(pk, 'inputs')):
+            return NotModifiedResponse()
         box = get_object_or_404(Box.objects.all(), pk=pk)
         pigtails = box.inbox_input
         serializer = InputPigTailSerializer(pigtails, many=True)
@@ -98,7 +112,7 @@ class InputPigTailList(ObjectAPIView):
         serializer = InputPigTailPostSerializer(data=request.data)
         if serializer.is_valid(raise_exception=True):
             serializer.save()
-        return BoxResponse(box)
+        return BoxResponse(box, request.query_params)
 
 
 class InputPigTail(ObjectAPIView):
@@ -109,18 +123,20 @@ class InputPigTail(ObjectAPIView):
         update_serializer = InputPigTailPutSerializer(instance=pigtail, data=request.data)
         if update_serializer.is_valid(raise_exception=True):
             update_serializer.save()
-        return BoxResponse(box)
+        return BoxResponse(box, request.query_params)
 
     def delete(self, request, pk, input_pk):
         box = get_object_or_404(Box.objects.all(), pk=pk)
         pigtail = get_object_or_404(box.inbox_input.all(), input=input_pk)
         pigtail.delete()
-        return BoxResponse(box)
+        return BoxResponse(box, request.query_params)
 
 
 class OutputPigTailList(ObjectAPIView):
 
     def get(self, request, pk):
+        if self.is_not_modified(request, scheme_etag(pk, 'outputs')):
+            return NotModifiedResponse()
         box = get_object_or_404(Box.objects.all(), pk=pk)
         pigtails = box.inbox_output
         serializer = OutputPigTailSerializer(pigtails, many=True)
@@ -132,7 +148,7 @@ class OutputPigTailList(ObjectAPIView):
         serializer = OutputPigTailPostSerializer(data=request.data)
         if serializer.is_valid(raise_exception=True):
             serializer.save()
-        return BoxResponse(box)
+        return BoxResponse(box, request.query_params)
 
 
 class OutputPigTail(ObjectAPIView):
@@ -143,10 +159,36 @@ class OutputPigTail(ObjectAPIView):
         update_serializer = OutputPigTailPutSerializer(instance=pigtail, data=request.data)
         if update_serializer.is_valid(raise_exception=True):
             update_serializer.save()
-        return BoxResponse(box)
+        return BoxResponse(box, request.query_params)
 
     def delete(self, request, pk, output_pk):
         box = get_object_or_404(Box.objects.all(), pk=pk)
         pigtail = get_object_or_404(box.inbox_output.all(), output=output_pk)
         pigtail.delete()
-        return BoxResponse(box)
+        return BoxResponse(box, request.query_params)
+
+
+class SchemeImage(ObjectAPIView):
+    """APIView to get rendered scheme of box as PNG or SVG image"""
+
+    def get(self, request, pk, extension):
+        if extension not in RENDERERS:
+            raise NotFound("Unsupported image format %s" % extension)
+        if self.is_not_modified(request, scheme_etag(pk, 'scheme-' + extension)):
+            return NotModifiedResponse()
+        box = get_object_or_404(Box.objects.all(), pk=pk)
+        if box.type_of_box != 'regular':
+            raise NotFound("Box %i has no scheme" % pk)
+        data = InternalSchemeSerializer(box).data
+        key = scheme_key(data, extension)
+        if request_render(key, data, extension) != READY:
+            response = Response({'status': 'pending'}, status=status.HTTP_202_ACCEPTED)
+            response['Retry-After'] = 1
+            return response
+        response = HttpResponse(render_cache.get(key), content_type=RENDERERS[extension].content_type)
+        if request.query_params.get('v') == key:
+            # Versioned URL always points to the same image
+            response['Cache-Control'] = 'private, max-age=31536000, immutable'
+        else:
+            response['Cache-Control'] = 'private, no-cache'
+        return response
@@ -0,0 +1,65 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import RLock
+
+from django.conf import settings
+
+from scheme.cache import RenderCache, render_cache
+from scheme.renderers import get_renderer
+
+READY = 'ready'
+PENDING = 'pending'
+
+_executor = None
+_pending = {}
+# Caches of pool process by directory, they keep counting writes between tasks
+_directory_caches = {}
+# Reentrant, because callback of already finished future runs in the submitting thread
+_lock = RLock()
+
+
+def _render_to_directory(directory, disk_size, key, extension, data):
+    """Executed in pool process: image is passed back through the shared directory"""
+    cache = _directory_caches.get(directory)
+    if cache is None:
+        cache = _directory_caches[directory] = RenderCache(0, directory, disk_size)
+    cache.set(key, get_renderer(extension).render(data))
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.SCHEME_RENDER_WORKERS)
+    return _executor
+
+
+def _on_done(key, future):
+    with _lock:
+        if _pending.get(key) is future:
+            del _pending[key]
+    if future.exception() is not None:
+        logging.error("Rendering of scheme %s failed with error %r", key, future.exception())
+
+
+def request_render(key: str, data, extension: str) -> str:
+    """Return status of scheme image, scheduling its rendering if needed.
+
+    Without workers or shared directory configured image is rendered in the calling thread"""
+    if render_cache.get(key) is not None:
+        return READY
+    if settings.SCHEME_RENDER_WORKERS <= 0 or not render_cache.directory:
+        render_cache.get_or_render(key, get_renderer(extension).render, data)
+        return READY
+    global _executor
+    with _lock:
+        if key not in _pending:
+            args = (render_cache.directory, render_cache.disk_size, key, extension, data)
+            try:
+                future = _get_executor().submit(_render_to_directory, *args)
+            except BrokenProcessPool:
+                _executor = None
+                future = _get_executor().submit(_render_to_directory, *args)
+            _pending[key] = future
+            future.add_done_callback(lambda f: _on_done(key, f))
+    return PENDING
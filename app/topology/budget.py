@@ -0,0 +1,178 @@
+import threading
+from copy import copy
+
+import numpy as np
+from django.conf import settings
+from django.contrib.gis.db.models.functions import Length
+
+from core.models import Wire, MapRevision, MapTombstone
+from .graph import Topology, SPLITTER, WIRE, FIBER
+from .outage import OutageIndex
+
+# Nodes are matched between revisions by type and id packed into one integer
+KEY_SHIFT = 48
+
+
+def node_keys(topology: Topology) -> np.ndarray:
+    return (np.frombuffer(topology.node_types, dtype=np.int8).astype(np.int64) << KEY_SHIFT) \
+        | np.frombuffer(topology.node_ids, dtype=np.int64)
+
+
+def lookup(keys: np.ndarray, sorted_keys: np.ndarray, values: np.ndarray, default=0.0) -> np.ndarray:
+    """Values of keys in arrays sorted by keys, `default` for missing keys"""
+    result = np.full(len(keys), default, dtype=values.dtype if len(values) else np.float64)
+    if len(sorted_keys):
+        positions = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+        found = sorted_keys[positions] == keys
+        result[found] = values[positions[found]]
+    return result
+
+
+class LossBudget:
+    """Expected attenuation from sources of light to every node of topology, in dB.
+
+    Loss of node is loss of its parent in spanning forest of OutageIndex, loss of the edge
+    from parent (wire length or splice of fiber) and own loss of node (splitter ratio).
+    Nodes of the same depth are computed at once, level after level.
+    With `previous` budget only subtrees of nodes with changed loss or parent are recomputed"""
+
+    def __init__(self, topology: Topology, wire_lengths: tuple, previous=None):
+        self.topology = topology
+        self.revision = topology.revision
+        index = OutageIndex.of(topology)
+        n = len(topology)
+        self.keys = node_keys(topology)
+        parent = np.frombuffer(index.parent, dtype=np.int64)
+        has_parent = self.has_parent = parent >= 0
+        self.parent_keys = np.full(n, -1, dtype=np.int64)
+        self.parent_keys[has_parent] = self.keys[parent[has_parent]]
+        self.local = self.local_losses(topology, index, wire_lengths)
+
+        depth = np.frombuffer(index.depth, dtype=np.int64)
+        by_depth = np.argsort(depth, kind='stable')
+        levels = np.split(by_depth, np.searchsorted(depth[by_depth], np.arange(1, depth.max() + 1 if n else 1)))
+
+        self.total = np.zeros(n)
+        affected = np.ones(n, dtype=bool)
+        if previous is not None and len(previous.keys):
+            order = np.argsort(previous.keys)
+            sorted_keys = previous.keys[order]
+            positions = np.minimum(np.searchsorted(sorted_keys, self.keys), len(sorted_keys) - 1)
+            found = sorted_keys[positions] == self.keys
+            old = order[positions]
+            changed = ~found | (previous.local[old] != self.local) | (previous.parent_keys[old] != self.parent_keys)
+            # Nodes below changed ones are covered by their tour ranges
+            tin, tout = np.frombuffer(index.tin, dtype=np.int64), np.frombuffer(index.tout, dtype=np.int64)
+            cover = np.zeros(n + 1, dtype=np.int64)
+            np.add.at(cover, tin[changed], 1)
+            np.add.at(cover, tout[changed], -1)
+            affected = (np.cumsum(cover[:n]) > 0)[tin]
+            self.total[~affected] = previous.total[old[~affected]]
+        self.recomputed = int(affected.sum())
+
+        for level, nodes in enumerate(levels):
+            nodes = nodes[affected[nodes]]
+            if level == 0:
+                self.total[nodes] = self.local[nodes]
+            else:
+                self.total[nodes] = self.total[parent[nodes]] + self.local[nodes]
+
+    @staticmethod
+    def local_losses(topology: Topology, index: OutageIndex, wire_lengths: tuple) -> np.ndarray:
+        """Loss of edge from parent and own loss of every node"""
+        n = len(topology)
+        local = np.zeros(n)
+        parent_edge = np.frombuffer(index.parent_edge, dtype=np.int64)
+        nodes = np.flatnonzero(parent_edge >= 0)
+        edges = parent_edge[nodes]
+        edge_types = np.frombuffer(topology.edge_types, dtype=np.int8)[edges]
+        edge_ids = np.frombuffer(topology.edge_ids, dtype=np.int64)[edges]
+
+        wires = edge_types == WIRE
+        wire_ids, lengths = wire_lengths
+        local[nodes[wires]] = lookup(edge_ids[wires], wire_ids, lengths) / 1000 * settings.LOSS_BUDGET_FIBER_DB_PER_KM
+        local[nodes[edge_types == FIBER]] += settings.LOSS_BUDGET_SPLICE_DB
+
+        splitters = np.flatnonzero(np.frombuffer(topology.node_types, dtype=np.int8) == SPLITTER)
+        if len(splitters):
+            ids = np.frombuffer(topology.node_ids, dtype=np.int64)[splitters]
+            terminals = np.array([topology.splitter_terminals.get(pk) or 0 for pk in ids.tolist()], dtype=np.float64)
+            # Splitter without number of terminals splits light between its output fibers
+            offsets = np.frombuffer(topology.offsets, dtype=np.int64)
+            outputs = (offsets[splitters + 1] - offsets[splitters]).astype(np.float64)
+            ratio = np.maximum(np.where(terminals > 0, terminals, outputs), 1)
+            local[splitters] += 10 * np.log10(ratio) + settings.LOSS_BUDGET_SPLITTER_EXCESS_DB
+        return local
+
+    def clients(self, exceeded_only: bool = False) -> list:
+        """Loss and margin of every client box reached by light"""
+        index = OutageIndex.of(self.topology)
+        result = []
+        for node, client in sorted(index.client_of_node.items(), key=lambda item: item[1]):
+            if not self.has_parent[node]:
+                continue
+            loss = float(self.total[node])
+            margin = settings.LOSS_BUDGET_MAX_DB - loss
+            if exceeded_only and margin >= 0:
+                continue
+            result.append({
+                'client': client,
+                'box': self.topology.node_boxes[node],
+                'loss': round(loss, 2),
+                'margin': round(margin, 2),
+            })
+        return result
+
+
+class LossBudgetCache:
+    """The latest loss budget, updated with topology, and geodesic lengths of wires, updated by map revision"""
+
+    def __init__(self):
+        self.revision = None
+        self._lengths = {}
+        self._arrays = (np.zeros(0, dtype=np.int64), np.zeros(0))
+        self._budget = None
+        self._lock = threading.Lock()
+
+    def current(self, topology: Topology) -> LossBudget:
+        with self._lock:
+            # Scheme changes give new topology at the same map revision
+            if self._budget is not None and self._budget.topology is topology:
+                return self._budget
+            arrays = self._arrays
+            self._load_lengths(topology.revision)
+            if self._budget is not None and self._arrays is arrays and self._budget.topology.same_graph(topology):
+                # Statuses of clients don't change losses
+                self._budget = copy(self._budget)
+                self._budget.topology, self._budget.revision, self._budget.recomputed = topology, topology.revision, 0
+                return self._budget
+            previous = self._budget if self._budget is not None and self._budget.revision <= topology.revision else None
+            self._budget = LossBudget(topology, self._arrays, previous)
+            return self._budget
+
+    def _load_lengths(self, revision: int):
+        """Bring lengths up to revision, arrays are replaced only when any wire has changed"""
+        if revision == self.revision:
+            return
+        if self.revision is None or revision < self.revision or self.revision < MapRevision.state()[1]:
+            self._lengths = dict(self.lengths(Wire.objects.all()))
+        else:
+            deleted = [pk for pk in MapTombstone.objects.filter(object_type='wire', revision__gt=self.revision)
+                       .values_list('object_id', flat=True) if self._lengths.pop(pk, None) is not None]
+            updated = dict(self.lengths(Wire.objects.filter(revision__gt=self.revision)))
+            self._lengths.update(updated)
+            if not deleted and not updated:
+                self.revision = revision
+                return
+        wire_ids = np.array(sorted(self._lengths), dtype=np.int64)
+        self._arrays = (wire_ids, np.array([self._lengths[pk] for pk in wire_ids.tolist()], dtype=np.float64))
+        self.revision = revision
+
+    @staticmethod
+    def lengths(wires):
+        """Geodesic lengths of wires in meters, computed by database on spheroid"""
+        for pk, length in wires.annotate(length=Length('path')).values_list('pk', 'length'):
+            yield pk, length.m if length is not None else 0.0
+
+
+budgets = LossBudgetCache()
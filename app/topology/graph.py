@@ -0,0 +1,294 @@
+import threading
+from array import array
+from bisect import bisect_right
+from collections import deque
+from copy import copy
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Subquery
+
+from core.models import Box, Wire, Fiber, InputPigTail, OutputPigTail, Splitter, MapRevision, SchemeRevision, \
+    MapTombstone
+
+# Node types
+BOX, INPUT, OUTPUT, SPLITTER = range(4)
+NODE_TYPES = ('box', 'input_pigtail', 'output_pigtail', 'splitter')
+# Edge types, light passes a box without fibers from its input pigtails to its output pigtails
+WIRE, FIBER, PASS = range(3)
+EDGE_TYPES = ('wire', 'fiber', 'pass')
+
+
+class BoxPart:
+    """Nodes and fibers of one box, as loaded from database"""
+    __slots__ = ('client', 'inputs', 'outputs', 'splitters', 'fibers')
+
+    def __init__(self, client=None):
+        self.client = client
+        self.clear()
+
+    def clear(self):
+        # Pigtails are mapped to their wires
+        self.inputs = {}
+        self.outputs = {}
+        # Splitters are mapped to their numbers of terminals
+        self.splitters = {}
+        # (fiber id, (node type, id) of start, (node type, id) of end)
+        self.fibers = []
+
+    def contents(self) -> tuple:
+        return self.inputs, self.outputs, self.splitters, sorted(self.fibers)
+
+
+class Topology:
+    """Directed graph of the plant at one revision, light goes from start to end of edges.
+
+    Nodes are boxes, pigtails and splitters, edges are wires and fibers. Both are numbered
+    and kept in flat arrays, edges of node `i` are `offsets[i]:offsets[i + 1]`.
+    Instances are never changed, so they are shared by threads without locks"""
+
+    def __init__(self, revision: int, nodes: list, edges: list, box_clients: dict, splitter_terminals: dict = None):
+        self.revision = revision
+        self.node_types = array('b', (node_type for node_type, pk, box in nodes))
+        self.node_ids = array('q', (pk for node_type, pk, box in nodes))
+        self.node_boxes = array('q', (box for node_type, pk, box in nodes))
+        self.box_clients = box_clients
+        self.splitter_terminals = splitter_terminals or {}
+        # Indexes built for graph by their classes, shared with its copies at later revisions
+        self.indexes = {}
+        self.box_nodes = {}
+        for i, (node_type, pk, box) in enumerate(nodes):
+            self.box_nodes.setdefault(box, []).append(i)
+
+        edges.sort(key=lambda edge: edge[0])
+        self.offsets = array('q', bytes(8 * (len(nodes) + 1)))
+        for source, target, edge_type, pk in edges:
+            self.offsets[source + 1] += 1
+        for i in range(len(nodes)):
+            self.offsets[i + 1] += self.offsets[i]
+        self.targets = array('q', (target for source, target, edge_type, pk in edges))
+        self.edge_types = array('b', (edge_type for source, target, edge_type, pk in edges))
+        self.edge_ids = array('q', (pk for source, target, edge_type, pk in edges))
+
+    def __len__(self):
+        return len(self.node_types)
+
+    def at(self, revision: int):
+        """The same graph at a later revision, sharing arrays and indexes built for this one"""
+        topology = copy(self)
+        topology.revision = revision
+        return topology
+
+    def same_graph(self, other) -> bool:
+        return self.offsets is other.offsets
+
+    def node(self, i: int) -> dict:
+        return {'type': NODE_TYPES[self.node_types[i]], 'id': self.node_ids[i], 'box': self.node_boxes[i]}
+
+    def trace(self, start_box: int, end_box: int):
+        """Shortest light path from any node of `start_box` to any node of `end_box`
+        as list of nodes and wires or fibers between them, None if there is no such path"""
+        sources = self.box_nodes.get(start_box)
+        targets = set(self.box_nodes.get(end_box, ()))
+        if not sources or not targets:
+            return None
+        offsets, edge_targets = self.offsets, self.targets
+        # Edge, by which node was reached, -1 for sources and -2 for unreached nodes
+        via = array('q', [-2]) * len(self)
+        queue = deque(sources)
+        for i in sources:
+            via[i] = -1
+        found = next((i for i in sources if i in targets), None)
+        while queue and found is None:
+            i = queue.popleft()
+            for edge in range(offsets[i], offsets[i + 1]):
+                j = edge_targets[edge]
+                if via[j] == -2:
+                    via[j] = edge
+                    if j in targets:
+                        found = j
+                        break
+                    queue.append(j)
+        if found is None:
+            return None
+
+        path = [self.node(found)]
+        i = found
+        while via[i] != -1:
+            edge = via[i]
+            i = self.edge_source(edge)
+            if self.edge_types[edge] != PASS:
+                path.append({'type': EDGE_TYPES[self.edge_types[edge]], 'id': self.edge_ids[edge]})
+            path.append(self.node(i))
+        path.reverse()
+        return path
+
+    def edge_source(self, edge: int) -> int:
+        """Node, which edge starts from, found by binary search in offsets"""
+        return bisect_right(self.offsets, edge) - 1
+
+    def reachable(self, box: int) -> tuple:
+        """Nodes and edges reachable from nodes of box"""
+        sources = self.box_nodes.get(box, [])
+        offsets, edge_targets = self.offsets, self.targets
+        seen = bytearray(len(self))
+        for i in sources:
+            seen[i] = 1
+        nodes, edges = list(sources), []
+        queue = deque(sources)
+        while queue:
+            i = queue.popleft()
+            for edge in range(offsets[i], offsets[i + 1]):
+                edges.append(edge)
+                j = edge_targets[edge]
+                if not seen[j]:
+                    seen[j] = 1
+                    nodes.append(j)
+                    queue.append(j)
+        return nodes, edges
+
+    def downstream(self, box: int):
+        """Boxes, wires, splitters and clients, which get light from box, None for unknown box"""
+        if box not in self.box_nodes:
+            return None
+        nodes, edges = self.reachable(box)
+        boxes = {self.node_boxes[i] for i in nodes}
+        boxes.discard(box)
+        return {
+            'boxes': sorted(boxes),
+            'wires': sorted({self.edge_ids[edge] for edge in edges if self.edge_types[edge] == WIRE}),
+            'splitters': sorted(self.node_ids[i] for i in nodes if self.node_types[i] == SPLITTER),
+            'clients': sorted(self.box_clients[b] for b in boxes if self.box_clients.get(b) is not None),
+        }
+
+
+def revisions() -> tuple:
+    """Map revision, the latest pruned one and scheme revision, read by one query"""
+    scheme = SchemeRevision.objects.filter(pk=1).values('value')
+    revision, pruned, scheme_revision = \
+        MapRevision.objects.filter(pk=1).values_list('value', 'pruned', Subquery(scheme)).first() or (0, 0, 0)
+    return revision, pruned, scheme_revision or 0
+
+
+class TopologyGraph:
+    """Plant topology kept in memory and brought up to date with map and scheme revisions on demand.
+
+    The first call loads the whole plant, later ones reload only boxes and wires changed after
+    the loaded revisions and drop deleted ones by their tombstones"""
+
+    def __init__(self):
+        self.revision = None
+        self.scheme_revision = None
+        self._boxes = {}
+        self._wires = {}
+        self._topology = None
+        self._lock = threading.Lock()
+
+    def current(self) -> Topology:
+        """Topology at the current revisions, costs one query when nothing has changed"""
+        with self._lock:
+            revision, pruned, scheme_revision = revisions()
+            # Revisions go back only when database is recreated, deletions are lost when their tombstones are pruned
+            if self.revision is None or revision < self.revision or self.revision < pruned \
+                    or scheme_revision < self.scheme_revision:
+                self._load(revision, scheme_revision)
+            elif revision > self.revision or scheme_revision > self.scheme_revision:
+                self._update(revision, scheme_revision)
+            return self._topology
+
+    def _load(self, revision: int, scheme_revision: int):
+        self._boxes = {pk: BoxPart(client) for pk, client in Box.objects.values_list('pk', 'client_id')}
+        self._wires = {pk: (start, end) for pk, start, end in Wire.objects.values_list('pk', 'start_id', 'end_id')}
+        self._load_contents(None)
+        self._compile(revision, scheme_revision)
+
+    def _update(self, revision: int, scheme_revision: int):
+        """Apply changes after the loaded revisions. Arrays are compiled again only when nodes or edges
+        have changed, statuses of clients, names and paths leave them as they are"""
+        since = self.revision
+        structural = False
+        for object_type, pk in MapTombstone.objects.filter(revision__gt=since).values_list('object_type', 'object_id'):
+            removed = (self._boxes if object_type == 'box' else self._wires).pop(pk, None)
+            structural = structural or removed is not None
+        for pk, start, end in Wire.objects.filter(revision__gt=since).values_list('pk', 'start_id', 'end_id'):
+            structural = structural or self._wires.get(pk) != (start, end)
+            self._wires[pk] = (start, end)
+        for pk, client in Box.objects.filter(revision__gt=since).values_list('pk', 'client_id'):
+            part = self._boxes.get(pk)
+            if part is None or part.client != client:
+                self._boxes.setdefault(pk, BoxPart()).client = client
+                structural = True
+        changed = list(Box.objects.filter(scheme_revision__gt=self.scheme_revision).values_list('pk', flat=True))
+        if changed:
+            # Colors of fibers are a part of scheme, but not of topology
+            previous = {pk: self._boxes[pk].contents() for pk in changed if pk in self._boxes}
+            for pk in changed:
+                self._boxes.setdefault(pk, BoxPart())
+            self._load_contents(changed)
+            structural = structural or any(previous.get(pk) != self._boxes[pk].contents() for pk in changed)
+        if structural:
+            self._compile(revision, scheme_revision)
+        else:
+            self._topology = self._topology.at(revision)
+            self.revision = revision
+            self.scheme_revision = scheme_revision
+
+    def _load_contents(self, boxes):
+        """Load pigtails, splitters and fibers of listed boxes, of all boxes if `boxes` is None"""
+        parts = self._boxes if boxes is None else {pk: self._boxes[pk] for pk in boxes if pk in self._boxes}
+        for part in parts.values():
+            part.clear()
+
+        def of_boxes(queryset):
+            return queryset if boxes is None else queryset.filter(box__in=boxes)
+
+        for pk, box, wire in of_boxes(InputPigTail.objects.all()).values_list('pk', 'box_id', 'input_id'):
+            if box in parts:
+                parts[box].inputs[pk] = wire
+        for pk, box, wire in of_boxes(OutputPigTail.objects.all()).values_list('pk', 'box_id', 'output_id'):
+            if box in parts:
+                parts[box].outputs[pk] = wire
+        for pk, box, n_terminals in of_boxes(Splitter.objects.all()).values_list('pk', 'box_id', 'n_terminals'):
+            if box in parts:
+                parts[box].splitters[pk] = n_terminals
+        node_types = {ContentType.objects.get_for_model(model).id: node_type
+                      for model, node_type in ((InputPigTail, INPUT), (OutputPigTail, OUTPUT), (Splitter, SPLITTER))}
+        fibers = of_boxes(Fiber.objects.all()).values_list(
+            'pk', 'box_id', 'start_content_type_id', 'start_object_id', 'end_content_type_id', 'end_object_id')
+        for pk, box, start_type, start_id, end_type, end_id in fibers:
+            if box in parts and start_type in node_types and end_type in node_types:
+                parts[box].fibers.append((pk, (node_types[start_type], start_id), (node_types[end_type], end_id)))
+
+    def _compile(self, revision: int, scheme_revision: int):
+        nodes, index = [], {}
+        for box, part in self._boxes.items():
+            for key in [(BOX, box)] + [(INPUT, pk) for pk in part.inputs] + [(OUTPUT, pk) for pk in part.outputs] \
+                    + [(SPLITTER, pk) for pk in part.splitters]:
+                index[key] = len(nodes)
+                nodes.append(key + (box,))
+
+        edges, input_of_wire, output_of_wire = [], {}, {}
+        for box, part in self._boxes.items():
+            input_of_wire.update((wire, index[(INPUT, pk)]) for pk, wire in part.inputs.items())
+            output_of_wire.update((wire, index[(OUTPUT, pk)]) for pk, wire in part.outputs.items())
+            for pk, start, end in part.fibers:
+                if start in index and end in index:
+                    edges.append((index[start], index[end], FIBER, pk))
+            if not part.fibers:
+                node = index[(BOX, box)]
+                edges.extend((index[(INPUT, pk)], node, PASS, box) for pk in part.inputs)
+                edges.extend((node, index[(OUTPUT, pk)], PASS, box) for pk in part.outputs)
+        for pk, (start, end) in self._wires.items():
+            # Wire goes from output pigtail to input pigtail, or from box itself if its end has no pigtail
+            source = output_of_wire.get(pk, index.get((BOX, start)))
+            target = input_of_wire.get(pk, index.get((BOX, end)))
+            if source is not None and target is not None:
+                edges.append((source, target, WIRE, pk))
+
+        self._topology = Topology(revision, nodes, edges,
+                                  {box: part.client for box, part in self._boxes.items() if part.client is not None},
+                                  {pk: n for part in self._boxes.values() for pk, n in part.splitters.items()})
+        self.revision = revision
+        self.scheme_revision = scheme_revision
+
+
+graph = TopologyGraph()
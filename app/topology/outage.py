@@ -0,0 +1,173 @@
+from array import array
+from bisect import bisect_left
+from collections import deque
+
+from .graph import Topology, BOX, EDGE_TYPES, PASS
+
+
+class OutageIndex:
+    """Spanning forest of topology with ancestor indexes for outage analysis.
+
+    Every node keeps the first edge it was reached by from sources of light (nodes without
+    input edges). Subtrees are ranges of Euler tour positions `tin[v]:tout[v]`, so clients
+    below a node are counted by prefix sums and ancestors are found by binary lifting"""
+
+    def __init__(self, topology: Topology):
+        self.topology = topology
+        n = len(topology)
+        self.parent = array('q', [-1]) * n
+        self.parent_edge = array('q', [-1]) * n
+        self.depth = array('q', [0]) * n
+        self.order = self.spanning_forest()
+        self.tin, self.tout = self.euler_tour()
+
+        self.client_of_node = {}
+        for box, client in topology.box_clients.items():
+            for i in topology.box_nodes.get(box, ()):
+                if topology.node_types[i] == BOX:
+                    self.client_of_node[i] = client
+        self.node_of_client = {client: i for i, client in self.client_of_node.items()}
+        has_client = bytearray(n)
+        for i in self.client_of_node:
+            has_client[self.tin[i]] = 1
+        self.client_prefix = array('q', [0]) * (n + 1)
+        for position in range(n):
+            self.client_prefix[position + 1] = self.client_prefix[position] + has_client[position]
+
+        # up[k][v] is ancestor of v 2**k levels above, roots are their own ancestors
+        self.up = [array('q', (v if p == -1 else p for v, p in enumerate(self.parent)))]
+        for k in range(1, max(self.depth, default=0).bit_length()):
+            previous = self.up[-1]
+            self.up.append(array('q', (previous[previous[v]] for v in range(n))))
+
+    @classmethod
+    def of(cls, topology: Topology):
+        """Index of topology, built once per graph and shared by its copies from `Topology.at`"""
+        index = topology.indexes.get(cls)
+        if index is None:
+            index = topology.indexes[cls] = cls(topology)
+        return index
+
+    def spanning_forest(self) -> list:
+        """Fill parents by breadth-first search from sources of light, return nodes in search order.
+        Nodes in loops without sources become roots themselves"""
+        topology = self.topology
+        n = len(topology)
+        has_input = bytearray(n)
+        for target in topology.targets:
+            has_input[target] = 1
+        seen = bytearray(n)
+        order = []
+        for start in [i for i in range(n) if not has_input[i]] + list(range(n)):
+            if seen[start]:
+                continue
+            seen[start] = 1
+            order.append(start)
+            queue = deque([start])
+            while queue:
+                i = queue.popleft()
+                for edge in range(topology.offsets[i], topology.offsets[i + 1]):
+                    j = topology.targets[edge]
+                    if not seen[j]:
+                        seen[j] = 1
+                        self.parent[j] = i
+                        self.parent_edge[j] = edge
+                        self.depth[j] = self.depth[i] + 1
+                        order.append(j)
+                        queue.append(j)
+        return order
+
+    def euler_tour(self) -> tuple:
+        """Positions of nodes in depth-first order of forest, subtree of node `v` is `tin[v]:tout[v]`"""
+        n = len(self.topology)
+        size = array('q', [1]) * n
+        for v in reversed(self.order):
+            if self.parent[v] != -1:
+                size[self.parent[v]] += size[v]
+        tin = array('q', [0]) * n
+        # The next free position in subtree of node
+        free = array('q', [0]) * n
+        position = 0
+        for v in self.order:
+            p = self.parent[v]
+            if p == -1:
+                tin[v] = position
+                position += size[v]
+            else:
+                tin[v] = free[p]
+                free[p] += size[v]
+            free[v] = tin[v] + 1
+        tout = array('q', (tin[v] + size[v] for v in range(n)))
+        return tin, tout
+
+    def clients_below(self, v: int) -> int:
+        return self.client_prefix[self.tout[v]] - self.client_prefix[self.tin[v]]
+
+    def lca(self, a: int, b: int):
+        """Lowest common ancestor of nodes, None for nodes of different trees"""
+        if self.depth[a] < self.depth[b]:
+            a, b = b, a
+        for k in reversed(range(len(self.up))):
+            if self.depth[a] - (1 << k) >= self.depth[b]:
+                a = self.up[k][a]
+        if a == b:
+            return a
+        for k in reversed(range(len(self.up))):
+            if self.up[k][a] != self.up[k][b]:
+                a, b = self.up[k][a], self.up[k][b]
+        return self.parent[a] if self.parent[a] != -1 and self.parent[a] == self.parent[b] else None
+
+    def analyze(self, clients, limit: int = 10) -> dict:
+        """Rank likely faults for offline clients.
+
+        Candidates are the highest nodes, all clients below which are offline, ranked by number
+        of offline clients they explain. Offline client, which feeds online ones, is a candidate
+        by itself. Common ancestor is the lowest node feeding all offline clients"""
+        nodes = sorted({self.node_of_client[c] for c in clients if c in self.node_of_client},
+                       key=self.tin.__getitem__)
+        tins = [self.tin[v] for v in nodes]
+
+        def offline_below(v):
+            return bisect_left(tins, self.tout[v]) - bisect_left(tins, self.tin[v])
+
+        def is_dark(v):
+            return offline_below(v) == self.clients_below(v)
+
+        candidates = []
+        # End of subtree of the last dark candidate, nodes are in tour order, so clients before it have that candidate
+        covered = 0
+        for v in nodes:
+            if self.tin[v] < covered:
+                continue
+            if not is_dark(v):
+                # Client feeds other online clients, so only its own drop is suspected
+                candidates.append((v, 1))
+                continue
+            # Darkness is monotone on the way up, so the highest dark ancestor is found by lifting
+            for k in reversed(range(len(self.up))):
+                if is_dark(self.up[k][v]):
+                    v = self.up[k][v]
+            candidates.append((v, offline_below(v)))
+            covered = self.tout[v]
+        candidates.sort(key=lambda candidate: (-candidate[1], self.depth[candidate[0]]))
+
+        common = self.lca(nodes[0], nodes[-1]) if nodes else None
+        return {
+            'offline': len(nodes),
+            # Clients without box or with box missing from the loaded topology
+            'unlocated': len(set(clients)) - len(nodes),
+            'candidates': [self.describe(v, offline) for v, offline in candidates[:limit]],
+            'common_ancestor': self.describe(common, len(nodes)) if common is not None else None,
+        }
+
+    def describe(self, v: int, offline: int) -> dict:
+        edge = self.parent_edge[v]
+        via = None
+        if edge != -1 and self.topology.edge_types[edge] != PASS:
+            via = {'type': EDGE_TYPES[self.topology.edge_types[edge]], 'id': self.topology.edge_ids[edge]}
+        return {
+            'node': self.topology.node(v),
+            'via': via,
+            'offline': offline,
+            'clients': self.clients_below(v),
+        }
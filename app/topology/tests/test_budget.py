@@ -0,0 +1,96 @@
+import math
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from topology.budget import LossBudgetCache
+from topology.graph import TopologyGraph
+from topology.tests.test_graph import sample_plant
+
+BUDGET_URL = reverse('topology:budget')
+# Geodesic length of 0.01 degree of longitude on latitude of sample plant, in km
+SAMPLE_WIRE_KM = 0.6379
+
+
+@override_settings(LOSS_BUDGET_FIBER_DB_PER_KM=0.35, LOSS_BUDGET_SPLICE_DB=0.1, LOSS_BUDGET_SPLITTER_EXCESS_DB=1.0,
+                   LOSS_BUDGET_MAX_DB=28.0)
+class LossBudgetTests(TestCase):
+
+    def setUp(self):
+        sample_plant(self)
+        self.graph = TopologyGraph()
+        self.budgets = LossBudgetCache()
+
+    def client_losses(self):
+        budget = self.budgets.current(self.graph.current())
+        return budget, {row['client']: row['loss'] for row in budget.clients()}
+
+    def test_client_loss(self):
+        """Test that loss sums wire lengths, splices and splitter ratio"""
+        budget, losses = self.client_losses()
+
+        expected = 2 * SAMPLE_WIRE_KM * 0.35 + 2 * 0.1 + 10 * math.log10(2) + 1.0
+        self.assertAlmostEqual(losses[self.clients[0].pk], expected, places=1)
+        self.assertEqual(losses[self.clients[0].pk], losses[self.clients[1].pk])
+
+    def test_budget_reused(self):
+        """Test that budget is computed once per revision"""
+        budget, losses = self.client_losses()
+
+        self.assertIs(self.budgets.current(self.graph.current()), budget)
+
+    def test_budget_reused_after_status_change(self):
+        """Test that change of client status doesn't recompute budget"""
+        budget, losses = self.client_losses()
+        self.clients[0].online = True
+        self.clients[0].save()
+
+        new_budget, new_losses = self.client_losses()
+
+        self.assertEqual(new_budget.revision, self.graph.current().revision)
+        self.assertEqual(new_budget.recomputed, 0)
+        self.assertIs(new_budget.total, budget.total)
+        self.assertEqual(new_losses, losses)
+
+    def test_only_changed_subtree_recomputed(self):
+        """Test that change of splitter recomputes only nodes below it"""
+        budget, losses = self.client_losses()
+        self.splitter.n_terminals = 4
+        self.splitter.save()
+
+        new_budget, new_losses = self.client_losses()
+
+        self.assertLess(new_budget.recomputed, len(new_budget.topology))
+        self.assertAlmostEqual(new_losses[self.clients[0].pk] - losses[self.clients[0].pk],
+                               10 * math.log10(2), places=1)
+
+
+class LossBudgetApiTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user('test@test.com', 'testPassword123'))
+        sample_plant(self)
+        for name, value in (('graph', TopologyGraph()), ('budgets', LossBudgetCache())):
+            patcher = patch('topology.views.' + name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_budget(self):
+        """Test that loss and margin of every client are returned"""
+        res = self.client.get(BUDGET_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['client'] for row in res.data['data']['clients']], [client.pk for client in self.clients])
+
+    @override_settings(LOSS_BUDGET_MAX_DB=1.0)
+    def test_exceeded_budget(self):
+        """Test that clients over budget are filtered with `exceeded`"""
+        res = self.client.get(BUDGET_URL, {'exceeded': 'true'})
+
+        self.assertEqual(len(res.data['data']['clients']), 2)
+        self.assertTrue(all(row['margin'] < 0 for row in res.data['data']['clients']))
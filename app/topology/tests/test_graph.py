@@ -0,0 +1,161 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import Point
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Client, Fiber, InputPigTail, OutputPigTail, Splitter, MapRevision
+from core.tests.utils import sample_box, sample_wire
+from topology.graph import TopologyGraph
+
+TRACE_URL = reverse('topology:trace')
+
+
+def downstream_url(pk):
+    return reverse('topology:downstream', args=[pk])
+
+
+def plant_box(name, client=None, lng=40.17):
+    return sample_box(name=name, type_of_box='client' if client else 'regular', client=client,
+                      point=Point([lng, 55.13]))
+
+
+def sample_plant(test):
+    """OLT feeds splice box by one wire, its splitter feeds two client boxes by wires without pigtails"""
+    test.olt = plant_box('OLT', lng=40.10)
+    test.splice = plant_box('Splice', lng=40.11)
+    test.clients = [Client.objects.create(mac=1), Client.objects.create(mac=2)]
+    test.client_boxes = [plant_box('Client', client, lng=40.12 + i * 0.01) for i, client in enumerate(test.clients)]
+    test.feeder = sample_wire(test.olt, test.splice)
+    test.drops = [sample_wire(test.splice, box) for box in test.client_boxes]
+    OutputPigTail.objects.create(output=test.feeder, box=test.olt, n_terminals=1)
+    input_pigtail = InputPigTail.objects.create(input=test.feeder, box=test.splice, n_terminals=1)
+    test.splitter = Splitter.objects.create(box=test.splice, n_terminals=2)
+    Fiber.objects.create(box=test.splice, color='red', start_object=input_pigtail, end_object=test.splitter)
+    for wire in test.drops:
+        output_pigtail = OutputPigTail.objects.create(output=wire, box=test.splice, n_terminals=1)
+        Fiber.objects.create(box=test.splice, color='blue', start_object=test.splitter, end_object=output_pigtail)
+
+
+class TopologyGraphTests(TestCase):
+
+    def setUp(self):
+        sample_plant(self)
+        self.graph = TopologyGraph()
+
+    def test_trace(self):
+        """Test that light path goes through wires, pigtails, fibers and splitter"""
+        path = self.graph.current().trace(self.olt.pk, self.client_boxes[0].pk)
+
+        self.assertEqual([step['type'] for step in path], [
+            'output_pigtail', 'wire', 'input_pigtail', 'fiber', 'splitter', 'fiber', 'output_pigtail', 'wire', 'box'])
+        self.assertEqual([step['id'] for step in path if step['type'] == 'wire'],
+                         [self.feeder.pk, self.drops[0].pk])
+        self.assertEqual(path[-1]['box'], self.client_boxes[0].pk)
+
+    def test_trace_against_light(self):
+        """Test that there is no path upstream"""
+        self.assertIsNone(self.graph.current().trace(self.client_boxes[0].pk, self.olt.pk))
+
+    def test_downstream(self):
+        """Test that downstream of box contains everything fed by it"""
+        downstream = self.graph.current().downstream(self.splice.pk)
+
+        self.assertEqual(downstream['boxes'], [box.pk for box in self.client_boxes])
+        self.assertEqual(downstream['wires'], [wire.pk for wire in self.drops])
+        self.assertEqual(downstream['splitters'], [self.splitter.pk])
+        self.assertEqual(downstream['clients'], [client.pk for client in self.clients])
+
+    def test_unchanged_graph_reused(self):
+        """Test that graph isn't reloaded when map hasn't changed"""
+        topology = self.graph.current()
+
+        with self.assertNumQueries(1):
+            self.assertIs(self.graph.current(), topology)
+
+    def test_incremental_update(self):
+        """Test that added and deleted wires and boxes are applied to loaded graph"""
+        self.graph.current()
+        self.drops[1].delete()
+        extra = plant_box('Extra', lng=40.2)
+        sample_wire(self.client_boxes[0], extra)
+
+        downstream = self.graph.current().downstream(self.olt.pk)
+
+        self.assertEqual(downstream['boxes'], [self.splice.pk, self.client_boxes[0].pk, extra.pk])
+        self.assertEqual(downstream['clients'], [self.clients[0].pk])
+
+    def test_arrays_reused_without_structural_change(self):
+        """Test that rename of box and fiber color advance revision without compiling graph again"""
+        topology = self.graph.current()
+        self.olt.name = 'Renamed'
+        self.olt.save()
+        Fiber.objects.filter(box=self.splice).update(color='green')
+        Fiber.objects.filter(box=self.splice).first().save()
+
+        updated = self.graph.current()
+
+        self.assertEqual(updated.revision, MapRevision.current())
+        self.assertIs(updated.offsets, topology.offsets)
+        self.assertIs(updated.targets, topology.targets)
+
+    def test_scheme_change_applied(self):
+        """Test that scheme change is applied to loaded graph without change of map revision"""
+        topology = self.graph.current()
+        Fiber.objects.filter(box=self.splice, color='blue').first().delete()
+
+        updated = self.graph.current()
+
+        self.assertEqual(updated.revision, MapRevision.current())
+        self.assertEqual(updated.revision, topology.revision)
+        self.assertEqual(updated.downstream(self.splice.pk)['clients'], [self.clients[1].pk])
+
+    def test_box_without_fibers_passes_light(self):
+        """Test that box without scheme connects its input pigtails to its output pigtails"""
+        self.graph.current()
+        extra = plant_box('Extra', lng=40.2)
+        wire = sample_wire(self.client_boxes[1], extra)
+        OutputPigTail.objects.create(output=wire, box=self.client_boxes[1], n_terminals=1)
+        InputPigTail.objects.create(input=self.drops[1], box=self.client_boxes[1], n_terminals=1)
+
+        path = self.graph.current().trace(self.splice.pk, extra.pk)
+
+        self.assertEqual([step['type'] for step in path], [
+            'output_pigtail', 'wire', 'input_pigtail', 'box', 'output_pigtail', 'wire', 'box'])
+
+
+class TopologyApiTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user('test@test.com', 'testPassword123'))
+        sample_plant(self)
+        patcher = patch('topology.views.graph', TopologyGraph())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_trace(self):
+        """Test that path between boxes is returned"""
+        res = self.client.get(TRACE_URL, {'from': self.olt.pk, 'to': self.client_boxes[1].pk})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['data']['path'][-1]['box'], self.client_boxes[1].pk)
+
+    def test_trace_errors(self):
+        """Test that invalid, unknown and unreachable boxes are reported"""
+        res = self.client.get(TRACE_URL, {'from': 'a', 'to': self.olt.pk})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.get(TRACE_URL, {'from': self.olt.pk, 'to': 0})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        res = self.client.get(TRACE_URL, {'from': self.client_boxes[0].pk, 'to': self.olt.pk})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_downstream(self):
+        """Test that clients fed by box are returned"""
+        res = self.client.get(downstream_url(self.olt.pk))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['data']['clients'], [client.pk for client in self.clients])
@@ -0,0 +1,101 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from topology.graph import TopologyGraph
+from topology.outage import OutageIndex
+from topology.tests.test_graph import sample_plant
+
+OUTAGE_URL = reverse('topology:outage')
+
+
+class OutageIndexTests(TestCase):
+
+    def setUp(self):
+        sample_plant(self)
+        self.graph = TopologyGraph()
+        self.index = OutageIndex.of(self.graph.current())
+
+    def test_single_client(self):
+        """Test that the highest node feeding only the offline client is the candidate"""
+        result = self.index.analyze([self.clients[0].pk])
+
+        self.assertEqual(result['offline'], 1)
+        candidate = result['candidates'][0]
+        self.assertEqual(candidate['node']['type'], 'output_pigtail')
+        self.assertEqual(candidate['node']['box'], self.splice.pk)
+        self.assertEqual(candidate['via']['type'], 'fiber')
+        self.assertEqual((candidate['offline'], candidate['clients']), (1, 1))
+        self.assertEqual(result['common_ancestor']['node']['box'], self.client_boxes[0].pk)
+
+    def test_index_reused_after_status_change(self):
+        """Test that change of client status advances revision without building index again"""
+        revision = self.graph.current().revision
+        self.clients[0].online = True
+        self.clients[0].save()
+
+        topology = self.graph.current()
+
+        self.assertGreater(topology.revision, revision)
+        self.assertIs(OutageIndex.of(topology), self.index)
+
+    def test_all_clients(self):
+        """Test that the highest dark node is the candidate and splitter is common ancestor"""
+        result = self.index.analyze([client.pk for client in self.clients])
+
+        self.assertEqual(len(result['candidates']), 1)
+        self.assertEqual(result['candidates'][0]['node']['box'], self.olt.pk)
+        self.assertEqual(result['candidates'][0]['offline'], 2)
+        self.assertEqual(result['common_ancestor']['node'], {'type': 'splitter', 'id': self.splitter.pk,
+                                                             'box': self.splice.pk})
+
+    def test_unknown_clients(self):
+        """Test that clients without boxes are counted apart"""
+        result = self.index.analyze([0])
+
+        self.assertEqual((result['offline'], result['unlocated']), (0, 1))
+        self.assertEqual(result['candidates'], [])
+        self.assertIsNone(result['common_ancestor'])
+
+    def test_index_shared(self):
+        """Test that index is built once per topology"""
+        self.assertIs(OutageIndex.of(self.index.topology), self.index)
+
+
+class OutageApiTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user('test@test.com', 'testPassword123'))
+        sample_plant(self)
+        patcher = patch('topology.views.graph', TopologyGraph())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_current_offline_clients(self):
+        """Test that GET analyzes clients, which are offline now"""
+        self.clients[0].online = True
+        self.clients[0].save()
+
+        res = self.client.get(OUTAGE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['data']['offline'], 1)
+        self.assertEqual(res.data['data']['common_ancestor']['node']['box'], self.client_boxes[1].pk)
+
+    def test_posted_clients(self):
+        """Test that POST analyzes listed clients"""
+        res = self.client.post(OUTAGE_URL, {'clients': [self.clients[0].pk]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['data']['common_ancestor']['node']['box'], self.client_boxes[0].pk)
+
+    def test_invalid_clients(self):
+        """Test that clients should be list of ids"""
+        res = self.client.post(OUTAGE_URL, {'clients': 'all'}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
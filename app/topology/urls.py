@@ -0,0 +1,12 @@
+from django.urls import path
+
+from topology import views
+
+app_name = 'topology'
+
+urlpatterns = [
+    path('trace/', views.Trace.as_view(), name='trace'),
+    path('outage/', views.Outage.as_view(), name='outage'),
+    path('budget/', views.Budget.as_view(), name='budget'),
+    path('boxes/<int:pk>/downstream/', views.Downstream.as_view(), name='downstream'),
+]
@@ -0,0 +1,90 @@
+from django.conf import settings
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+
+from app.utils import query_bool_to_py
+from app.views import ObjectAPIView
+from core.models import Client
+from .budget import budgets
+from .graph import graph
+from .outage import OutageIndex
+
+OUTAGE_CANDIDATES_LIMIT = 10
+
+
+def box_param(query_params, name: str) -> int:
+    try:
+        return int(query_params[name])
+    except KeyError:
+        raise ValidationError({name: ["This parameter is required"]})
+    except ValueError:
+        raise ValidationError({name: ["Box id should be an integer"]})
+
+
+class Trace(ObjectAPIView):
+    """APIView to trace light path between boxes, given by `from` and `to` query parameters"""
+
+    def get(self, request):
+        start, end = box_param(request.query_params, 'from'), box_param(request.query_params, 'to')
+        topology = graph.current()
+        for pk in (start, end):
+            if pk not in topology.box_nodes:
+                raise NotFound("Box %i doesn't exist" % pk)
+        path = topology.trace(start, end)
+        if path is None:
+            raise NotFound("Box %i doesn't get light from box %i" % (end, start))
+        return Response({'revision': topology.revision, 'path': path})
+
+
+class Downstream(ObjectAPIView):
+    """APIView to get boxes, wires, splitters and clients fed by box"""
+
+    def get(self, request, pk):
+        topology = graph.current()
+        downstream = topology.downstream(pk)
+        if downstream is None:
+            raise NotFound("Box %i doesn't exist" % pk)
+        downstream['revision'] = topology.revision
+        return Response(downstream)
+
+
+class Outage(ObjectAPIView):
+    """APIView to rank likely faults of offline clients.
+    GET analyzes clients, which are offline now, POST analyzes `clients` list of client ids"""
+
+    def get(self, request):
+        clients = Client.objects.filter(online=False, connected_box__isnull=False).values_list('pk', flat=True)
+        return self.analyze(list(clients), request.query_params)
+
+    def post(self, request):
+        clients = request.data.get('clients') if isinstance(request.data, dict) else None
+        if not isinstance(clients, list) or not all(isinstance(pk, int) for pk in clients):
+            raise ValidationError({'clients': ["List of client ids is expected"]})
+        return self.analyze(clients, request.query_params)
+
+    @staticmethod
+    def analyze(clients, query_params):
+        try:
+            limit = int(query_params.get('limit', OUTAGE_CANDIDATES_LIMIT))
+        except ValueError:
+            raise ValidationError({'limit': ["Limit should be an integer"]})
+        if limit < 1:
+            raise ValidationError({'limit': ["Limit should be positive"]})
+        topology = graph.current()
+        result = OutageIndex.of(topology).analyze(clients, limit)
+        result['revision'] = topology.revision
+        return Response(result)
+
+
+class Budget(ObjectAPIView):
+    """APIView to get expected optical loss and margin of clients, only exceeded ones with `exceeded=true`"""
+
+    def get(self, request):
+        topology = graph.current()
+        budget = budgets.current(topology)
+        exceeded = query_bool_to_py(request.query_params.get('exceeded', 'false'))
+        return Response({
+            'revision': topology.revision,
+            'max_loss': settings.LOSS_BUDGET_MAX_DB,
+            'clients': budget.clients(exceeded),
+        })